@@ -21,33 +21,44 @@ import struct
 import time
 import uuid
 from pathlib import Path, PurePosixPath
-from typing import Union
+from typing import Union, Iterable, Callable, Tuple
 
+from angelos.archive7.base import BLOCK_VERSION_1, BLOCK_VERSION_2
 from angelos.archive7.fs import Delete, InvalidPath, EntryRecord, FileObject
 from angelos.archive7.fs import FileSystemStreamManager, TYPE_DIR, TYPE_LINK, TYPE_FILE, \
     HierarchyTraverser
+from angelos.common.metrics import Registry
 from angelos.common.misc import SharedResourceMixin
 from angelos.common.utils import Util
 
 
+METRIC_OPERATION = Registry.main().histogram(
+    "angelos_archive7_operation_seconds", "Seconds of archive operations, waiting in queue included.",
+    ("archive", "operation"))
+METRIC_PENDING = Registry.main().gauge(
+    "angelos_archive7_pending", "Archive operations queued or running.", ("archive",))
+
+
 class Archive7Error(RuntimeError):
     """Errors related to Archive7."""
     INVALID_FORMAT = ("Invalid format", 120)
     AR7_NOT_FOUND = ("Archive file not found", 121)
     AR7_OPERAND_INVALID = ("Invalid or unsupported operand", 122)
+    AR7_READ_ONLY = ("Archive opened read-only", 123)
 
 
 class Header:
     """Header for the Archive 7 format."""
 
-    __slots__ = ["major", "minor", "type", "role", "use", "id", "owner", "domain", "node", "created", "title"]
+    __slots__ = ["major", "minor", "type", "role", "use", "id", "owner", "domain", "node", "created", "title",
+                 "version"]
 
-    FORMAT = "!8scHHbbb16s16s16s16sQ256s"
+    FORMAT = "!8scHHbbb16s16s16s16sQ256sB"
 
     def __init__(
             self, owner: uuid.UUID, identity: uuid.UUID = None, node: uuid.UUID = None, domain: uuid.UUID = None,
             title: Union[bytes, bytearray] = None, type_: int = None, role: int = None, use: int = None,
-            major: int = 2, minor: int = 0, created: datetime.datetime = None
+            major: int = 2, minor: int = 0, created: datetime.datetime = None, version: int = BLOCK_VERSION_1
     ):
         self.major = major
         self.minor = minor
@@ -60,6 +71,7 @@ class Header:
         self.node = node
         self.created = created if created else datetime.datetime.now()
         self.title = title
+        self.version = version
 
     def __bytes__(self):
         return struct.pack(
@@ -80,7 +92,8 @@ class Header:
                 if isinstance(self.created, datetime.datetime)
                 else time.mktime(datetime.datetime.now().timetuple())
             ),
-            self.title[:256] if isinstance(self.title, (bytes, bytearray)) else bytes(256)
+            self.title[:256] if isinstance(self.title, (bytes, bytearray)) else bytes(256),
+            self.version
         )
 
     @staticmethod
@@ -102,18 +115,24 @@ class Header:
             title=metadata[12].strip(b"\x00"),
             major=metadata[2],
             minor=metadata[3],
+            version=metadata[13] if metadata[13] else BLOCK_VERSION_1,
         )
 
 
 class Archive7(SharedResourceMixin):
     """Archive main class and high level API."""
 
-    def __init__(self, filename: Path, secret: bytes, delete: int = Delete.ERASE):
-        """Init archive using a file object and set delete mode."""
+    def __init__(
+            self, filename: Path, secret: bytes, delete: int = Delete.ERASE, readonly: bool = False,
+            mapped: bool = False, version: int = BLOCK_VERSION_1, name: str = None
+    ):
+        """Init archive using a file object and set delete mode, the name labels the metrics."""
         SharedResourceMixin.__init__(self)
         self.__closed = False
         self.__delete = delete
-        self.__manager = FileSystemStreamManager(filename, secret)
+        self.__manager = FileSystemStreamManager(filename, secret, readonly, mapped, version)
+        self.__name = name or Path(filename).name
+        self.__pending = METRIC_PENDING.labels(self.__name)
 
     def __enter__(self):
         return self
@@ -123,9 +142,13 @@ class Archive7(SharedResourceMixin):
 
     @staticmethod
     def setup(filename: Path, secret: bytes, owner: uuid.UUID = None, node: uuid.UUID = None, title: str = None,
-              domain: uuid.UUID = None, type_: int = None, role: int = None, use: int = None):
+              domain: uuid.UUID = None, type_: int = None, role: int = None, use: int = None,
+              version: int = BLOCK_VERSION_1, name: str = None):
         """Create a new archive.
 
+        Version 2 blocks skip the SHA-1 digest of each block and rely on the authenticated encryption,
+        which makes reads and writes cheaper, but older software can't read them.
+
         Args:
             filename (str):
                 Path and filename to archive
@@ -145,6 +168,10 @@ class Archive7(SharedResourceMixin):
                 Node role
             use (int):
                 Archive usage
+            version (int):
+                Block format version
+            name (str):
+                Name of the archive in the metrics, the filename by default
 
         Returns (Archive7):
             Initialized Archive7 instance
@@ -152,18 +179,26 @@ class Archive7(SharedResourceMixin):
         """
         header = Header(
             owner=owner, node=node, title=title.encode() if title else title,
-            domain=domain, type_=type_, role=role, use=use
+            domain=domain, type_=type_, role=role, use=use, version=version
         )
 
-        archive = Archive7(filename, secret)
+        archive = Archive7(filename, secret, version=version, name=name)
         archive._Archive7__manager.meta = bytes(header)
         archive._Archive7__manager.save_meta()
         return archive
 
     @staticmethod
-    def open(filename: Path, secret: bytes, delete: int = 3):
+    def open(
+            filename: Path, secret: bytes, delete: int = 3, readonly: bool = False, mapped: bool = False,
+            name: str = None
+    ):
         """Open an archive with a symmetric encryption key.
 
+        Read-only archives take a shared lock and never write to the file, several processes can open
+        the same archive read-only while one process has it opened for writing. On POSIX the locks belong to
+        the process, so closing a read-only archive in the writing process also drops the lock of the writer.
+        Mapped archives read blocks through a memory map instead of file reads, which suits read-heavy use.
+
         Args:
             filename (str):
                 Path and filename to archive
@@ -171,6 +206,12 @@ class Archive7(SharedResourceMixin):
                 Encryption key
             delete (int):
                 Delete methodology
+            readonly (bool):
+                Open archive read-only
+            mapped (bool):
+                Read blocks through a memory map
+            name (str):
+                Name of the archive in the metrics, the filename by default
 
         Returns (Archive7):
             Opened Archive7 instance
@@ -179,13 +220,47 @@ class Archive7(SharedResourceMixin):
         if not os.path.isfile(filename):
             raise Archive7Error(*Archive7Error.AR7_NOT_FOUND, {"path": filename})
 
-        return Archive7(filename, secret, delete)
+        return Archive7(filename, secret, delete, readonly, mapped, name=name)
+
+    @property
+    def name(self) -> str:
+        """Name of the archive in the metrics."""
+        return self.__name
+
+    async def _run(self, callback: Callable):
+        """Run an operation, measured by the name of the private method."""
+        operation = getattr(callback, "func", callback).__name__.rpartition("__")[2]
+        self.__pending.inc()
+        try:
+            with METRIC_OPERATION.labels(self.__name, operation).time():
+                return await SharedResourceMixin._run(self, callback)
+        finally:
+            self.__pending.dec()
+
+    async def _wild(self, callback: Callable):
+        """Run a step of a search, measured as a search."""
+        self.__pending.inc()
+        try:
+            with METRIC_OPERATION.labels(self.__name, "search").time():
+                return await SharedResourceMixin._wild(self, callback)
+        finally:
+            self.__pending.dec()
 
     @property
     def closed(self):
         """Archive closed status."""
         return self.__closed
 
+    @property
+    def readonly(self):
+        """Archive read-only status."""
+        return self.__manager.readonly
+
+    def __writable(self):
+        """Raise error if archive is read-only."""
+        if self.__manager.readonly:
+            raise Archive7Error(*Archive7Error.AR7_READ_ONLY)
+
     def close(self):
         """Close archive."""
         if not self.__closed:
@@ -197,6 +272,30 @@ class Archive7(SharedResourceMixin):
         size = struct.calcsize(Header.FORMAT)
         return Header.meta_unpack(self.__manager.meta[:size])
 
+    async def upgrade(self, *args, **kwargs):
+        return await self._run(functools.partial(self.__upgrade, *args, **kwargs))
+
+    def __upgrade(self, version: int = BLOCK_VERSION_2):
+        """Upgrade the archive in place to another block format version.
+
+        Every block is rewritten, which requires that no one else has the archive open.
+
+        Args:
+            version (int):
+                Block format version
+
+        """
+        self.__writable()
+        meta = self.__manager.meta
+        header = self.stats()
+        header.version = version
+        self.__manager.meta = bytes(header)
+        try:
+            self.__manager.upgrade(version)
+        except Exception:
+            self.__manager.meta = meta
+            raise
+
     async def info(self, *args, **kwargs):
         return await self._run(functools.partial(self.__info, *args, **kwargs))
 
@@ -258,6 +357,7 @@ class Archive7(SharedResourceMixin):
 
     def __move(self, filename: PurePosixPath, dirname: PurePosixPath):
         """Move file/dir to another directory."""
+        self.__writable()
         try:
             identity = self.__manager.resolve_path(filename)
             parent = self.__manager.resolve_path(dirname)
@@ -279,6 +379,7 @@ class Archive7(SharedResourceMixin):
             perms: int = None,
     ):
         """Update ID/owner or deleted status for an entry."""
+        self.__writable()
         try:
             self.__manager.update_entry(
                 self.__manager.resolve_path(filename),
@@ -292,6 +393,7 @@ class Archive7(SharedResourceMixin):
 
     def __remove(self, filename: PurePosixPath, mode: int = None):
         """Remove file or dir."""
+        self.__writable()
         try:
             self.__manager.delete_entry(
                 self.__manager.resolve_path(filename), mode if mode else self.__delete)
@@ -303,6 +405,7 @@ class Archive7(SharedResourceMixin):
 
     def __rename(self, filename: PurePosixPath, dest: str):
         """Rename file or directory."""
+        self.__writable()
         try:
             self.__manager.change_name(self.__manager.resolve_path(filename), dest)
         except InvalidPath:
@@ -354,6 +457,7 @@ class Archive7(SharedResourceMixin):
             name        The full path and name of new directory
             returns     the entry ID
         """
+        self.__writable()
         try:
             return self.__manager.create_entry(
                 TYPE_DIR, dirname.parts[-1],
@@ -363,6 +467,23 @@ class Archive7(SharedResourceMixin):
         except InvalidPath:
             raise Archive7Error(*Archive7Error.AR7_NOT_FOUND, {"path": dirname.parent})
 
+    async def mkdirs(self, *args, **kwargs):
+        return await self._run(functools.partial(self.__mkdirs, *args, **kwargs))
+
+    def __mkdirs(self, dirnames: Iterable[Tuple[PurePosixPath, dict]]) -> int:
+        """
+        Make the missing directories of many in one operation, parents must come before their children.
+
+            dirnames    Full paths and names of directories, each with the keyword arguments of mkdir
+            returns     the number of directories made
+        """
+        self.__writable()
+        made = 0
+        for dirname, kwargs in dirnames:
+            if not self.__isdir(dirname):
+                self.__mkdir(dirname, **kwargs)
+                made += 1
+        return made
 
     async def mkfile(self, *args, **kwargs):
         return await self._run(functools.partial(self.__mkfile, *args, **kwargs))
@@ -370,7 +491,7 @@ class Archive7(SharedResourceMixin):
     def __mkfile(
             self,
             filename: PurePosixPath,
-            data: bytes,
+            data: Union[bytes, Iterable[bytes]],
             created: datetime.datetime = None,
             modified: datetime.datetime = None,
             owner: uuid.UUID = None,
@@ -378,14 +499,20 @@ class Archive7(SharedResourceMixin):
             id: uuid.UUID = None,
             user: str = None,
             group: str = None,
-            perms: int = None
+            perms: int = None,
+            length: int = None
     ) -> uuid.UUID:
-        """Create a new file."""
+        """Create a new file, from data or an iterable of data chunks.
+
+        The entry of chunked data is updated with the length after writing, unless the expected length is given.
+        """
+        self.__writable()
         try:
             parent = self.__manager.resolve_path(filename.parent)
         except InvalidPath:
             raise Archive7Error(*Archive7Error.AR7_NOT_FOUND, {"parent": filename.parent})
 
+        chunked = not isinstance(data, (bytes, bytearray, memoryview))
         identity = self.__manager.create_entry(
             type_=TYPE_FILE,
             name=filename.parts[-1],
@@ -398,13 +525,19 @@ class Archive7(SharedResourceMixin):
             user=user,
             group=group,
             perms=perms,
+            length=length if chunked else len(data)
         )
 
         vfd = self.__manager.open(identity, "wb")
-        vfd.write(data)
-        length = vfd.stream.length()
+        if chunked:
+            for chunk in data:
+                vfd.write(chunk)
+        else:
+            vfd.write(data)
+        written = vfd.stream.length()
         vfd.close()
-        self.__manager.update_entry(identity, length=length)
+        if chunked and written != length:  # Length is known first after writing
+            self.__manager.update_entry(identity, length=written)
         return identity
 
     async def link(self, *args, **kwargs):
@@ -421,6 +554,7 @@ class Archive7(SharedResourceMixin):
             perms: int = None
     ) -> uuid.UUID:
         """Create a new link to file or directory."""
+        self.__writable()
         try:
             parent = self.__manager.resolve_path(filename.parent)
         except InvalidPath:
@@ -448,6 +582,7 @@ class Archive7(SharedResourceMixin):
 
     def __save(self, filename: PurePosixPath, data: bytes, modified: datetime.datetime = None):
         """Update a file with new data."""
+        self.__writable()
         if not modified:
             modified = datetime.datetime.now()
 
@@ -469,6 +604,8 @@ class Archive7(SharedResourceMixin):
 
     def __load(self, filename: PurePosixPath, fd: bool = False, readonly: bool = True) -> Union[bytes, FileObject]:
         """Load data from a file."""
+        if fd and not readonly:
+            self.__writable()
         try:
             if fd:
                 return self.__manager.open(self.__manager.resolve_path(filename, True), "rb" if readonly else "wb")
@@ -491,12 +628,16 @@ class Archive7(SharedResourceMixin):
         evaluator = query.build()
         traverser = self.__manager.traverse_hierarchy(uuid.UUID(int=0))
 
-        while True:
-            entry, path = await self._wild(functools.partial(self.__search, traverser=traverser))
-            if not entry:
-                break
-            if evaluator(entry, str(path)):
-                yield entry, path
+        self.__manager.advise(True)
+        try:
+            while True:
+                entry, path = await self._wild(functools.partial(self.__search, traverser=traverser))
+                if not entry:
+                    break
+                if evaluator(entry, str(path)):
+                    yield entry, path
+        finally:
+            self.__manager.advise(False)
 
     def __search(self, traverser: HierarchyTraverser) -> tuple:
         """Load data from a file."""
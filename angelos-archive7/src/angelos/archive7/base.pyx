@@ -24,6 +24,9 @@ MAX_UINT32 = 2 ** 32
 
 FORMAT_BLOCK = "!iiI16s20s4008s"
 SIZE_BLOCK = struct.calcsize(FORMAT_BLOCK)
+BLOCK_VERSION_1 = 1  # Blocks carry a SHA-1 digest of the data field
+BLOCK_VERSION_2 = 2  # Blocks rely on the authenticated encryption alone, the digest field is blank
+BLANK_DIGEST = bytes(20)
 FORMAT_STREAM = "!16siiIQH"
 SIZE_STREAM = struct.calcsize(FORMAT_STREAM)
 
@@ -60,6 +63,9 @@ class StreamManagerError(RuntimeError):
     ALREADY_OPEN = ("Already opened", 89)
     NO_STREAM_IDENTITY = ("Identity doesn't exist", 90)
     NOT_OPEN = ("Stream not known to be open.", 91)
+    READ_ONLY = ("Stream manager opened read-only.", 92)
+    IN_USE = ("Stream manager file in use by readers.", 93)
+    UNKNOWN_VERSION = ("Unknown block format version.", 94)
 
 
 class BaseFileObject(ABC, RawIOBase):
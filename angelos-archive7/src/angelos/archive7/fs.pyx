@@ -24,7 +24,7 @@ from collections.abc import Iterable
 from pathlib import PurePath, PurePosixPath, Path
 from typing import Union, Iterator
 
-from angelos.archive7.base import DATA_SIZE
+from angelos.archive7.base import DATA_SIZE, BLOCK_VERSION_1
 from angelos.archive7.streams import DynamicMultiStreamManager, Registry, DataStream, VirtualFileObject
 from angelos.archive7.tree import SimpleBTree, MultiBTree, RecordError
 
@@ -44,6 +44,7 @@ class VirtualFSError(RuntimeError):
     FILE_ALREADY_OPEN = ("File already open.", 110)
     NOT_A_FILE = ("Record not of type file.", 111)
     ENTRY_DELETED = ("Record is considered deleted.", 112)
+    READ_ONLY = ("File system is read-only.", 113)
 
 
 class InvalidPath(RuntimeWarning):
@@ -251,7 +252,7 @@ class EntryRegistry(Registry):
         return SimpleBTree.factory(
             VirtualFileObject(
                 self._manager.special_stream(FileSystemStreamManager.STREAM_ENTRIES),
-                "entries", "wb+"
+                "entries", self._mode
             ),
             order=9,
             value_size=struct.calcsize(EntryRecord.FORMAT),
@@ -303,7 +304,7 @@ class PathRegistry(Registry):
         return SimpleBTree.factory(
             VirtualFileObject(
                 self._manager.special_stream(FileSystemStreamManager.STREAM_PATHS),
-                "paths", "wb+"
+                "paths", self._mode
             ),
             order=104,
             value_size=struct.calcsize(PathRecord.FORMAT),
@@ -343,7 +344,7 @@ class ListingRegistry(Registry):
         return MultiBTree.factory(
             VirtualFileObject(
                 self._manager.special_stream(FileSystemStreamManager.STREAM_LISTINGS),
-                "listings", "wb+"
+                "listings", self._mode
             ),
             order=248,
             value_size=struct.calcsize(ListingRecord.FORMAT),
@@ -438,12 +439,15 @@ class FileSystemStreamManager(DynamicMultiStreamManager):
     STREAM_PATHS = 3
     STREAM_LISTINGS = 4
 
-    def __init__(self, filename: Path, secret: bytes):
+    def __init__(
+            self, filename: Path, secret: bytes, readonly: bool = False, mapped: bool = False,
+            version: int = BLOCK_VERSION_1
+    ):
         self.__descriptors = dict()
         self.__entries = None
         self.__paths = None
         self.__listings = None
-        DynamicMultiStreamManager.__init__(self, filename, secret)
+        DynamicMultiStreamManager.__init__(self, filename, secret, readonly, mapped, version)
 
     def __start(self):
         self.__entries = EntryRegistry(self)
@@ -467,7 +471,7 @@ class FileSystemStreamManager(DynamicMultiStreamManager):
         self.__start()
 
     def _close(self):
-        for vfd in self.__descriptors.values():
+        for vfd in list(self.__descriptors.values()):  # Closing removes the descriptor
             vfd.close()
 
         self.__entries.close()
@@ -750,6 +754,9 @@ class FileSystemStreamManager(DynamicMultiStreamManager):
         if identity in self.__descriptors.keys():
             raise VirtualFSError(*VirtualFSError.FILE_ALREADY_OPEN)
 
+        if self.readonly and set(mode) - set("rb"):
+            raise VirtualFSError(*VirtualFSError.READ_ONLY, {"mode": mode})
+
         try:
             entry = EntryRecord.meta_unpack(self.__entries.tree.get(key=identity))
         except RecordError:
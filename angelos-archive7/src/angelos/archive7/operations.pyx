@@ -21,7 +21,7 @@ from collections.abc import Iterator
 from io import FileIO, SEEK_END
 from typing import Union, Generator
 
-from angelos.archive7.base import BLOCK_SIZE, FORMAT_BLOCK, BlockTuple
+from angelos.archive7.base import BLOCK_SIZE, FORMAT_BLOCK, BLANK_DIGEST, BlockTuple
 from angelos.bin.nacl import SecretBox, CryptoBox
 
 
@@ -172,8 +172,8 @@ class CorruptDataFilter(DataFilter):
         self._data = set()
 
     def analyze(self, block: BlockTuple, pos: int):
-        """Analyze blocks for data corruption"""
-        if hashlib.sha1(block.data).digest() != block.digest:
+        """Analyze blocks for data corruption, version 2 blocks have no digest to check."""
+        if block.digest != BLANK_DIGEST and hashlib.sha1(block.data).digest() != block.digest:
             self._data.add(pos)
             return True
         else:
@@ -14,19 +14,21 @@
 #
 """Data streams."""
 import hashlib
+import mmap
 import os
 import struct
 import uuid
 from abc import abstractmethod, ABC
+from concurrent.futures import ThreadPoolExecutor
 from os import SEEK_CUR, SEEK_SET, SEEK_END
 from pathlib import Path
 from typing import Union
 
 from angelos.archive7.base import BLOCK_SIZE, DATA_SIZE, FORMAT_BLOCK, SIZE_BLOCK, FORMAT_STREAM, SIZE_STREAM, \
-    BlockError, StreamError, BaseFileObject, StreamManagerError
+    BLOCK_VERSION_1, BLOCK_VERSION_2, BLANK_DIGEST, BlockError, StreamError, BaseFileObject, StreamManagerError
 from angelos.archive7.tree import SimpleBTree
 from angelos.psi.filelock import FileLock
-from angelos.bin.nacl import SecretBox
+from angelos.bin.nacl import SecretBox, CryptoFailure
 
 BLANK_DATA = b"\x00" * DATA_SIZE
 BLANK_BLOCK = struct.pack(
@@ -47,18 +49,23 @@ class StreamBlock:
         self.stream. 16 bytes, unsigned integer setting stream id.
         self.digest. 20 bytes, sha1 digest of the data field.
         self.data. 4004 bytes
+
+    Version 2 blocks leave the digest blank and rely on the authenticated encryption of the block, which
+    already rejects any tampered or corrupt block. The blank digest tells the versions apart when loading.
     """
 
-    __slots__ = ["__position", "previous", "next", "index", "stream", "digest", "data"]
+    __slots__ = ["__position", "previous", "next", "index", "stream", "digest", "data", "version"]
 
     FORMAT = FORMAT_BLOCK
     SIZE = SIZE_BLOCK
 
     def __init__(
             self, position: int, previous: int = -1, next: int = -1, index: int = 0,
-            stream: uuid.UUID = uuid.UUID(int=0), block: bytes = None
+            stream: uuid.UUID = uuid.UUID(int=0), block: Union[bytes, bytearray] = None,
+            version: int = BLOCK_VERSION_1
     ):
         self.__position = position
+        self.version = version
 
         self.previous = previous
         self.next = next
@@ -78,11 +85,11 @@ class StreamBlock:
         """Expose stream block position in file."""
         return self.__position
 
-    def load_meta(self, block: bytes):
+    def load_meta(self, block: Union[bytes, bytearray]):
         """Unpack a block of bytes into its components and populate the fields
 
         Args:
-            block (bytes):
+            block (Union[bytes, bytearray]):
                 Bytes to be read into a data block.
 
         Returns (bool):
@@ -98,6 +105,11 @@ class StreamBlock:
         self.stream = uuid.UUID(bytes=stream)
         self.data[:] = data[:]
 
+        if self.digest == BLANK_DIGEST:
+            self.version = BLOCK_VERSION_2
+            return
+
+        self.version = BLOCK_VERSION_1
         if hashlib.sha1(self.data).digest() != self.digest:
             raise BlockError(*BlockError.DIGEST_MISMATCH, {"position": self.__position})
 
@@ -124,7 +136,7 @@ class StreamBlock:
             self.next,
             self.index,
             self.stream.bytes,
-            hashlib.sha1(self.data).digest(),
+            hashlib.sha1(self.data).digest() if self.version == BLOCK_VERSION_1 else BLANK_DIGEST,
             self.data
         )
 
@@ -149,7 +161,7 @@ class BaseStream:  # (Iterable, Reversible):
 
     __slots__ = [
         "_manager", "_block", "__changed", "_identity", "_begin",
-        "_end", "_count", "_length", "_compression"
+        "_end", "_count", "_length", "_compression", "_ahead"
     ]
 
     COMP_NONE = 0
@@ -164,6 +176,7 @@ class BaseStream:  # (Iterable, Reversible):
         self._manager = manager
         self._block = block
         self.__changed = False
+        self._ahead = dict()
         block.stream = identity
 
         self._identity = identity
@@ -284,6 +297,7 @@ class BaseStream:  # (Iterable, Reversible):
     def changed(self):
         """Indicate that the current block has been written to."""
         self.__changed = True
+        self._ahead.clear()
 
     def save(self, enforce: bool = False):
         """Save current block if changed or enforced.
@@ -320,10 +334,39 @@ class BaseStream:  # (Iterable, Reversible):
             return False
         else:
             self.save()
-            block = self._manager.load_block(to)
+            block = self._ahead.pop(to, None)
+            if not block:
+                self._ahead.clear()
+                block = self._manager.load_block(to)
             self._block = block
             return True
 
+    def readahead(self, count: int):
+        """Load and decrypt up to count blocks following the current block in parallel.
+
+        The position of a block is only known from the previous block, but blocks of a stream are mostly
+        laid out in order in the file. The blocks after the next one are therefore guessed, and the guesses
+        are kept for as long as they chain up. Stepping forward uses the kept blocks.
+
+        Args:
+            count (int):
+                Number of blocks to read ahead.
+
+        """
+        count = min(count, self._count - self._block.index - 1)
+        if count < 2 or self._block.next == -1 or self._block.next in self._ahead:
+            return
+
+        first = self._block.next
+        expected = first
+        index = self._block.index + 1
+        for block in self._manager.load_blocks(first, count):
+            if not block or block.position != expected or block.stream != self._identity or block.index != index:
+                break
+            self._ahead[block.position] = block
+            expected = block.next
+            index += 1
+
     def end(self):
         """Forcefully wind to the end of stream."""
         self.__step(self._end)
@@ -347,6 +390,7 @@ class BaseStream:  # (Iterable, Reversible):
         if self._block.next != -1:
             raise StreamError(*StreamError.PUSH_FRONT_ERROR)
 
+        self._ahead.clear()
         block.index = self._count  # The current count is the same as the new index
         block.stream = self._identity
         block.previous = self._block.position
@@ -366,6 +410,7 @@ class BaseStream:  # (Iterable, Reversible):
         if self._block.previous == -1:
             raise StreamError(*StreamError.POP_NOT_LAST_ERROR, {"previous": self._block.previous})
 
+        self._ahead.clear()
         block = self._manager.load_block(self._block.previous)
         block.next = -1
         self._end = block.position
@@ -455,6 +500,8 @@ class VirtualFileObject(BaseFileObject):
 
     __slots__ = ["_stream", "_position", "__offset", "__end"]
 
+    READAHEAD = 16  # Maximum number of blocks decrypted ahead on large reads
+
     def __init__(self, stream: DataStream, filename: str, mode: str = "r"):
         self._stream = stream
         self._position = 0
@@ -471,20 +518,21 @@ class VirtualFileObject(BaseFileObject):
         self._stream.close()
 
     def _flush(self):
-        self._stream.save(True)
+        if self.writable():
+            self._stream.save(True)
 
     def _readinto(self, b):
         m = memoryview(b).cast("B")
-        size = min(len(m), self.__end - self._position)
-
-        data = bytearray()
+        size = max(min(len(m), self.__end - self._position), 0)
         cursor = 0
-        # FIXME: Save data here?
 
         while size > cursor:
+            if size - cursor > DATA_SIZE - self.__offset:
+                self._stream.readahead(min((size - cursor + self.__offset) // DATA_SIZE, self.READAHEAD))
+
             num_copy = min(DATA_SIZE - self.__offset, size - cursor)
 
-            data += self._stream.data[self.__offset:self.__offset + num_copy]
+            m[cursor:cursor + num_copy] = memoryview(self._stream.data)[self.__offset:self.__offset + num_copy]
             cursor += num_copy
             self._position += num_copy
             self.__offset += num_copy
@@ -493,9 +541,14 @@ class VirtualFileObject(BaseFileObject):
                 self._stream.next()
                 self.__offset = 0
 
-        n = len(data)
-        m[:n] = data
-        return n
+        return cursor
+
+    def readall(self):
+        """Read until end of file in one go, instead of buffer sized chunks."""
+        data = bytearray(max(self.__end - self._position, 0))
+        n = self.readinto(data)
+        del data[n:]
+        return bytes(data)
 
     def _seek(self, offset, whence):
         if whence == SEEK_SET:
@@ -569,6 +622,11 @@ class Registry(ABC):
     def tree(self):
         return self._tree
 
+    @property
+    def _mode(self) -> str:
+        """File mode for the tree file object, depending on the manager being read-only."""
+        return "rb" if self._manager.readonly else "wb+"
+
     def close(self):
         self._tree.close()
 
@@ -586,7 +644,7 @@ class StreamRegistry(Registry):
         return SimpleBTree.factory(
             VirtualFileObject(
                 self._manager.special_stream(DynamicMultiStreamManager.STREAM_INDEX),
-                "main", "wb+"
+                "main", self._mode
             ),
             order=67,
             value_size=DataStream.SIZE,
@@ -658,20 +716,48 @@ class StreamManager(ABC):
 
     Transparent encryption is built in including standards for carrying out different kind of
     operations on the streams and blocks.
+
+    A manager opened read-only never writes to the file, reads blocks with pread and takes a shared
+    reader lock. Several read-only managers in different processes can therefore use the same file
+    while one writing manager holds the exclusive writer lock. Readers see the blocks as they were
+    when read, the writer is responsible for the consistency of what it publishes.
+
+    A mapped manager reads blocks from a memory map of the file and decrypts them straight from the
+    mapped region into a reusable buffer, the map is renewed when the file has grown.
     """
 
-    __slots__ = ["__created", "__filename", "__closed", "__file", "__secret", "__box", "__count", "__meta", "__blocks",
-                 "__internal", "_streams"]
+    __slots__ = ["__created", "__filename", "__closed", "__readonly", "__mapped", "__map", "__scratch", "__pool",
+                 "__version", "__file", "__secret", "__box", "__count", "__meta", "__blocks", "__internal", "_streams"]
 
     SPECIAL_BLOCK_COUNT = 0
     SPECIAL_STREAM_COUNT = 0
 
     BLOCK_META = 0
 
-    def __init__(self, filename: Path, secret: bytes):
+    # Offsets and lengths of the byte ranges locked exclusively by the writer and shared by the readers. They lie
+    # far past any real data, like the lock bytes of SQLite, since locks on Windows are mandatory and would keep
+    # others from reading and writing the locked bytes.
+    LOCK_WRITER = (2 ** 62, 1)
+    LOCK_READER = (2 ** 62 + 1, 1)
+
+    READAHEAD_WORKERS = min(4, os.cpu_count() or 1)  # Threads decrypting blocks read ahead
+
+    def __init__(
+            self, filename: Path, secret: bytes, readonly: bool = False, mapped: bool = False,
+            version: int = BLOCK_VERSION_1
+    ):
+        if version not in (BLOCK_VERSION_1, BLOCK_VERSION_2):
+            raise StreamManagerError(*StreamManagerError.UNKNOWN_VERSION, {"version": version})
+
         self.__created = False
         self.__filename = filename
         self.__closed = False
+        self.__readonly = readonly
+        self.__mapped = mapped
+        self.__version = version
+        self.__map = None
+        self.__scratch = bytearray(SIZE_BLOCK)
+        self.__pool = None
         self.__file = None
         self.__secret = secret
         self.__box = SecretBox(secret)
@@ -683,10 +769,13 @@ class StreamManager(ABC):
 
         if self.__filename.is_file():
             # Open and use file
-            self.__file = open(self.__filename, "rb+", BLOCK_SIZE)
-            FileLock.acquire(self.__file)
-            self.__file.seek(0, os.SEEK_END)
-            length = self.__file.tell()
+            if self.__readonly:
+                self.__file = open(self.__filename, "rb", 0)
+                FileLock.acquire(self.__file, True, *self.LOCK_READER)
+            else:
+                self.__file = open(self.__filename, "rb+", BLOCK_SIZE)
+                FileLock.acquire(self.__file, False, *self.LOCK_WRITER)
+            length = os.fstat(self.__file.fileno()).st_size
             if length % BLOCK_SIZE:
                 raise StreamManagerError(
                     *StreamManagerError.UNEVEN_ARCHIVE_LENGTH,
@@ -696,6 +785,7 @@ class StreamManager(ABC):
             for i in range(max(self.SPECIAL_BLOCK_COUNT, 1)):
                 self.__blocks[i] = self.load_block(i)
             self.__meta = memoryview(self.__blocks[self.BLOCK_META].data)
+            self.__version = self.__blocks[self.BLOCK_META].version
 
             streams_data = self.__load_meta()
             for i in range(self.SPECIAL_STREAM_COUNT):
@@ -708,10 +798,12 @@ class StreamManager(ABC):
                 self._streams[stream.identity] = stream
 
             self._open()
+        elif self.__readonly:
+            raise StreamManagerError(*StreamManagerError.READ_ONLY, {"filename": self.__filename})
         else:
             # Setup file before using
             self.__file = open(self.__filename, "wb+", BLOCK_SIZE)
-            FileLock.acquire(self.__file)
+            FileLock.acquire(self.__file, False, *self.LOCK_WRITER)
 
             for i in range(max(self.SPECIAL_BLOCK_COUNT, 1)):
                 self.__blocks[i] = self.new_block()
@@ -738,6 +830,41 @@ class StreamManager(ABC):
     def created(self):
         return self.__created
 
+    @property
+    def readonly(self):
+        return self.__readonly
+
+    @property
+    def mapped(self):
+        return self.__mapped
+
+    @property
+    def version(self):
+        """Block format version that blocks are written with."""
+        return self.__version
+
+    def advise(self, sequential: bool = True):
+        """Hint the kernel about the coming access pattern of a mapped manager.
+
+        Sequential access is for scans over the whole archive, such as searches, integrity checks and exports.
+        Hints are ignored if the manager isn't mapped or the platform lacks madvise.
+
+        Args:
+            sequential (bool):
+                Sequential access if True, else normal access.
+
+        """
+        if self.__map is not None and hasattr(self.__map, "madvise"):
+            self.__map.madvise(mmap.MADV_SEQUENTIAL if sequential else mmap.MADV_NORMAL)
+
+    def __remap(self):
+        """Map the whole file anew, after it has grown."""
+        if self.__map is not None:
+            self.__map.close()
+        if not self.__readonly:
+            self.__file.flush()
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
     def close(self):
         if not self.closed:
             self._close()
@@ -745,14 +872,29 @@ class StreamManager(ABC):
             for i in range(self.SPECIAL_STREAM_COUNT):
                 self.__internal[i].close()
                 del self._streams[self.__internal[i].identity]
-            self.__save_meta()
 
-            self.__file.flush()
-            os.fsync(self.__file.fileno())
-            FileLock.release(self.__file)
+            if self.__pool is not None:
+                self.__pool.shutdown()
+                self.__pool = None
+
+            if self.__map is not None:
+                self.__map.close()
+                self.__map = None
+
+            if self.__readonly:
+                FileLock.release(self.__file, *self.LOCK_READER)
+            else:
+                self.__save_meta()
+                self.__file.flush()
+                os.fsync(self.__file.fileno())
+                FileLock.release(self.__file, *self.LOCK_WRITER)
             self.__file.close()
             self.__closed = True
 
+    def __writable(self):
+        if self.__readonly:
+            raise StreamManagerError(*StreamManagerError.READ_ONLY, {"filename": self.__filename})
+
     def __load_meta(self):
         stream_data = list()
         offset = DATA_SIZE - DataStream.SIZE * self.SPECIAL_STREAM_COUNT
@@ -796,12 +938,13 @@ class StreamManager(ABC):
             The newly created block.
 
         """
+        self.__writable()
         block = self.reuse()
 
         if not block:
             offset = self.__file.seek(0, os.SEEK_END)
             index = offset // BLOCK_SIZE
-            block = StreamBlock(position=index)
+            block = StreamBlock(position=index, version=self.__version)
             self.__count += 1
 
             length = self.__file.write(self.__box.encrypt(bytes(block)))
@@ -822,16 +965,77 @@ class StreamManager(ABC):
             Loaded block a stream block.
 
         """
+        if self.__readonly and index >= self.__count:
+            # The writer may have grown the file since we last looked
+            self.__count = os.fstat(self.__file.fileno()).st_size // BLOCK_SIZE
         if not (0 <= index < self.__count):
             raise StreamManagerError(
                 *StreamManagerError.OUT_OF_BOUNDS, {"count": self.__count, "index": index})
         position = index * BLOCK_SIZE
+        if self.__mapped:
+            if self.__map is None or len(self.__map) < position + BLOCK_SIZE:
+                self.__remap()
+            self.__box.decrypt_into(self.__map, self.__scratch, position, BLOCK_SIZE)
+            return StreamBlock(position=index, block=self.__scratch)
+        if self.__readonly:
+            return StreamBlock(
+                position=index, block=self.__box.decrypt(os.pread(self.__file.fileno(), BLOCK_SIZE, position)))
         offset = self.__file.seek(position)
         if position != offset:
             raise StreamManagerError(
                 *StreamManagerError.BLOCK_SEEK_ERROR, {"position": position, "offset": offset})
         return StreamBlock(position=index, block=self.__box.decrypt(self.__file.read(BLOCK_SIZE)))
 
+    def load_blocks(self, index: int, count: int) -> list:
+        """Load a range of consecutive blocks and decrypt them in parallel.
+
+        The range is read with one call and the blocks are decrypted by a small thread pool. This is
+        meant for reading ahead, blocks that fail to load are None instead of raising an error.
+
+        Args:
+            index (int):
+                Index of the first block.
+            count (int):
+                Number of blocks, the range is cut off at the end of file.
+
+        Returns (list):
+            Loaded blocks as stream blocks or None.
+
+        """
+        if self.__readonly and index + count > self.__count:
+            self.__count = os.fstat(self.__file.fileno()).st_size // BLOCK_SIZE
+        count = min(count, self.__count - index)
+        if index < 0 or count < 1:
+            return list()
+
+        if self.__mapped:
+            if self.__map is None or len(self.__map) < (index + count) * BLOCK_SIZE:
+                self.__remap()
+            source = self.__map
+            offset = index * BLOCK_SIZE
+        elif self.__readonly:
+            source = os.pread(self.__file.fileno(), count * BLOCK_SIZE, index * BLOCK_SIZE)
+            offset = 0
+        else:
+            self.__file.seek(index * BLOCK_SIZE)
+            source = self.__file.read(count * BLOCK_SIZE)
+            offset = 0
+        count = min(count, (len(source) - offset) // BLOCK_SIZE)
+
+        def load(i: int) -> StreamBlock:
+            buffer = bytearray(SIZE_BLOCK)
+            try:
+                self.__box.decrypt_into(source, buffer, offset + i * BLOCK_SIZE, BLOCK_SIZE)
+                return StreamBlock(position=index + i, block=buffer)
+            except (CryptoFailure, BlockError):
+                return None
+
+        if self.READAHEAD_WORKERS < 2:
+            return [load(i) for i in range(count)]
+        if self.__pool is None:
+            self.__pool = ThreadPoolExecutor(max_workers=self.READAHEAD_WORKERS)
+        return list(self.__pool.map(load, range(count)))
+
     def save_block(self, index: int, block: StreamBlock):
         """Save a block and encrypt it.
 
@@ -842,6 +1046,7 @@ class StreamManager(ABC):
                 Block to save to file.
 
         """
+        self.__writable()
         if not (0 <= index < self.__count):
             raise StreamManagerError(
                 *StreamManagerError.OUT_OF_BOUNDS, {"count": self.__count, "index": index})
@@ -855,6 +1060,7 @@ class StreamManager(ABC):
             raise StreamManagerError(
                 *StreamManagerError.FAILED_SEEK_POSITION,
                 {"searh": position, "found": offset})
+        block.version = self.__version
         length = self.__file.write(self.__box.encrypt(bytes(block)))
         self.__file.flush()
         os.fsync(self.__file.fileno())
@@ -862,6 +1068,48 @@ class StreamManager(ABC):
             raise StreamManagerError(
                 *StreamManagerError.FAILED_FULL_WRITE, {"wrote": length, "size": BLOCK_SIZE})
 
+    def upgrade(self, version: int = BLOCK_VERSION_2):
+        """Rewrite all blocks in place with another block format version.
+
+        No readers may have the file open meanwhile. The special blocks are written last, so an interrupted
+        upgrade leaves a readable file of mixed versions that still reports the old version, and that can be
+        upgraded again.
+
+        Args:
+            version (int):
+                Block format version to rewrite blocks with.
+
+        """
+        self.__writable()
+        if version not in (BLOCK_VERSION_1, BLOCK_VERSION_2):
+            raise StreamManagerError(*StreamManagerError.UNKNOWN_VERSION, {"version": version})
+        try:
+            FileLock.acquire(self.__file, False, *self.LOCK_READER)
+        except OSError:
+            raise StreamManagerError(*StreamManagerError.IN_USE, {"filename": self.__filename})
+
+        try:
+            for index in range(len(self.__blocks), self.__count):
+                block = self.load_block(index)
+                if block.version == version:
+                    continue
+                block.version = version
+                self.__file.seek(index * BLOCK_SIZE)
+                length = self.__file.write(self.__box.encrypt(bytes(block)))
+                if length != BLOCK_SIZE:
+                    raise StreamManagerError(
+                        *StreamManagerError.FAILED_FULL_WRITE, {"wrote": length, "size": BLOCK_SIZE})
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+            self.__version = version
+            for block in self.__blocks:
+                if block.position != self.BLOCK_META:
+                    self.save_block(block.position, block)
+            self.__save_meta()
+        finally:
+            FileLock.release(self.__file, *self.LOCK_READER)
+
     def special_stream(self, position: int):
         """Receive one of the 3 reserved special streams."""
         if 0 <= position < self.SPECIAL_STREAM_COUNT:
@@ -961,8 +1209,11 @@ class DynamicMultiStreamManager(FixedMultiStreamManager):
 
     STREAM_INDEX = 1
 
-    def __init__(self, filename: Path, secret: bytes):
-        StreamManager.__init__(self, filename, secret)
+    def __init__(
+            self, filename: Path, secret: bytes, readonly: bool = False, mapped: bool = False,
+            version: int = BLOCK_VERSION_1
+    ):
+        StreamManager.__init__(self, filename, secret, readonly, mapped, version)
         self.__registry = StreamRegistry(self)
 
     def _close(self):
@@ -1019,7 +1270,8 @@ class DynamicMultiStreamManager(FixedMultiStreamManager):
         if stream.identity not in self._streams:
             raise StreamManagerError(*StreamManagerError.NOT_OPEN, {"identity": stream.identity})
         stream.save()
-        self.__registry.update(stream)
+        if not self.readonly:
+            self.__registry.update(stream)
         del self._streams[stream.identity]
         del stream
 
@@ -13,20 +13,35 @@
 #     Kristoffer Paulsson - initial implementation
 #
 """Archive utility."""
+import asyncio
 import binascii
+import datetime
+import functools
 import getpass
 import hashlib
 import logging
 import math
+import os
+import queue
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
 
+from angelos.archive7.archive import Archive7, Archive7Error
+from angelos.archive7.base import DATA_SIZE
+from angelos.archive7.fs import TYPE_DIR, TYPE_FILE
 from angelos.bin.nacl import SecretBox
 
 BYTES_SUF = ("B", "KiB", "MiB", "GiB", "TiB", "PiB", "EiB", "ZiB", "YiB")
 ENDING_SUF = (".ar7", ".log.ar7", ".tar.ar7")
 REGEX_KEY = r"^[0-9a-fA-F]{64}$"
 
+CHUNK_SIZE = DATA_SIZE * 256  # Chunk size of transfers, whole blocks of about 1 MiB
+QUEUE_DEPTH = 4  # Chunks read ahead from a host file
+
 def out(*args):
     """Stream wrapper for sys.stdout."""
     sys.stdout.write(" ".join([str(s) for s in args]) + "\n")
@@ -76,9 +91,268 @@ def get_key(args, generate=False):
 
 def file_size(size):
     """Human readable filesize."""
-    order = int(math.log2(size) / 10) if size else 0
+    order = int(math.log2(size) / 10) if size >= 1 else 0
     return "{:<5.4g} {:}".format(size / (1 << (order * 10)), BYTES_SUF[order])
 
+
+class Progress:
+    """Progress and throughput of a tree transfer."""
+
+    def __init__(self, quiet: bool = False, verbose: bool = False):
+        self.__quiet = quiet
+        self.__verbose = verbose
+        self.__start = time.monotonic()
+        self.__last = self.__start
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def done(self, path, size: int):
+        """Count a transferred file and report throughput about once a second."""
+        self.files += 1
+        self.bytes += size
+        if self.__verbose:
+            out(path, file_size(size))
+        now = time.monotonic()
+        if not self.__quiet and now - self.__last >= 1:
+            self.__last = now
+            out(self.report())
+
+    def failed(self, path, error: Exception):
+        """Count and report a file that failed to transfer."""
+        self.errors += 1
+        if not self.__quiet:
+            err("Failed:", path, "({})".format(error))
+
+    def report(self) -> str:
+        """Summary of the transfer so far."""
+        elapsed = max(time.monotonic() - self.__start, 0.001)
+        return "{} files, {}in {:.1f} s, {}/s{}".format(
+            self.files, file_size(self.bytes), elapsed, file_size(self.bytes / elapsed),
+            ", {} failed".format(self.errors) if self.errors else ""
+        )
+
+
+def unix_owner(stat: os.stat_result) -> dict:
+    """Unix user, group and permissions of a host file."""
+    owner = {"perms": stat.st_mode & 0o777}
+    try:
+        import grp
+        import pwd
+        owner["user"] = pwd.getpwuid(stat.st_uid).pw_name
+        owner["group"] = grp.getgrgid(stat.st_gid).gr_name
+    except (ImportError, KeyError):
+        pass
+    return owner
+
+
+def _put(chunks: queue.Queue, item, cancel: threading.Event):
+    """Put on queue unless cancelled."""
+    while not cancel.is_set():
+        try:
+            chunks.put(item, timeout=.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _pump(path: Path, chunks: queue.Queue, cancel: threading.Event):
+    """Read a host file in chunks onto a queue, ending with None or an error."""
+    try:
+        with open(path, "rb") as fd:
+            for chunk in iter(functools.partial(fd.read, CHUNK_SIZE), b""):
+                _put(chunks, chunk, cancel)
+        _put(chunks, None, cancel)
+    except OSError as e:
+        _put(chunks, e, cancel)
+
+
+def _drain(chunks: queue.Queue):
+    """Iterate over the chunks of a queue."""
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        elif isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
+
+
+async def _import_file(archive: Archive7, host: ThreadPoolExecutor, path: Path, target: PurePosixPath, unix: bool):
+    """Import one host file, large files are read in chunks by a host thread while being written."""
+    loop = asyncio.get_running_loop()
+    stat = path.stat()
+    kwargs = unix_owner(stat) if unix else dict()
+    cancel = threading.Event()
+    pump = None
+
+    if stat.st_size <= CHUNK_SIZE:
+        data = await loop.run_in_executor(host, path.read_bytes)
+    else:
+        chunks = queue.Queue(QUEUE_DEPTH)
+        pump = loop.run_in_executor(host, _pump, path, chunks, cancel)
+        data = _drain(chunks)
+
+    try:
+        await archive.mkfile(
+            target, data, created=datetime.datetime.fromtimestamp(stat.st_ctime),
+            modified=datetime.datetime.fromtimestamp(stat.st_mtime), length=stat.st_size, **kwargs)
+    finally:
+        if pump:
+            cancel.set()
+            await pump
+    return stat.st_size
+
+
+async def import_tree(
+        archive: Archive7, source: Path, target: PurePosixPath, progress: Progress,
+        workers: int = 4, unix: bool = False
+):
+    """Import a host directory tree into an archive directory.
+
+    Directories are created first in one archive operation, then several files are read from the host in
+    parallel while the archive writes them one at a time, each entry with its metadata at once.
+    """
+    dirs = [(PurePosixPath(*target.parts[:part + 1]), dict()) for part in range(1, len(target.parts))]
+    files = list()
+    for dirpath, dirnames, filenames in os.walk(source):
+        base = PurePosixPath(target, *Path(dirpath).relative_to(source).parts)
+        for dirname in sorted(dirnames):
+            dirs.append((
+                PurePosixPath(base, dirname), unix_owner(Path(dirpath, dirname).stat()) if unix else dict()))
+        for filename in sorted(filenames):
+            files.append((Path(dirpath, filename), PurePosixPath(base, filename)))
+
+    await archive.mkdirs(dirs)
+
+    limit = asyncio.Semaphore(workers)
+
+    async def transfer(path: Path, dest: PurePosixPath):
+        async with limit:
+            try:
+                progress.done(dest, await _import_file(archive, host, path, dest, unix))
+            except (OSError, Archive7Error, RuntimeError) as e:
+                progress.failed(path, e)
+
+    with ThreadPoolExecutor(max_workers=workers) as host:
+        await asyncio.gather(*[transfer(path, dest) for path, dest in files])
+
+
+async def _export_file(archive: Archive7, host: ThreadPoolExecutor, path: PurePosixPath, dest: Path, entry,
+                       force: bool, unix: bool):
+    """Export one archive file, writing a chunk to the host while reading the next one."""
+    loop = asyncio.get_running_loop()
+    if dest.exists() and not force:
+        raise FileExistsError(dest)
+
+    length = 0
+    vfd = await archive.load(path, fd=True)
+    try:
+        fd = await loop.run_in_executor(host, open, dest, "wb")
+        pending = None
+        try:
+            while True:
+                chunk = await archive.execute(vfd.read, CHUNK_SIZE)
+                if pending:
+                    await pending
+                    pending = None
+                if not chunk:
+                    break
+                length += len(chunk)
+                pending = loop.run_in_executor(host, fd.write, chunk)
+        finally:
+            if pending:
+                await pending
+            await loop.run_in_executor(host, fd.close)
+    finally:
+        await archive.execute(vfd.close)
+
+    modified = entry.modified.timestamp()
+    os.utime(dest, (modified, modified))
+    if unix:
+        os.chmod(dest, entry.perms)
+    return length
+
+
+async def export_tree(
+        archive: Archive7, source: PurePosixPath, output: Path, progress: Progress,
+        workers: int = 4, force: bool = False, unix: bool = False
+):
+    """Export an archive directory tree to a host directory.
+
+    The archive is walked once for directories and files, then several files are written to the
+    host in parallel while the archive reads them one at a time. Links are not exported.
+    """
+    files = list()
+    async for entry, path in archive.search(Archive7.Query()):
+        if path != source and source not in path.parents:
+            continue
+        dest = Path(output, *path.relative_to(source).parts)
+        if entry.type == TYPE_DIR:
+            dest.mkdir(parents=True, exist_ok=True)
+        elif entry.type == TYPE_FILE:
+            files.append((entry, path, dest))
+
+    limit = asyncio.Semaphore(workers)
+
+    async def transfer(entry, path: PurePosixPath, dest: Path):
+        async with limit:
+            try:
+                progress.done(path, await _export_file(archive, host, path, dest, entry, force, unix))
+            except (OSError, Archive7Error, RuntimeError) as e:
+                progress.failed(path, e)
+
+    with ThreadPoolExecutor(max_workers=workers) as host:
+        await asyncio.gather(*[transfer(entry, path, dest) for entry, path, dest in files])
+
+
+async def run_import_tree(args, parser):
+    """Import a directory tree from the command line."""
+    filename = Path(args.import_tree[0])
+    source = Path(args.import_tree[1])
+    target = PurePosixPath(args.import_tree[2] if len(args.import_tree) > 2 else "/")
+    if not source.is_dir():
+        parser.error("Source must be a directory: {}".format(source))
+    if not target.is_absolute():
+        parser.error("Archive directory must be an absolute path: {}".format(target))
+
+    key = get_key(args, not filename.exists())
+    if filename.exists():
+        archive = Archive7.open(filename, key)
+    else:
+        archive = Archive7.setup(filename, key, title=filename.name)
+
+    progress = Progress(args.quite, args.verbose)
+    try:
+        await import_tree(archive, source, target, progress, args.workers, args.unix)
+    finally:
+        archive.close()
+
+    if not args.quite:
+        out("Imported", progress.report())
+
+
+async def run_export_tree(args, parser):
+    """Export a directory tree from the command line."""
+    filename = Path(args.export_tree[0])
+    output = Path(args.export_tree[1])
+    source = PurePosixPath(args.export_tree[2] if len(args.export_tree) > 2 else "/")
+    if not filename.is_file():
+        parser.error("Archive not found: {}".format(filename))
+    if not source.is_absolute():
+        parser.error("Archive directory must be an absolute path: {}".format(source))
+
+    output.mkdir(parents=True, exist_ok=True)
+    archive = Archive7.open(filename, get_key(args), readonly=True, mapped=True)
+    progress = Progress(args.quite, args.verbose)
+    try:
+        await export_tree(archive, source, output, progress, args.workers, args.force, args.unix)
+    finally:
+        archive.close()
+
+    if not args.quite:
+        out("Exported", progress.report())
+
 def main():
     """Ar7 utility main method."""
     import argparse
@@ -127,6 +401,14 @@ def main():
         default=False,
         help="Verbose output",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        metavar="<n>",
+        type=int,
+        default=4,
+        help="Parallel host file transfers for tree import/export",
+    )
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument(
@@ -149,15 +431,34 @@ def main():
     group.add_argument(
         "-t", "--test", metavar="<archive>", help="Test if a archive is valid"
     )
+    group.add_argument(
+        "-i",
+        "--import-tree",
+        nargs="+",
+        metavar=("<archive>", "<source_dir>"),
+        help="Import directory tree into archive, optionally into <archive_dir>",
+    )
+    group.add_argument(
+        "-x",
+        "--export-tree",
+        nargs="+",
+        metavar=("<archive>", "<output_dir>"),
+        help="Export directory tree from archive, optionally from <archive_dir>",
+    )
 
     args = parser.parse_args()
 
     if args.zip and not args.create:
         parser.error("-z/--zip can only be used with -c/--create.")
-    if args.unix and not (args.create or args.extract):
+    if args.unix and not (args.create or args.extract or args.import_tree or args.export_tree):
         parser.error(
-            "-u/--unix can only be used " + "with -c/--create or -e/--extract."
+            "-u/--unix can only be used " + "with -c/--create, -e/--extract, -i/--import-tree or -x/--export-tree."
         )
+    for tree in (args.import_tree, args.export_tree):
+        if tree is not None and not 2 <= len(tree) <= 3:
+            parser.error("-i/--import-tree and -x/--export-tree take two or three arguments.")
+    if args.workers < 1:
+        parser.error("-w/--workers must be at least 1.")
     if args.quite and not args.key:
         parser.error("-f/--force can only be used with -e/--extract.")
     if args.verbose and args.quite:
@@ -178,6 +479,10 @@ def main():
         elif args.create is not None:
             # run_create(args, parser)
             pass
+        elif args.import_tree is not None:
+            asyncio.run(run_import_tree(args, parser))
+        elif args.export_tree is not None:
+            asyncio.run(run_export_tree(args, parser))
 
     except (binascii.Error, ValueError) as e:
         if args.verbose:
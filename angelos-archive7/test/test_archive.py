@@ -15,17 +15,33 @@
 import copy
 import os
 import random
+import subprocess
+import sys
 from collections import Counter
 from pathlib import PurePosixPath, Path
 from tempfile import TemporaryDirectory
 from unittest.case import TestCase
 
-from angelos.archive7.archive import Archive7, Header
+from angelos.archive7.archive import Archive7, Header, Archive7Error
+from angelos.archive7.base import DATA_SIZE, BLOCK_VERSION_1, BLOCK_VERSION_2
 
 from test import run_async
 from test.fixture.generate import Generate
 from test.fixture.lipsum import LIPSUM_PATH
 
+OPENER = """
+import sys
+from pathlib import Path
+from angelos.archive7.archive import Archive7
+try:
+    archive = Archive7.open(Path(sys.argv[1]), bytes.fromhex(sys.argv[2]), readonly=sys.argv[3] == "reader")
+except OSError:
+    sys.exit(2)
+print(archive.stats().owner, flush=True)
+sys.stdin.readline()
+archive.close()
+"""
+
 
 class TestArchive7(TestCase):
     FILE_COUNT = 128
@@ -202,3 +218,131 @@ class TestArchive7(TestCase):
         links = list(self.links.keys())
         total = set([PurePosixPath(path) for path in LIPSUM_PATH] + [PurePosixPath("/")] + files + links)
         self.assertEqual(Counter(globed), Counter(total))
+
+    @run_async
+    async def test_15_readonly(self):
+        reader = Archive7.open(self.filename, self.secret, readonly=True)
+        try:
+            self.assertTrue(reader.readonly)
+            self.assertFalse(self.archive.readonly)
+            self.assertEqual(reader.stats().owner, self.owner)
+            for filename in self.files.keys():
+                data = await reader.load(filename)
+                self.assertEqual(self.files[filename], data)
+
+            filename = random.choice(list(self.files.keys()))
+            with self.assertRaises(Archive7Error):
+                await reader.save(filename, Generate.lipsum())
+            with self.assertRaises(Archive7Error):
+                await reader.mkdir(PurePosixPath("/readonly"))
+            with self.assertRaises(Archive7Error):
+                await reader.load(filename, fd=True, readonly=False)
+        finally:
+            reader.close()
+
+    @run_async
+    async def test_16_mapped(self):
+        reader = Archive7.open(self.filename, self.secret, readonly=True, mapped=True)
+        try:
+            for filename in self.files.keys():
+                data = await reader.load(filename)
+                self.assertEqual(self.files[filename], data)
+
+            self.assertEqual(Counter(await reader.glob()), Counter(await self.archive.glob()))
+        finally:
+            reader.close()
+
+    @run_async
+    async def test_17_readahead(self):
+        data = os.urandom(DATA_SIZE * 40 + 123)
+        filename = PurePosixPath(random.choice(LIPSUM_PATH), Generate.filename())
+        await self.archive.mkfile(filename=filename, data=data)
+        self.assertEqual(await self.archive.load(filename), data)
+
+        vfd = await self.archive.load(filename, fd=True)
+        try:
+            vfd.seek(DATA_SIZE * 3 + 7)
+            self.assertEqual(vfd.read(DATA_SIZE * 20), data[DATA_SIZE * 3 + 7:DATA_SIZE * 23 + 7])
+            self.assertEqual(vfd.read(), data[DATA_SIZE * 23 + 7:])
+        finally:
+            vfd.close()
+
+        for mapped in (False, True):
+            reader = Archive7.open(self.filename, self.secret, readonly=True, mapped=mapped)
+            try:
+                self.assertEqual(await reader.load(filename), data)
+            finally:
+                reader.close()
+
+    @run_async
+    async def test_18_mkfile_chunked(self):
+        data = os.urandom(DATA_SIZE * 5 + 321)
+        filename = PurePosixPath(random.choice(LIPSUM_PATH), Generate.filename())
+        chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+        await self.archive.mkfile(filename=filename, data=iter(chunks))
+        self.assertEqual(await self.archive.load(filename), data)
+        self.assertEqual((await self.archive.info(filename)).length, len(data))
+
+    @run_async
+    async def test_19_upgrade(self):
+        self.assertEqual(self.archive.stats().version, BLOCK_VERSION_1)
+        await self.archive.upgrade()
+        self.assertEqual(self.archive.stats().version, BLOCK_VERSION_2)
+        self.assertEqual(self.archive.stats().owner, self.owner)
+        for filename in self.files.keys():
+            self.assertEqual(self.files[filename], await self.archive.load(filename))
+
+        filename = random.choice(list(self.files.keys()))
+        self.files[filename] = Generate.lipsum()
+        await self.archive.save(filename, self.files[filename])
+        self.archive.close()
+
+        self.archive = Archive7.open(self.filename, self.secret, readonly=True)
+        self.assertEqual(self.archive.stats().version, BLOCK_VERSION_2)
+        for filename in self.files.keys():
+            self.assertEqual(self.files[filename], await self.archive.load(filename))
+
+    @run_async
+    async def test_20_setup_version(self):
+        filename = Path(self.dir.name, "version.ar7")
+        data = os.urandom(DATA_SIZE * 3)
+        with Archive7.setup(filename, self.secret, version=BLOCK_VERSION_2) as archive:
+            self.assertEqual(archive.stats().version, BLOCK_VERSION_2)
+            await archive.mkfile(PurePosixPath("/test.bin"), data)
+
+        with Archive7.open(filename, self.secret) as archive:
+            self.assertEqual(archive.stats().version, BLOCK_VERSION_2)
+            self.assertEqual(await archive.load(PurePosixPath("/test.bin")), data)
+        os.unlink(filename)
+
+    @run_async
+    async def test_21_mkdirs(self):
+        dirs = [PurePosixPath("/many"), PurePosixPath("/many/more"), PurePosixPath("/many/other")]
+        self.assertEqual(await self.archive.mkdirs([(dirname, dict()) for dirname in dirs]), 3)
+        self.assertEqual(await self.archive.mkdirs([(dirname, dict()) for dirname in dirs]), 0)
+        for dirname in dirs:
+            self.assertTrue(await self.archive.isdir(dirname))
+
+    def opener(self, role: str) -> subprocess.Popen:
+        """Open the archive in another process, which keeps it open until told to close."""
+        return subprocess.Popen(
+            [sys.executable, "-c", OPENER, str(self.filename), self.secret.hex(), role],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+    def test_22_processes(self):
+        reader = self.opener("reader")
+        try:
+            self.assertEqual(reader.stdout.readline().strip(), str(self.owner))  # Reads beside the writer
+            writer = self.opener("writer")
+            self.assertEqual(writer.wait(10), 2)  # Refused while this process writes
+
+            self.archive.close()
+            writer = self.opener("writer")
+            self.assertEqual(writer.stdout.readline().strip(), str(self.owner))  # Writes beside the reader
+            writer.communicate("\n", 10)
+            self.assertEqual(writer.returncode, 0)
+        finally:
+            reader.communicate("\n", 10)
+            self.archive = Archive7.open(self.filename, self.secret)
+        self.assertEqual(reader.returncode, 0)
@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2018-2020 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import os
+from pathlib import Path, PurePosixPath
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from angelos.archive7.archive import Archive7
+from angelos.archive7.utility import CHUNK_SIZE, Progress, export_tree, import_tree
+
+from test import run_async
+
+
+class TestUtility(TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        self.secret = os.urandom(32)
+        self.filename = Path(self.dir.name, "test.ar7")
+        self.source = Path(self.dir.name, "source")
+        self.output = Path(self.dir.name, "output")
+        self.files = {
+            Path("small.txt"): b"Hello, world!",
+            Path("empty.bin"): b"",
+            Path("a/b/large.bin"): os.urandom(CHUNK_SIZE * 2 + 1234),
+            Path("a/c/medium.bin"): os.urandom(CHUNK_SIZE // 3),
+        }
+        for path, data in self.files.items():
+            path = Path(self.source, path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    @run_async
+    async def test_import_export_tree(self):
+        archive = Archive7.setup(self.filename, self.secret)
+        try:
+            progress = Progress(quiet=True)
+            await import_tree(archive, self.source, PurePosixPath("/import/here"), progress, workers=2)
+            self.assertEqual(progress.files, len(self.files))
+            self.assertEqual(progress.errors, 0)
+            for path, data in self.files.items():
+                self.assertEqual(await archive.load(PurePosixPath("/import/here", *path.parts)), data)
+        finally:
+            archive.close()
+
+        archive = Archive7.open(self.filename, self.secret, readonly=True)
+        try:
+            progress = Progress(quiet=True)
+            await export_tree(archive, PurePosixPath("/import/here"), self.output, progress, workers=2)
+            self.assertEqual(progress.files, len(self.files))
+            self.assertEqual(progress.bytes, sum(len(data) for data in self.files.values()))
+            for path, data in self.files.items():
+                self.assertEqual(Path(self.output, path).read_bytes(), data)
+
+            progress = Progress(quiet=True)
+            await export_tree(archive, PurePosixPath("/import/here"), self.output, progress)
+            self.assertEqual(progress.errors, len(self.files))
+        finally:
+            archive.close()
@@ -25,6 +25,9 @@ cdef extern from "sodium.h":
     int crypto_secretbox_open(
             unsigned char *m, const unsigned char *c, unsigned long long clen, const unsigned char *n,
             const unsigned char *k)
+    int crypto_secretbox_open_easy(
+            unsigned char *m, const unsigned char *c, unsigned long long clen, const unsigned char *n,
+            const unsigned char *k) nogil
     size_t crypto_secretbox_noncebytes()
     size_t crypto_secretbox_keybytes()
     size_t crypto_secretbox_zerobytes()
@@ -35,9 +38,9 @@ cdef extern from "sodium.h":
     size_t crypto_sign_publickeybytes()
     int crypto_sign_seed_keypair(unsigned char *pk, unsigned char *sk, const unsigned char *seed)
     int crypto_sign(unsigned char *sm, unsigned long long *smlen_p, const unsigned char *m, unsigned long long mlen,
-                    const unsigned char *sk)
+                    const unsigned char *sk) nogil
     int crypto_sign_open(unsigned char *m, unsigned long long *mlen_p, const unsigned char *sm,
-                         unsigned long long smlen, const unsigned char *pk)
+                         unsigned long long smlen, const unsigned char *pk) nogil
     size_t crypto_box_publickeybytes()
     size_t crypto_box_secretkeybytes()
     int crypto_box_keypair(unsigned char *pk, unsigned char *sk)
@@ -17,6 +17,7 @@ from typing import Union, Tuple
 
 from angelos.bin.nacl cimport crypto_box_beforenm, crypto_box_zerobytes, \
     crypto_box_boxzerobytes, crypto_box_open_afternm, crypto_secretbox, crypto_secretbox_open, \
+    crypto_secretbox_open_easy, \
     crypto_secretbox_noncebytes, crypto_secretbox_keybytes, crypto_secretbox_zerobytes, \
     crypto_secretbox_boxzerobytes, crypto_sign_bytes, crypto_sign_secretkeybytes, \
     crypto_sign_publickeybytes, crypto_sign_seed_keypair, crypto_sign, crypto_sign_open, \
@@ -180,6 +181,31 @@ class SecretBox(BaseKey):
             raise CryptoFailure()
         return message[SIZE_SECRETBOX_ZERO:]
 
+    def decrypt_into(self, crypto, buffer, Py_ssize_t offset = 0, Py_ssize_t length = -1) -> int:
+        """Decrypt length bytes of crypto from offset directly into a preallocated buffer.
+
+        The crypto can be any readable buffer, such as a memory map, and is read in place.
+        The GIL is released during decryption. Returns the length of the message.
+        """
+        cdef const unsigned char[::1] c = crypto
+        cdef unsigned char[::1] m = buffer
+        cdef const unsigned char[::1] k = self._sk
+        cdef Py_ssize_t nonce_len = SIZE_SECRETBOX_NONCE
+        cdef Py_ssize_t msg_len
+        cdef int fail
+
+        if length < 0:
+            length = c.shape[0] - offset
+        msg_len = length - nonce_len - SIZE_SECRETBOX_BOXZERO
+        if offset < 0 or offset + length > c.shape[0] or msg_len < 1 or m.shape[0] < msg_len:
+            raise NaClError(*NaClError.DATA_LENGTH_ERROR)
+
+        with nogil:
+            fail = crypto_secretbox_open_easy(&m[0], &c[offset + nonce_len], length - nonce_len, &c[offset], &k[0])
+        if fail:
+            raise CryptoFailure()
+        return msg_len
+
 
 class Signer(BaseKey):
     def __init__(self, seed: bytes = None):
@@ -202,9 +228,15 @@ class Signer(BaseKey):
 
     def sign(self, message):
         cdef unsigned long long *sig_len = NULL
-        msg_len = len(message)
+        cdef unsigned long long msg_len = len(message)
         signature = bytes(msg_len + SIZE_SIGN)
-        fail = crypto_sign(signature, sig_len, message, msg_len, self._sk)
+        cdef unsigned char *s = signature
+        cdef const unsigned char *m = message
+        cdef const unsigned char *sk = self._sk
+        cdef int fail
+
+        with nogil:  # Lets signing run in parallel from an executor
+            fail = crypto_sign(s, sig_len, m, msg_len, sk)
         if fail:
             raise CryptoFailure()
 
@@ -228,10 +260,15 @@ class Verifier(BaseKey):
         cdef unsigned long long *msg_len_p = NULL
         msg_len_p = &msg_len
 
-        sig_len = len(signature)
+        cdef unsigned long long sig_len = len(signature)
         message = bytes(sig_len)
+        cdef unsigned char *m = message
+        cdef const unsigned char *sm = signature
+        cdef const unsigned char *vk = self._vk
+        cdef int fail
 
-        fail = crypto_sign_open(message, msg_len_p, signature, sig_len, self._vk)
+        with nogil:  # Lets verifying run in parallel from an executor
+            fail = crypto_sign_open(m, msg_len_p, sm, sig_len, vk)
         if fail:
             raise CryptoFailure()
         return message[:msg_len]
@@ -504,13 +541,16 @@ class Backend_25519_ChaChaPoly_BLAKE2b:
 
         return shared
 
-    def _encrypt(self, key: bytes, nonce: bytes, message: bytes, additional: bytes = None) -> bytes:
+    def _encrypt(self, key: bytes, nonce: bytes, message, additional: bytes = None) -> bytes:
+        """Encrypt a message from any readable buffer, such as a memoryview, without copying it first."""
         if len(key) != SIZE_AEAD_CCP_KEY:
             raise NaClError(*NaClError.KEY_LENGTH_ERROR)
         if len(nonce) != SIZE_AEAD_CCP_NONCE:
             raise NaClError(*NaClError.NONCE_LENGTH_ERROR)
 
-        msg_len = len(message)
+        cdef const unsigned char[::1] m = message
+        cdef const unsigned char *m_p = &m[0] if m.shape[0] else NULL
+        msg_len = m.shape[0]
         cdef unsigned long long cipher_len
         cdef unsigned long long *cipher_len_p = NULL
         cipher_len_p = &cipher_len
@@ -519,23 +559,27 @@ class Backend_25519_ChaChaPoly_BLAKE2b:
         fail = 0
         if additional:
             fail = crypto_aead_chacha20poly1305_encrypt(
-                cipher, cipher_len_p, message, msg_len, additional, len(additional), NULL, nonce, key)
+                cipher, cipher_len_p, m_p, msg_len, additional, len(additional), NULL, nonce, key)
         else:
             fail = crypto_aead_chacha20poly1305_encrypt(
-                cipher, cipher_len_p, message, msg_len, NULL, 0, NULL, nonce, key)
+                cipher, cipher_len_p, m_p, msg_len, NULL, 0, NULL, nonce, key)
 
         if fail != 0:
             raise CryptoFailure()
 
         return cipher[:cipher_len]
 
-    def _decrypt(self, key: bytes, nonce: bytes, cipher: bytes, additional: bytes = None) -> bytes:
+    def _decrypt(self, key: bytes, nonce: bytes, cipher, additional: bytes = None) -> bytes:
+        """Decrypt a cipher in place from any readable buffer, such as a memoryview into a receive buffer."""
         if len(key) != SIZE_AEAD_CCP_KEY:
             raise NaClError(*NaClError.KEY_LENGTH_ERROR)
         if len(nonce) != SIZE_AEAD_CCP_NONCE:
             raise NaClError(*NaClError.NONCE_LENGTH_ERROR)
 
-        cipher_len = len(cipher)
+        cdef const unsigned char[::1] c = cipher
+        cipher_len = c.shape[0]
+        if cipher_len < SIZE_AEAD_CCP_BYTES:
+            raise NaClError(*NaClError.DATA_LENGTH_ERROR)
         cdef unsigned long long msg_len
         cdef unsigned long long *msg_len_p = NULL
         msg_len_p = &msg_len
@@ -544,10 +588,10 @@ class Backend_25519_ChaChaPoly_BLAKE2b:
         fail = 0
         if additional:
             fail = crypto_aead_chacha20poly1305_decrypt(
-                message, msg_len_p, NULL, cipher, cipher_len, additional, len(additional), nonce, key)
+                message, msg_len_p, NULL, &c[0], cipher_len, additional, len(additional), nonce, key)
         else:
             fail = crypto_aead_chacha20poly1305_decrypt(
-                message, msg_len_p, NULL, cipher, cipher_len, NULL, 0, nonce, key)
+                message, msg_len_p, NULL, &c[0], cipher_len, NULL, 0, nonce, key)
 
         if fail != 0:
             raise CryptoFailure()
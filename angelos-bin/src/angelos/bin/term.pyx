@@ -18,6 +18,9 @@ and this too https://en.wikipedia.org/wiki/ASCII
 """
 from unicodedata import east_asian_width
 
+from libc.stdlib cimport calloc, malloc, free
+from libc.string cimport memcpy
+
 cdef inline int utf8_len(unsigned char byte) nogil:
     if 0x20 <= byte <= 0x7E:
         return 1
@@ -266,6 +269,10 @@ cdef class Screen:
 
     The lines and columns in the ANSI escape code de facto standard seems to be 1-indexed instead of zero-indexed.
     However the screen uses _x and _y as zero-indexed.
+
+    The glyphs of the screen and the scrollback are kept in one contiguous ring buffer of rows. The screen is a
+    window of rows in the ring starting at _top, preceded by the rows of scrollback. Scrolling moves the window
+    and blanks the rows that enters it, the rows that leaves at the top becomes scrollback.
     """
 
     cdef unsigned short _cols;  # Terminal width
@@ -279,13 +286,14 @@ cdef class Screen:
 
     cdef Dirty *_modified;
 
-    cdef bytes _empty;
-    cdef list _buffer;
-    cdef ByteList _current;
+    cdef unsigned char *_glyphs;  # Ring buffer of rows
+    cdef unsigned int _rows;  # Rows in the ring buffer
+    cdef unsigned int _stride;  # Bytes per row
+    cdef unsigned int _top;  # Ring index of the first screen row
+    cdef unsigned int _capacity;  # Size of the scrollback in rows
+    cdef unsigned int _scrolled;  # Rows in the scrollback
+    cdef unsigned char *_current;  # Current selected line from the ring buffer
     cdef str _line;
-    cdef list _history;
-
-    cdef bytes _modified_bytes;
 
     def __cinit__(self):
         self._x = 0
@@ -299,18 +307,31 @@ cdef class Screen:
 
         self._modified = NULL
 
-    def __init__(self, cols: int, lines: int):
-        # self._empty = self._tileplate()  # Template cell
-        self._buffer = list()  # Buffer of cells
-        self._current = None  # Current selected line from buffer
+        self._glyphs = NULL
+        self._rows = 0
+        self._stride = 0
+        self._top = 0
+        self._capacity = 0
+        self._scrolled = 0
+        self._current = NULL
+
+    def __dealloc__(self):
+        free(self._glyphs)
+        free(self._modified)
+
+    def __init__(self, cols: int, lines: int, scrollback: int = 1000):
         self._line = ""  # Editorial string
-        self._history = list()  # List of historical lines
 
         self._cols = cols
         self._lines = lines
+        self._capacity = scrollback
 
-        for _ in range(self._lines):
-            self._buffer.append(self._new_line(self._cols))
+        self._glyphs = self._allocate(self._lines + self._capacity, self._cols * 7)
+        self._rows = self._lines + self._capacity
+        self._stride = self._cols * 7
+
+        for y in range(self._lines):
+            self._blank(self._row(y), 0, self._cols)
 
         self._current_line()
         self._new_modified()
@@ -335,87 +356,94 @@ cdef class Screen:
         """Height of the PTY."""
         return self._lines
 
-    # def _tileplate(self) -> bytes:
-    #    """Templates a tile from input data and returns it as bytes."""
-    #    return bytes([32, 0, 0, 0, self._fg, self._bg, self._attr])
-
-    cdef ByteList _new_line(self, unsigned int cols):
-        """Create a new line for the buffer, returns a tuple of bytes data and cython Tile memoryview."""
-        cdef unsigned long idx = 0
-        cdef Glyph glyph
-        cdef ByteList byte_list = ByteList(bytes(cols * 7))
-
-        glyph.units[0] = 32
-        glyph.units[1] = 0
-        glyph.units[2] = 0
-        glyph.units[3] = 0
-
-        while idx < self._cols:
-            self._print(byte_list, idx, &glyph)
-            idx += 1
-
-        return byte_list
+    @property
+    def scrollback(self) -> int:
+        """Lines in the scrollback."""
+        return self._scrolled
+
+    cdef unsigned char *_allocate(self, unsigned int rows, unsigned int stride) except NULL:
+        """Allocate a ring buffer of rows."""
+        cdef unsigned char *glyphs = <unsigned char*> malloc(rows * stride if rows * stride else 1)
+        if glyphs == NULL:
+            raise MemoryError()
+        return glyphs
+
+    cdef inline unsigned char *_row(self, unsigned int y) nogil:
+        """Screen row y in the ring buffer."""
+        return self._glyphs + ((self._top + y) % self._rows) * self._stride
+
+    cdef inline void _blank(self, unsigned char *row, unsigned short begin, unsigned short end) nogil:
+        """Fill a span of a row with empty glyphs using colors and attributes."""
+        cdef unsigned long pos = begin * 7
+
+        while pos < end * 7:
+            row[pos] = 32
+            row[pos + 1] = 0
+            row[pos + 2] = 0
+            row[pos + 3] = 0
+            row[pos + 4] = self._fg
+            row[pos + 5] = self._bg
+            row[pos + 6] = self._attr
+            pos += 7
 
-    cdef ByteList _resize_line(self, unsigned int y, unsigned int cols):
-        """Resizes an existing line buffer preserving data."""
-        cdef ByteList byte_list = self._buffer[y]
-        cdef unsigned int size = byte_list.length // 7
+    def _resize(self, unsigned short lines, unsigned short cols):
+        """Resize screen, the bottom rows of the screen are kept and the rows above goes to the scrollback."""
+        cdef unsigned char *glyphs = self._allocate(lines + self._capacity, cols * 7)
+        cdef unsigned int stride = cols * 7, width = imin(self._stride, cols * 7)
+        cdef unsigned int screen = imin(self._lines, lines)
+        cdef unsigned int scrolled = imin(self._scrolled + self._lines - screen, self._capacity)
+        cdef unsigned int first = self._top + self._rows + self._lines - screen - scrolled, idx = 0
+        cdef unsigned char *row
 
-        if size > cols:
-            return ByteList(byte_list.data[:cols * 7])
-        elif size < cols:
-            return ByteList(byte_list.data + bytes((cols - size) * 7))
-        else:
-            return byte_list
+        with nogil:
+            while idx < scrolled + lines:
+                row = glyphs + idx * stride
+                if idx < scrolled + screen:
+                    memcpy(row, self._glyphs + ((first + idx) % self._rows) * self._stride, width)
+                    self._blank(row, self._cols, cols)
+                else:
+                    self._blank(row, 0, cols)
+                idx += 1
 
-    def _resize(self, unsigned short lines, unsigned short cols):
-        """Resize screen."""
-        if self._lines > lines:
-            self._buffer = self._buffer[-lines:]
-            for y in range(lines):
-                self._buffer[y] = self._resize_line(y, cols)
-        elif self._lines < lines:
-            for y in range(self._lines):
-                self._buffer[y] = self._resize_line(y, cols)
-            for _ in range(lines - self._lines):
-                self._buffer.append(self._new_line(cols))
+        free(self._glyphs)
+        self._glyphs = glyphs
+        self._rows = lines + self._capacity
+        self._stride = stride
+        self._top = scrolled
+        self._scrolled = scrolled
 
         self._lines = lines
         self._cols = cols
+        self._goto_y(self._y)
+        self._goto_x(self._x)
         self._current_line()
         self._new_modified()
 
     cdef inline void _current_line(self):
         """Prepare current line when cursor changes vertically."""
-        self._current = self._buffer[self._y]
+        self._current = self._row(self._y)
 
     def _new_modified(self):
         """Create a buffer of dirty screen information."""
-        cdef Dirty *modified_array = NULL
-        modified = bytes(self._lines * sizeof(Dirty))
-        self._modified_bytes = modified
-        modified_array = <Dirty*> modified
-        self._modified = modified_array
-
-    cdef inline void _update(self):
-        """Mark tiles as modified."""
-        cdef unsigned short y = self._y
-
-        # if self._modified[y].updated:
-        #    self._modified[y].begin = imax(0, imin(self._modified[y].begin, self._x-1))
-        #    self._modified[y].end = imin(self._cols-1, imax(self._modified[y].end, self._x))
-        # else:
-        #    self._modified[y].updated = True
-        #    self._modified[y].begin = imax(0, self._x-1)
-        #    self._modified[y].end = imin(self._cols-1, self._x-1)
-
+        cdef Dirty *modified = <Dirty*> calloc(self._lines if self._lines else 1, sizeof(Dirty))
+        if modified == NULL:
+            raise MemoryError()
+        free(self._modified)
+        self._modified = modified
+
+    cdef inline void _touch(self, unsigned short y, unsigned short begin, unsigned short end) nogil:
+        """Mark a span of tiles on a row as modified."""
         if self._modified[y].updated:
-            self._modified[y].begin = imin(self._modified[y].begin, self._x)
-            self._modified[y].end = imax(self._modified[y].end, self._x + 1)
+            self._modified[y].begin = imin(self._modified[y].begin, begin)
+            self._modified[y].end = imax(self._modified[y].end, end)
         else:
             self._modified[y].updated = True
-            self._modified[y].begin = self._x
-            self._modified[y].end = self._x + 1
+            self._modified[y].begin = begin
+            self._modified[y].end = end
+
+    cdef inline void _update(self):
+        """Mark tiles as modified."""
+        self._touch(self._y, self._x, self._x + 1)
 
     cpdef _clear(self):
         """Clears all marks of modification."""
@@ -435,20 +463,20 @@ cdef class Screen:
             while idx < self._lines:
                 self._modified[idx].updated = True
                 self._modified[idx].begin = 0
-                self._modified[idx].end = self._cols - 1
+                self._modified[idx].end = self._cols
                 idx += 1
 
-    cdef inline void _print(self, ByteList view, unsigned short x, Glyph *glyph):
+    cdef inline void _print(self, unsigned char *row, unsigned short x, Glyph *glyph) nogil:
         """Print a glyph to the buffer using colors and attributes."""
         cdef unsigned long pos = x * 7
 
-        view.set(pos, glyph.units[0])
-        view.set(pos + 1, glyph.units[1])
-        view.set(pos + 2, glyph.units[2])
-        view.set(pos + 3, glyph.units[3])
-        view.set(pos + 4, self._fg)
-        view.set(pos + 5, self._bg)
-        view.set(pos + 6, self._attr)
+        if x >= self._cols:
+            return
+
+        memcpy(row + pos, glyph.units, 4)
+        row[pos + 4] = self._fg
+        row[pos + 5] = self._bg
+        row[pos + 6] = self._attr
 
     cdef inline void _move_up(self, unsigned short steps):
         """Move the cursor position up Y steps."""
@@ -515,8 +543,12 @@ cdef class Screen:
         pass
 
     cdef inline void line_feed(self):
-        """Executes the LF control character."""
-        pass
+        """Executes the LF control character, scrolls up at the bottom of the screen."""
+        if self._y + 1 < self._lines:
+            self._move_down(1)
+            self._current_line()
+        else:
+            self.scroll_up(1)
 
     cdef inline void form_feed(self):
         """Executes the FF control character."""
@@ -524,7 +556,7 @@ cdef class Screen:
 
     cdef inline void carriage_return(self):
         """Executes the CR control character."""
-        pass
+        self._goto_x(0)
 
     cdef inline void escape(self):
         """Executes the ESC control character."""
@@ -591,26 +623,30 @@ cdef class Screen:
         If n is 0 (or missing), clear from cursor to end of screen. 
         If n is 1, clear from cursor to beginning of the screen. 
         If n is 2, clear entire screen (and moves cursor to upper left on DOS ANSI.SYS). 
-        If n is 3, clear entire screen and delete all lines saved in the scrollback buffer 
+        If n is 3, delete all lines saved in the scrollback buffer and keep the screen, as xterm does
         (this feature was added for xterm and is supported by other terminal applications).
         """
         cdef unsigned short start = 0, end = self._lines
 
         if alt == 0:
-            start = self._y
+            self.erase_in_line(0)
+            start = self._y + 1
         elif alt == 1:
+            self.erase_in_line(1)
             end = self._y
         elif alt == 2:
             self._goto_x(0)
             self._goto_y(0)
         elif alt == 3:
-            pass  # Empty backbuffer history
+            self._scrolled = 0
+            return
         else:
             return
 
-            # self._empty = bytes([32, 0, 0, 0, self._fg, self._bg, self._attr])
-        for y in range(0, self._y):
-            self._buffer[y] = self._new_line(self._cols)
+        while start < end:
+            self._blank(self._row(start), 0, self._cols)
+            self._touch(start, 0, self._cols)
+            start += 1
         self._current_line()
 
     cdef inline void erase_in_line(self, unsigned short alt):
@@ -622,24 +658,18 @@ cdef class Screen:
         Cursor position does not change.
         """
         cdef unsigned short start = 0, end = self._cols
-        cdef Glyph glyph
 
         if alt == 0:
             start = self._x
         elif alt == 1:
-            end = self._x
+            end = self._x + 1
         elif alt == 2:
             pass
         else:
             return
 
-        glyph.units[0] = 32
-        glyph.units[1] = 0
-        glyph.units[2] = 0
-        glyph.units[3] = 0
-
-        for x in range(start, end):
-            self._print(self._current, x, &glyph)
+        self._blank(self._current, start, end)
+        self._touch(self._y, start, end)
 
     cdef inline void scroll_up(self, unsigned short ups):
         """Scroll whole page up by n (default 1) lines. New lines are added at the bottom."""
@@ -648,10 +678,13 @@ cdef class Screen:
         elif ups > self._lines:
             ups = self._lines
 
-        for _ in range(ups):
-            self._buffer.pop(0)
-            self._buffer.append(self._new_line(self._cols))
+        while ups:
+            self._top = (self._top + 1) % self._rows
+            self._scrolled = imin(self._scrolled + 1, self._capacity)
+            self._blank(self._row(self._lines - 1), 0, self._cols)
+            ups -= 1
         self._current_line()
+        self._smear()
 
     cdef inline void scroll_down(self, unsigned short downs):
         """Scroll whole page down by n (default 1) lines. New lines are added at the top."""
@@ -660,10 +693,13 @@ cdef class Screen:
         elif downs > self._lines:
             downs = self._lines
 
-        for _ in range(downs):
-            self._buffer.pop(self._lines - 1)
-            self._buffer.insert(0, self._new_line(self._cols))
+        while downs:
+            self._top = (self._top + self._rows - 1) % self._rows
+            self._scrolled = imax(<long long> self._scrolled - 1, 0)
+            self._blank(self._row(0), 0, self._cols)
+            downs -= 1
         self._current_line()
+        self._smear()
 
     cdef inline void horizontal_vertical_position(self, unsigned short y, unsigned short x):
         """
@@ -892,15 +928,20 @@ cdef class Screen:
 cdef class Stream(Screen):
     """Stream handler that processes whatever it's fed."""
 
-    def __init__(self, cols: int = 80, lines: int = 24):
-        Screen.__init__(self, cols, lines)
+    def __init__(self, cols: int = 80, lines: int = 24, scrollback: int = 1000):
+        Screen.__init__(self, cols, lines, scrollback)
 
     def _display(self) -> None:
         """Extract all modified buffer data."""
         for y in range(self._lines):
             if self._modified[y].updated:
                 yield y + 1, self._modified[y].begin + 1, self._modified[y].end + 1, \
-                      self._buffer[y].data[self._modified[y].begin * 7:self._modified[y].end * 7]
+                      (<char*> self._row(y))[self._modified[y].begin * 7:self._modified[y].end * 7]
+
+    def _history(self) -> None:
+        """Extract the rows of the scrollback, the oldest first."""
+        for y in range(self._scrolled):
+            yield (<char*> self._row(self._rows + y - self._scrolled))[:self._stride]
 
     cpdef _feed(self, data: bytes):
         """Process input to the terminal."""
@@ -1246,8 +1287,8 @@ cdef class Stream(Screen):
 
 
 class Terminal(Stream):
-    def __init__(self, cols: int = 80, lines: int = 24):
-        Stream.__init__(self, cols, lines)
+    def __init__(self, cols: int = 80, lines: int = 24, scrollback: int = 1000):
+        Stream.__init__(self, cols, lines, scrollback)
 
 
 def print_line(short y, short begin, short end, bytes data) -> bytearray:
@@ -77,6 +77,18 @@ class TestSecretBox(TestCase):
         decrypted = box.decrypt(encrypted)
         self.assertEqual(MESSAGE, decrypted)
 
+    def test_decrypt_into(self):
+        box = SecretBox()
+        encrypted = box.encrypt(MESSAGE)
+        buffer = bytearray(len(MESSAGE))
+        length = box.decrypt_into(b"padding" + encrypted + b"padding", buffer, 7, len(encrypted))
+        self.assertEqual(length, len(MESSAGE))
+        self.assertEqual(MESSAGE, buffer)
+        with self.assertRaises(CryptoFailure):
+            box.decrypt_into(encrypted[:-1] + bytes([encrypted[-1] ^ 1]), buffer)
+        with self.assertRaises(NaClError):
+            box.decrypt_into(encrypted, bytearray(len(MESSAGE) - 1))
+
 
 class TestSigner(TestCase):
     def test_sign(self):
@@ -19,4 +19,31 @@ from angelos.bin.term import Stream
 
 class TestTerminal(TestCase):
     def test_run(self):
-        term = Stream()
\ No newline at end of file
+        term = Stream()
+
+    def test_scroll(self):
+        term = Stream(10, 3, 2)
+        term._feed(b"1\r\n2\r\n3\r\n4\r\n5\r\n6")
+        self.assertEqual(term.scrollback, 2)
+        self.assertEqual([row[:1] for row in term._history()], [b"2", b"3"])
+        self.assertEqual([data[:1] for _, _, _, data in term._display()], [b"4", b"5", b"6"])
+
+        term._feed(b"\x1b[T")
+        self.assertEqual(term.scrollback, 1)
+        self.assertEqual([data[:1] for _, _, _, data in term._display()], [b" ", b"4", b"5"])
+
+        term._feed(b"\x1b[3J")
+        self.assertEqual(term.scrollback, 0)
+        self.assertEqual([data[:1] for _, _, _, data in term._display()], [b" ", b"4", b"5"])
+
+    def test_resize(self):
+        term = Stream(10, 3, 5)
+        term._feed(b"1\r\n2\r\n3")
+        term._resize(2, 12)
+        term._smear()
+        self.assertEqual(term.scrollback, 1)
+        self.assertEqual([(begin, end, data[:1]) for _, begin, end, data in term._display()], [(1, 13, b"2"), (1, 13, b"3")])
+
+        term._resize(4, 6)
+        term._smear()
+        self.assertEqual([data[:1] for _, _, _, data in term._display()], [b"2", b"3", b" ", b" "])
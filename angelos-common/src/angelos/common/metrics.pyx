@@ -0,0 +1,279 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""Process wide metrics, counters, gauges and histograms exposed as Prometheus text.
+
+Metrics are registered once per name in a registry as a family, the values are kept per set of label values.
+Children of a family are looked up once and kept by the instrumented code, so that counting on the hot path
+is an addition to an attribute.
+
+    BYTES = Registry.main().counter("angelos_net_bytes_total", "Bytes on the wire.", ("direction",))
+    BYTES_IN = BYTES.labels("in")
+    BYTES_IN.inc(len(data))
+"""
+import bisect
+import contextlib
+import math
+import time
+from typing import Callable, Iterator, Tuple, Union
+
+
+class MetricsError(RuntimeError):
+    """Errors related to metrics."""
+    TYPE_MISMATCH = ("Metric already registered as another type or with other labels.", 130)
+    LABEL_MISMATCH = ("Wrong number of label values.", 131)
+    INVALID_NAME = ("Invalid metric or label name.", 132)
+
+
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _number(value: Union[int, float]) -> str:
+    """Format a sample value."""
+    if isinstance(value, int):
+        return str(value)
+    elif math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Counter:
+    """Value that only goes up."""
+
+    __slots__ = ("value",)
+
+    TYPE = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1):
+        """Increase the counter."""
+        self.value += amount
+
+    def samples(self) -> Iterator[Tuple[str, tuple, float]]:
+        yield "", (), self.value
+
+
+class Gauge:
+    """Value that goes up and down, or is read from a function when exposed."""
+
+    __slots__ = ("value", "_function")
+
+    TYPE = "gauge"
+
+    def __init__(self):
+        self.value = 0
+        self._function = None
+
+    def inc(self, amount: Union[int, float] = 1):
+        """Increase the gauge."""
+        self.value += amount
+
+    def dec(self, amount: Union[int, float] = 1):
+        """Decrease the gauge."""
+        self.value -= amount
+
+    def set(self, value: Union[int, float]):
+        """Set the gauge."""
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the gauge from a function when exposed, for values that are kept elsewhere."""
+        self._function = function
+
+    def samples(self) -> Iterator[Tuple[str, tuple, float]]:
+        yield "", (), self._function() if self._function else self.value
+
+
+class Histogram:
+    """Distribution of observations in buckets, with the sum and count."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    TYPE = "histogram"
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Observe a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        """Observe the seconds spent in a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> Iterator[Tuple[str, tuple, float]]:
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            yield "_bucket", (("le", _number(float(bound))),), cumulative
+        yield "_sum", (), self.sum
+        yield "_count", (), self.count
+
+
+class Family:
+    """A metric with a name, documentation and the children per label values."""
+
+    KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+    def __init__(self, kind: str, name: str, documentation: str, labels: tuple = (), **kwargs):
+        self._kind = kind
+        self._name = name
+        self._documentation = documentation
+        self._labels = tuple(labels)
+        self._kwargs = kwargs
+        self._children = dict()
+
+    @property
+    def kind(self) -> str:
+        """Type of metric, counter, gauge or histogram."""
+        return self._kind
+
+    @property
+    def name(self) -> str:
+        """Name of the metric."""
+        return self._name
+
+    @property
+    def label_names(self) -> tuple:
+        """Names of the labels."""
+        return self._labels
+
+    def labels(self, *values) -> object:
+        """Child of the family with the label values, created on first use.
+
+        Args:
+            *values:
+                One value per label name, in order.
+
+        Returns (object):
+            Counter, Gauge or Histogram of the label values.
+
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self._labels):
+                raise MetricsError(*MetricsError.LABEL_MISMATCH, {"name": self._name, "labels": self._labels})
+            child = self._children[values] = self.KINDS[self._kind](**self._kwargs)
+        return child
+
+    def remove(self, *values):
+        """Remove the child of the label values."""
+        self._children.pop(tuple(str(value) for value in values), None)
+
+    def exposition(self) -> Iterator[str]:
+        """Lines of Prometheus text for the family."""
+        yield "# HELP {} {}".format(self._name, self._documentation.replace("\\", "\\\\").replace("\n", "\\n"))
+        yield "# TYPE {} {}".format(self._name, self._kind)
+        for values, child in list(self._children.items()):
+            for suffix, extra, value in child.samples():
+                labels = tuple(zip(self._labels, values)) + extra
+                yield "{}{}{} {}".format(
+                    self._name, suffix,
+                    "{" + ",".join("{}=\"{}\"".format(key, _escape(val)) for key, val in labels) + "}"
+                    if labels else "",
+                    _number(value)
+                )
+
+
+class Registry:
+    """Registry of the metric families of the process.
+
+    Registering a name twice returns the family already registered, so modules can declare their metrics
+    at import without depending on each other.
+    """
+
+    __main = None
+
+    def __init__(self):
+        self._families = dict()
+
+    @classmethod
+    def main(cls) -> "Registry":
+        """Global instance of the registry."""
+        if not cls.__main:
+            cls.__main = Registry()
+        return cls.__main
+
+    def __iter__(self):
+        return iter(list(self._families.values()))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._families
+
+    def get(self, name: str) -> Family:
+        """Family of a name or None."""
+        return self._families.get(name)
+
+    def _register(self, kind: str, name: str, documentation: str, labels: tuple, **kwargs) -> Family:
+        """Register a family or return the one already registered."""
+        family = self._families.get(name)
+        if family is not None:
+            if family.kind != kind or family.label_names != tuple(labels):
+                raise MetricsError(*MetricsError.TYPE_MISMATCH, {"name": name})
+            return family
+
+        if not name.replace("_", "").replace(":", "").isalnum() or name[0].isdigit() or not all(
+                label.replace("_", "").isalnum() and label != "le" for label in labels):
+            raise MetricsError(*MetricsError.INVALID_NAME, {"name": name, "labels": labels})
+
+        family = self._families[name] = Family(kind, name, documentation, labels, **kwargs)
+        return family
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Family:
+        """Register a counter."""
+        return self._register("counter", name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()) -> Family:
+        """Register a gauge."""
+        return self._register("gauge", name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Family:
+        """Register a histogram, the buckets are upper bounds in increasing order."""
+        return self._register("histogram", name, documentation, labels, buckets=tuple(sorted(buckets)))
+
+    def exposition(self, prefix: str = "") -> str:
+        """Metrics in the Prometheus text format.
+
+        Args:
+            prefix (str):
+                Only metrics with names beginning with the prefix.
+
+        Returns (str):
+            Text exposition of the metrics.
+
+        """
+        lines = list()
+        for family in sorted(self, key=lambda family: family.name):
+            if family.name.startswith(prefix):
+                lines.extend(family.exposition())
+        return "\n".join(lines) + "\n" if lines else ""
@@ -22,6 +22,7 @@ import logging
 import os
 import re
 import socket
+import time
 import uuid
 from abc import ABC, abstractmethod
 from concurrent.futures.thread import ThreadPoolExecutor
@@ -282,6 +283,45 @@ class LazyAttribute:
         return self.__value
 
 
+class ExpiringCache:
+    """Entries that expire a fixed time after they were set, the oldest are dropped when full."""
+
+    __slots__ = ("_lifetime", "_size", "_entries")
+
+    def __init__(self, lifetime: float, size: int = 4096):
+        self._lifetime = lifetime
+        self._size = size
+        self._entries = dict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any) -> Any:
+        """Value of an entry that hasn't expired, otherwise None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        elif entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def set(self, key: Any, value: Any):
+        """Set an entry that expires after the lifetime."""
+        self._entries.pop(key, None)
+        now = time.monotonic()
+        while self._entries:  # Insertion order is expiry order
+            old = next(iter(self._entries))
+            if len(self._entries) < self._size and self._entries[old][0] >= now:
+                break
+            del self._entries[old]
+        self._entries[key] = (now + self._lifetime, value)
+
+    def discard(self, key: Any):
+        """Forget an entry."""
+        self._entries.pop(key, None)
+
+
 class SyncCallable:
     """Network callable to get around cython callables."""
 
@@ -337,6 +377,55 @@ class Misc:
         except RuntimeError:
             return Loop.main().loop
 
+    @staticmethod
+    def install_uvloop() -> bool:
+        """Install uvloop as event loop policy, if available.
+
+        Loops created after installation are uvloop loops, including those of Loop and Worker.
+        Falls back on the default asyncio loop when uvloop isn't installed.
+
+        Returns (bool):
+            Whether uvloop was installed.
+
+        """
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("uvloop not available, using the default asyncio event loop.")
+            return False
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return True
+
+    @staticmethod
+    def tune_loop(
+            loop: asyncio.AbstractEventLoop, executor: int = None,
+            debug: bool = None, slow_callback: float = None
+    ) -> asyncio.AbstractEventLoop:
+        """Tune an event loop.
+
+        Args:
+            loop (asyncio.AbstractEventLoop):
+                Loop to tune.
+            executor (int):
+                Number of workers of the default executor.
+            debug (bool):
+                Debug mode of the loop.
+            slow_callback (float):
+                Seconds a callback may run before it is logged as slow in debug mode.
+
+        Returns (asyncio.AbstractEventLoop):
+            The same loop.
+
+        """
+        if executor:
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=executor))
+        if debug is not None:
+            loop.set_debug(debug)
+        if slow_callback is not None:
+            loop.slow_callback_duration = slow_callback
+        return loop
+
     @staticmethod
     def urlparse(urlstring: str) -> dict:
         """Parse an angelos url.
@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+from unittest import TestCase
+
+from angelos.common.metrics import Registry, MetricsError
+
+
+class TestRegistry(TestCase):
+    def test_counter(self):
+        registry = Registry()
+        family = registry.counter("test_bytes_total", "Bytes.", ("direction",))
+        family.labels("in").inc(10)
+        family.labels("in").inc()
+        family.labels("out").inc(5)
+
+        self.assertIs(registry.counter("test_bytes_total", "Bytes.", ("direction",)), family)
+        self.assertEqual(registry.exposition(), (
+            "# HELP test_bytes_total Bytes.\n"
+            "# TYPE test_bytes_total counter\n"
+            "test_bytes_total{direction=\"in\"} 11\n"
+            "test_bytes_total{direction=\"out\"} 5\n"
+        ))
+
+    def test_gauge(self):
+        registry = Registry()
+        gauge = registry.gauge("test_queue", "Queue depth.").labels()
+        gauge.inc(3)
+        gauge.dec()
+        self.assertIn("test_queue 2\n", registry.exposition())
+
+        gauge.set_function(lambda: 42)
+        self.assertIn("test_queue 42\n", registry.exposition())
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram("test_seconds", "Latency.", ("op",), buckets=(.1, 1.0)).labels("a\"b")
+        for value in (.05, .1, .5, 5.0):
+            histogram.observe(value)
+
+        text = registry.exposition()
+        self.assertIn("test_seconds_bucket{op=\"a\\\"b\",le=\"0.1\"} 2\n", text)
+        self.assertIn("test_seconds_bucket{op=\"a\\\"b\",le=\"1.0\"} 3\n", text)
+        self.assertIn("test_seconds_bucket{op=\"a\\\"b\",le=\"+Inf\"} 4\n", text)
+        self.assertIn("test_seconds_sum{op=\"a\\\"b\"} 5.65\n", text)
+        self.assertIn("test_seconds_count{op=\"a\\\"b\"} 4\n", text)
+
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 5)
+
+    def test_errors(self):
+        registry = Registry()
+        family = registry.counter("test_total", "Test.", ("a",))
+        with self.assertRaises(MetricsError):
+            registry.gauge("test_total", "Test.", ("a",))
+        with self.assertRaises(MetricsError):
+            family.labels("x", "y")
+        with self.assertRaises(MetricsError):
+            registry.counter("test-total", "Test.")
+        self.assertEqual(registry.exposition("other_"), "")
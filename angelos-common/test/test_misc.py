@@ -0,0 +1,56 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from angelos.common.misc import ExpiringCache
+
+
+class TestExpiringCache(TestCase):
+    def test_get_set(self):
+        cache = ExpiringCache(10)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("a", 3)
+        self.assertEqual(cache.get("a"), 3)
+        self.assertEqual(len(cache), 2)
+        cache.discard("a")
+        cache.discard("c")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 1)
+
+    def test_expire(self):
+        cache = ExpiringCache(10)
+        now = time.monotonic()
+        with patch("time.monotonic", return_value=now):
+            cache.set("a", 1)
+        with patch("time.monotonic", return_value=now + 5):
+            cache.set("b", 2)
+            self.assertEqual(cache.get("a"), 1)
+        with patch("time.monotonic", return_value=now + 11):
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), 2)
+            cache.set("c", 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_full(self):
+        cache = ExpiringCache(10, 3)
+        for key in range(5):
+            cache.set(key, key)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual([cache.get(key) for key in range(5)], [None, None, 2, 3, 4])
@@ -30,6 +30,7 @@ from io import BufferedRWPair, DEFAULT_BUFFER_SIZE
 from angelos.base.app import Application, Extension
 from angelos.base.ext import Logger, Quit, Signal, Arguments
 from angelos.bin.nacl import Signer
+from angelos.common.misc import Misc
 from angelos.common.utils import Util
 from angelos.ctl.network import ClientAdmin, AuthenticationFailure, ServiceNotAvailable
 from angelos.ctl.support import AdminFacade
@@ -192,6 +193,8 @@ class CustomArguments(Arguments):
             type=lambda x: (re.match(r"^[0-9a-fA-F]{64}$", x), binascii.unhexlify(x))[1],
             help="Encryption key"
         )
+        parser.add_argument(
+            "--uvloop", dest="uvloop", action="store_true", help="Use uvloop as event loop if available")
 
 
 class Network(Extension):
@@ -255,6 +258,8 @@ class AngelosAdmin(Application):
     def _initialize(self):
         self.log
         self.args
+        if self.args.uvloop:
+            Misc.install_uvloop()
         logging.debug(Util.headline("Start"))
         self.quit
         # self.signal
@@ -29,6 +29,7 @@ from angelos.document.messages import Message, Mail
 from angelos.document.misc import StoredLetter
 from angelos.lib.helper import Glue
 from angelos.lib.policy.crypto import Crypto
+from angelos.lib.policy.pool import CryptoPool
 from angelos.portfolio.envelope.open import OpenEnvelope
 from angelos.portfolio.envelope.receive import ReceiveEnvelope
 from angelos.portfolio.envelope.validate import ValidateEnvelope
@@ -103,7 +104,8 @@ class MailboxAPI(ApiFacadeExtension):
         if not isinstance(mail, Mail):
             error = True
         sender = await self.facade.storage.vault.load_portfolio(mail.issuer, Groups.VERIFIER)
-        message = ValidateMessage().validate(self.facade.data.portfolio, sender, mail)
+        message = await CryptoPool.main().validate(
+            ValidateMessage, self.facade.data.portfolio.to_portfolio(), sender, mail)
         if not message:
             error = True
 
@@ -143,7 +145,8 @@ class MailboxAPI(ApiFacadeExtension):
         if not isinstance(envelope, Envelope):
             error = True
         sender = await self.facade.storage.vault.load_portfolio(envelope.issuer, Groups.VERIFIER)
-        message = ValidateEnvelope().validate(self.facade.data.portfolio, sender, envelope)
+        message = await CryptoPool.main().validate(
+            ValidateEnvelope, self.facade.data.portfolio.to_portfolio(), sender, envelope)
         status = await self.facade.api.contact.status(envelope.issuer)
 
         if not message:
@@ -349,7 +352,7 @@ class MailboxAPI(ApiFacadeExtension):
         save_list = list()
 
         for envelope in envelopes:
-            envelope = ReceiveEnvelope().perform(self.facade.data.portfolio, envelope)
+            envelope = await CryptoPool.main().run(ReceiveEnvelope().perform, self.facade.data.portfolio, envelope)
             if not envelope:
                 reject.add(envelope)
                 continue
@@ -398,7 +401,7 @@ class MailboxAPI(ApiFacadeExtension):
 
         # Load sender portfolio.
         sender = await vault.load_portfolio(envelope.issuer, Groups.VERIFIER)
-        message = OpenEnvelope().perform(self.facade.data.portfolio, sender, envelope)
+        message = await CryptoPool.main().run(OpenEnvelope().perform, self.facade.data.portfolio, sender, envelope)
 
         # move mail to read, and make complaint backup
         await self.store_letter(envelope, message)
@@ -24,6 +24,7 @@ from typing import Tuple, Awaitable, List, Any
 
 from angelos.archive7.archive import Archive7
 from angelos.archive7.fs import Delete
+from angelos.common.metrics import Registry
 from angelos.common.misc import Loop, Misc
 from angelos.common.utils import Util
 from angelos.document.entities import Person, Ministry, Church
@@ -33,6 +34,10 @@ from angelos.portfolio.collection import PrivatePortfolio
 from angelos.portfolio.utils import Groups
 
 
+METRIC_STORAGE_SIZE = Registry.main().gauge(
+    "angelos_facade_storage_bytes", "Size of the archive file of a facade storage.", ("storage",))
+
+
 class FacadeError(RuntimeError):
     """Thrown when error happens in or with a Facade."""
     EXTENSION_ATTR_OCCUPIED = ("Extension attribute already occupied.", 100)
@@ -102,9 +107,11 @@ class StorageFacadeExtension(FacadeExtension):
     def __init__(self, facade: "Facade", home_dir: Path, secret: bytes, delete=Delete.HARD):
         """Initialize the Storage extension."""
         FacadeExtension.__init__(self, facade)
-        self.__archive = Archive7.open(self.filename(home_dir), secret, delete)
+        self.__filename = self.filename(home_dir)
+        self.__archive = Archive7.open(self.__filename, secret, delete, name=self.ATTRIBUTE[0])
         atexit.register(self.__archive.close)
         self.__closed = False
+        METRIC_STORAGE_SIZE.labels(self.ATTRIBUTE[0]).set_function(self._size)
 
     @property
     def archive(self):
@@ -116,6 +123,10 @@ class StorageFacadeExtension(FacadeExtension):
         """Indicate if archive is closed."""
         return self.__closed
 
+    def _size(self) -> int:
+        """Size of the archive file, zero when closed."""
+        return 0 if self.__closed else self.__filename.stat().st_size
+
     def close(self):
         """Close the Archive."""
         if not self.__closed:
@@ -130,7 +141,7 @@ class StorageFacadeExtension(FacadeExtension):
         """Create and setup the whole Vault according to policy's."""
         archive = Archive7.setup(
             cls.filename(home_dir), secret, owner=owner, node=node, domain=domain,
-            title=cls.ATTRIBUTE[0], type_=vault_type, role=vault_role, use=cls.USEFLAG[0]
+            title=cls.ATTRIBUTE[0], type_=vault_type, role=vault_role, use=cls.USEFLAG[0], name=cls.ATTRIBUTE[0]
         )
         await cls._hierarchy(archive)
         await cls._files(archive)
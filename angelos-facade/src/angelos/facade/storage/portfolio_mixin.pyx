@@ -16,10 +16,12 @@
 import asyncio
 import uuid
 from pathlib import PurePosixPath
-from typing import Tuple, Set, Union
+from typing import Tuple, Set, Union, Dict
 
+from angelos.common.misc import ExpiringCache
 from angelos.common.policy import evaluate, Report
 from angelos.document.document import Document
+from angelos.document.entities import Keys
 from angelos.document.statements import Verified, Trusted, Revoked
 from angelos.document.utils import Helper as DocumentHelper
 from angelos.lib.error import Error
@@ -55,6 +57,49 @@ class PortfolioMixin:
 
     PATH_PORTFOLIOS = (PurePosixPath("/portfolios/"),)
 
+    LOGIN_CACHE = 1024  # Portfolios kept for logins, the oldest are dropped
+    LOGIN_LIFETIME = 60  # Seconds a portfolio is kept for logins, bounds how long other processes miss changes
+
+    @property
+    def _logins(self) -> ExpiringCache:
+        """Portfolios loaded for logins, as futures by entity id."""
+        try:
+            return self.__logins
+        except AttributeError:
+            self.__logins = ExpiringCache(self.LOGIN_LIFETIME, self.LOGIN_CACHE)
+            return self.__logins
+
+    async def _load_login(self, eid: uuid.UUID) -> Tuple[Portfolio, Dict[bytes, Keys]]:
+        """Load a portfolio for logins and index the keys by verify key."""
+        portfolio = await self.load_portfolio(eid, Groups.CLIENT_AUTH)
+        return portfolio, {keys.verify: keys for keys in portfolio.keys}
+
+    async def login_portfolio(self, eid: uuid.UUID) -> Tuple[Portfolio, Dict[bytes, Keys]]:
+        """Load a portfolio for client authentication, cached until the portfolio is changed or for the lifetime.
+
+        Changes through this storage drop the cached portfolio at once. Changes made by other processes on the
+        same vault are seen when the cached portfolio expires. Concurrent logins of the same entity share one
+        load from storage, a failed load is tried again by the next login.
+
+        Args:
+            eid (uuid.UUID):
+                Entity id of the portfolio.
+
+        Returns (Tuple[Portfolio, Dict[bytes, Keys]]):
+            The portfolio and its keys by verify key.
+
+        """
+        future = self._logins.get(eid)
+        if future is None or (future.done() and (future.cancelled() or future.exception())):
+            future = asyncio.ensure_future(self._load_login(eid))
+            self._logins.set(eid, future)
+
+        return await asyncio.shield(future)
+
+    def forget_login(self, eid: uuid.UUID):
+        """Drop a portfolio cached for logins."""
+        self._logins.discard(eid)
+
     def portfolio_path(self, eid: uuid.UUID) -> PurePosixPath:
         """Generate portfolio path for a particular entity id."""
         return self.PATH_PORTFOLIOS[0].joinpath(str(eid))
@@ -214,6 +259,9 @@ class PortfolioMixin:
 
         await self.gather(*[await self.remove_file(issuance) for issuance in revokes])
 
+        for issuance in statements:
+            self.forget_login(issuance.owner)
+
     async def list_portfolios(self) -> Set[Tuple[str, uuid.UUID]]:
         """Load a list of all portfolios.
 
@@ -271,11 +319,12 @@ class PortfolioMixin:
         dirname = self.portfolio_path(portfolio.entity.id)
         await self.portfolio_exists_not(dirname, portfolio.entity.id)
 
-        self.gather(*[
+        await self.gather(*[
             await self.write_file(
                 dirname.joinpath(str(doc.id) + DocumentHelper.extension(doc.type)),
                 doc, doc.get_owner() != doc.issuer) for doc in portfolio.issuer()
         ])
+        self.forget_login(portfolio.entity.id)
 
         return True
 
@@ -319,5 +368,6 @@ class PortfolioMixin:
 
         files = await self.portfolio_files(dirname)
         await self.gather(*[self.archive.remove(filename=filename, mode=3) for filename in files])
+        self.forget_login(eid)
 
         return True
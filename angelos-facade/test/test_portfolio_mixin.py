@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from angelos.facade.storage.portfolio_mixin import PortfolioNotFound, PortfolioMixin
+from angelos.portfolio.statement.create import CreateTrustedStatement
+from angelos.portfolio.utils import Groups
+from test import run_async
+from test.fixture.facade import FacadeContext, cross_authenticate
+
+
+class TestLoginPortfolio(TestCase):
+    async def setup(self):
+        self.server, self.client = FacadeContext.create_server(), FacadeContext.create_client()
+        self.addCleanup(self.server.close)
+        self.addCleanup(self.client.close)
+        self.vault = self.server.facade.storage.vault
+        self.eid = self.client.facade.data.portfolio.entity.id
+
+    @run_async
+    async def test_cached(self):
+        await self.setup()
+        await cross_authenticate(self.server.facade, self.client.facade)
+        portfolio, keys = await self.vault.login_portfolio(self.eid)
+        self.assertEqual(portfolio.entity.id, self.eid)
+        self.assertEqual(set(keys), {keys.verify for keys in self.client.facade.data.portfolio.keys})
+        self.assertIs((await self.vault.login_portfolio(self.eid))[0], portfolio)
+
+    @run_async
+    async def test_expire(self):
+        await self.setup()
+        await cross_authenticate(self.server.facade, self.client.facade)
+        portfolio, _ = await self.vault.login_portfolio(self.eid)
+        with patch("time.monotonic", return_value=time.monotonic() + PortfolioMixin.LOGIN_LIFETIME + 1):
+            self.assertIsNot((await self.vault.login_portfolio(self.eid))[0], portfolio)
+
+    @run_async
+    async def test_failed_load(self):
+        await self.setup()
+        with self.assertRaises(PortfolioNotFound):
+            await self.vault.login_portfolio(self.eid)
+        await cross_authenticate(self.server.facade, self.client.facade)
+        self.assertEqual((await self.vault.login_portfolio(self.eid))[0].entity.id, self.eid)
+
+    @run_async
+    async def test_save_portfolio(self):
+        await self.setup()
+        await cross_authenticate(self.server.facade, self.client.facade)
+        portfolio, _ = await self.vault.login_portfolio(self.eid)
+        await self.vault.save_portfolio(await self.vault.load_portfolio(self.eid, Groups.SHARE_MAX_USER))
+        self.assertIsNot((await self.vault.login_portfolio(self.eid))[0], portfolio)
+
+    @run_async
+    async def test_statements_portfolio(self):
+        await self.setup()
+        await cross_authenticate(self.server.facade, self.client.facade)
+        portfolio, _ = await self.vault.login_portfolio(self.eid)
+        await self.vault.statements_portfolio(
+            {CreateTrustedStatement().perform(self.server.facade.data.portfolio, portfolio)})
+        self.assertIsNot((await self.vault.login_portfolio(self.eid))[0], portfolio)
+
+    @run_async
+    async def test_delete_portfolio(self):
+        await self.setup()
+        await cross_authenticate(self.server.facade, self.client.facade)
+        portfolio, keys = await self.vault.login_portfolio(self.eid)
+        self.assertTrue(keys)
+        await self.vault.delete_portfolio(self.eid)
+        portfolio, keys = await self.vault.login_portfolio(self.eid)
+        self.assertIsNone(portfolio.entity)
+        self.assertEqual(keys, dict())  # The deleted keys log in no more
@@ -0,0 +1,200 @@
+# cython: language_level=3, linetrace=True
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""Executors that take crypto and policy work off the event loop."""
+import asyncio
+import atexit
+import contextvars
+import functools
+import multiprocessing
+import os
+from concurrent.futures.process import ProcessPoolExecutor
+from concurrent.futures.thread import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+
+from angelos.bin.nacl import Signer, Verifier
+from angelos.common.policy import Report, report_ctx
+from angelos.document.types import DocumentT
+from angelos.lib.policy.crypto import Crypto
+from angelos.lib.policy.portfolio import Portfolio
+
+
+def _validate(validator: Callable, args: tuple, report: bool) -> Tuple[Any, List[Tuple[bool, Any, Any, bool]]]:
+    """Run a policy validator in a worker process.
+
+    The report of the worker is returned as entries so that it can be replayed on the report of the caller.
+    """
+    if not report:
+        return validator().validate(*args), list()
+
+    token = report_ctx.set(Report())
+    try:
+        result = validator().validate(*args)
+        worker = report_ctx.get()
+        failed = set(worker.failed)
+        return result, [entry + (id(entry) in failed,) for entry in worker.applied]
+    finally:
+        report_ctx.reset(token)
+
+
+class CryptoPool:
+    """Executors for crypto and policy work that would otherwise block the event loop.
+
+    Signing and verifying release the GIL and run in a pool of threads. Policy validation is pure Python
+    and runs in a pool of processes, the arguments are pickled and the policy report of the worker is
+    replayed on the report of the caller. The number of calls submitted but not yet finished is kept
+    per executor as the queue depth.
+
+    Worker processes are started with forkserver, or spawn where it is missing, so that they don't
+    inherit the memory of the server, its keys, archives and event loop, as forked workers would.
+    """
+
+    THREADS = min(4, os.cpu_count() or 1)
+    PROCESSES = os.cpu_count() or 1
+    START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+    __main = None
+
+    def __init__(self, threads: int = None, processes: int = None):
+        self._threads = threads or self.THREADS
+        self._processes = processes or self.PROCESSES
+        self._thread_pool = None
+        self._process_pool = None
+        self._pending = {"thread": 0, "process": 0}
+        self._completed = {"thread": 0, "process": 0}
+
+    @classmethod
+    def main(cls) -> "CryptoPool":
+        """Global instance of the crypto pool."""
+        if not cls.__main:
+            cls.__main = CryptoPool()
+            atexit.register(cls.__main.close)
+        return cls.__main
+
+    @classmethod
+    def setup(cls, threads: int = None, processes: int = None) -> "CryptoPool":
+        """Configure the size of the global crypto pool, replacing the former one."""
+        if cls.__main:
+            atexit.unregister(cls.__main.close)
+            cls.__main.close()
+        cls.__main = CryptoPool(threads, processes)
+        atexit.register(cls.__main.close)
+        return cls.__main
+
+    @property
+    def threads(self) -> int:
+        """Number of worker threads."""
+        return self._threads
+
+    @property
+    def processes(self) -> int:
+        """Number of worker processes."""
+        return self._processes
+
+    @property
+    def pending(self) -> int:
+        """Calls submitted but not yet finished, the queue depth."""
+        return self._pending["thread"] + self._pending["process"]
+
+    def stats(self) -> dict:
+        """Queue depth and completed calls per executor."""
+        return {
+            "threads": self._threads,
+            "processes": self._processes,
+            "thread_pending": self._pending["thread"],
+            "thread_completed": self._completed["thread"],
+            "process_pending": self._pending["process"],
+            "process_completed": self._completed["process"],
+        }
+
+    def close(self):
+        """Shut down the executors."""
+        if self._thread_pool:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    async def _submit(self, kind: str, executor, callback: Callable) -> Any:
+        """Run a callback in an executor while counting the queue depth."""
+        self._pending[kind] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, callback)
+        finally:
+            self._pending[kind] -= 1
+            self._completed[kind] += 1
+
+    async def run(self, callback: Callable, *args, **kwargs) -> Any:
+        """Run any crypto bound callable in a worker thread, with the context of the caller.
+
+        Args:
+            callback (Callable):
+                A callable method.
+            *args:
+                Passes on whatever arguments.
+            *kwargs:
+                Passes on whatever keyword arguments.
+
+        Returns (Any):
+            Whatever the callback returns.
+
+        """
+        if not self._thread_pool:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="CryptoPool")
+        return await self._submit("thread", self._thread_pool, functools.partial(
+            contextvars.copy_context().run, callback, *args, **kwargs))
+
+    async def sign(self, seed: bytes, message: bytes) -> bytes:
+        """Signature of a message with the signing key of a seed."""
+        return await self.run(lambda: Signer(seed).signature(message))
+
+    async def verify(self, verify_key: bytes, signature: bytes) -> bytes:
+        """Verify a signature followed by the message with a verify key, raises CryptoFailure if false."""
+        return await self.run(lambda: Verifier(verify_key).verify(signature))
+
+    async def verify_document(self, document: DocumentT, signer: Portfolio, exclude: list = None) -> bool:
+        """Verify the signature of a document by the portfolio of the signer."""
+        return await self.run(Crypto.verify, document, signer, list(exclude) if exclude else list())
+
+    async def validate(self, validator: Callable, *args) -> Any:
+        """Validate with a policy validator in a worker process.
+
+        Args:
+            validator (Callable):
+                Policy validator class, instantiated in the worker.
+            *args:
+                Arguments to the validate method, they must be picklable.
+
+        Returns (Any):
+            Whatever the validate method returns.
+
+        """
+        if not self._process_pool:
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self._processes, mp_context=multiprocessing.get_context(self.START_METHOD))
+
+        report = report_ctx.get()
+        result, entries = await self._submit("process", self._process_pool, functools.partial(
+            _validate, validator, args, isinstance(report, Report)))
+
+        for level, first, second, failed in entries:
+            if not level:
+                report.record(bytes([first]), second, failed)
+            elif second:
+                report.up(first)
+            else:
+                report.down(first)
+        return result
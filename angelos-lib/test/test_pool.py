@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import asyncio
+import copy
+import datetime
+import os
+import threading
+from collections import Counter
+from unittest import TestCase
+
+from angelos.bin.nacl import Signer, CryptoFailure
+from angelos.common.policy import evaluate, PolicyBreachException, PolicyException
+from angelos.lib.policy.pool import CryptoPool
+from angelos.lib.policy.types import PersonData
+from angelos.portfolio.domain.create import CreateDomain
+from angelos.portfolio.domain.validate import ValidateDomain
+from angelos.portfolio.entity.create import CreatePersonEntity
+from test import run_async
+from test.fixture.generate import Generate
+
+
+def entries(report) -> Counter:
+    """Applied policies of a report with their outcome, in any order as policies are applied from a set."""
+    failed = set(report.failed)
+    return Counter(entry + (id(entry) in failed,) for entry in report.applied)
+
+
+class TestCryptoPool(TestCase):
+    def setUp(self) -> None:
+        self.pool = CryptoPool(2, 1)
+        self.addCleanup(self.pool.close)
+
+    @run_async
+    async def test_validate(self):
+        portfolio = CreatePersonEntity().perform(PersonData(**Generate.person_data()[0]))
+        domain = CreateDomain().perform(portfolio)
+
+        with evaluate("Domain:Validate") as expected:
+            ValidateDomain().validate(portfolio, domain)
+        with evaluate("Domain:Validate") as report:
+            self.assertTrue(await self.pool.validate(ValidateDomain, portfolio, domain))
+        self.assertTrue(report)
+        self.assertEqual(entries(report), entries(expected))
+
+        expired = copy.deepcopy(domain)
+        expired.expires = datetime.date.today() - datetime.timedelta(days=1)
+        with self.assertRaises(PolicyBreachException) as context:
+            with evaluate("Domain:Validate"):
+                await self.pool.validate(ValidateDomain, portfolio, expired)
+        self.assertTrue(context.exception.report.failed)
+
+        other = CreatePersonEntity().perform(PersonData(**Generate.person_data()[0]))
+        with self.assertRaises(PolicyException):  # Raised in the worker without a report
+            await self.pool.validate(ValidateDomain, other, domain)
+
+        self.assertTrue(await self.pool.validate(ValidateDomain, portfolio, domain))  # Without a report
+        self.assertEqual(self.pool.stats()["process_completed"], 4)
+
+    @run_async
+    async def test_sign_verify(self):
+        seed = os.urandom(32)
+        verify_key = Signer(seed).vk
+        signature = await self.pool.sign(seed, b"Hello, world!")
+        self.assertEqual(await self.pool.verify(verify_key, signature + b"Hello, world!"), b"Hello, world!")
+        with self.assertRaises(CryptoFailure):
+            await self.pool.verify(verify_key, signature + b"Hello, World!")
+
+    @run_async
+    async def test_stats(self):
+        release = threading.Event()
+        tasks = [asyncio.create_task(self.pool.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(.1)
+        self.assertEqual(self.pool.pending, 3)
+        self.assertEqual(self.pool.stats()["thread_pending"], 3)
+        self.assertEqual(self.pool.stats()["thread_completed"], 0)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.pool.pending, 0)
+        self.assertEqual(self.pool.stats(), {
+            "threads": 2, "processes": 1, "thread_pending": 0, "thread_completed": 3,
+            "process_pending": 0, "process_completed": 0})
+
+    @run_async
+    async def test_setup(self):
+        self.addCleanup(CryptoPool.setup)
+        former = CryptoPool.main()
+        self.assertIs(CryptoPool.main(), former)
+
+        pool = CryptoPool.setup(3, 2)
+        self.assertIsNot(pool, former)
+        self.assertIs(CryptoPool.main(), pool)
+        self.assertEqual((pool.threads, pool.processes), (3, 2))
+        self.assertTrue(await pool.run(lambda: True))
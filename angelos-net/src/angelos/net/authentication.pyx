@@ -19,7 +19,7 @@ import time
 import uuid
 from typing import Tuple
 
-from angelos.bin.nacl import NaCl, Signer, Verifier, CryptoFailure
+from angelos.bin.nacl import NaCl, CryptoFailure
 from angelos.common.misc import AsyncCallable, SyncCallable
 from angelos.common.utils import Util
 from angelos.document.domain import Node
@@ -27,6 +27,7 @@ from angelos.document.entities import Keys
 from angelos.facade.storage.portfolio_mixin import PortfolioNotFound
 from angelos.lib.const import Const
 from angelos.lib.policy.crypto import Crypto
+from angelos.lib.policy.pool import CryptoPool
 from angelos.net.base import NetworkError, Handler, ConfirmCode, StateMode, ProtocolNegotiationError, NetworkSession, \
     Protocol, UnknownPacket, ErrorPacket, ERROR_CODE_MSG
 from angelos.portfolio.collection import Portfolio
@@ -125,9 +126,8 @@ class AuthenticationClient(AuthenticationHandler):
         await self._call_tell(self.ST_CLIENT_SPECIMEN)
         await self._call_tell(self.ST_CLIENT_TIME)
 
-        self._states[self.ST_SERVER_SIGNATURE].update(
-            Signer(self._manager.facade.data.portfolio.privkeys.seed).signature(
-                self._states[self.ST_SERVER_SPECIMEN].value))
+        self._states[self.ST_SERVER_SIGNATURE].update(await CryptoPool.main().sign(
+            self._manager.facade.data.portfolio.privkeys.seed, self._states[self.ST_SERVER_SPECIMEN].value))
 
         approved = await self._call_tell(self.ST_SERVER_SIGNATURE)
 
@@ -145,8 +145,8 @@ class AuthenticationClient(AuthenticationHandler):
             elif self._states[self.ST_LOGIN].value == LoginTypeCode.LOGIN_ADMIN:
                 keys, portfolio, node = await self._admin_auth(identity)
 
-            Verifier(keys.verify).verify(
-                self._states[self.ST_CLIENT_SIGNATURE].value + self._states[self.ST_CLIENT_SPECIMEN].value)
+            await CryptoPool.main().verify(
+                keys.verify, self._states[self.ST_CLIENT_SIGNATURE].value + self._states[self.ST_CLIENT_SPECIMEN].value)
             self._manager.authentication_made(portfolio, self._states[self.ST_LOGIN].value, node)
             return True
         except (ValueError, IndexError, PortfolioNotFound, CryptoFailure) as exc:
@@ -243,9 +243,8 @@ class AuthenticationServer(AuthenticationHandler):
 
     async def _check_signature(self, value: bytes, sesh: NetworkSession = None) -> int:
         """Authenticate signature."""
-        self._states[self.ST_CLIENT_SIGNATURE].update(
-            Signer(self._manager.facade.data.portfolio.privkeys.seed).signature(
-                self._states[self.ST_CLIENT_SPECIMEN].value))
+        self._states[self.ST_CLIENT_SIGNATURE].update(await CryptoPool.main().sign(
+            self._manager.facade.data.portfolio.privkeys.seed, self._states[self.ST_CLIENT_SPECIMEN].value))
 
         try:
             identity = uuid.UUID(bytes=self._states[self.ST_CLIENT_ID].value)
@@ -257,9 +256,9 @@ class AuthenticationServer(AuthenticationHandler):
             elif self._states[self.ST_LOGIN].value == LoginTypeCode.LOGIN_ADMIN:
                 keys, portfolio, node = await self._admin_auth(identity)
 
-            Verifier(keys.verify).verify(value + self._states[self.ST_SERVER_SPECIMEN].value)
+            await CryptoPool.main().verify(keys.verify, value + self._states[self.ST_SERVER_SPECIMEN].value)
             self._manager.authentication_made(portfolio, self._states[self.ST_LOGIN].value, node)
-        except (ValueError, IndexError, PortfolioNotFound, CryptoFailure, NetworkError) as exc:
+        except (ValueError, LookupError, PortfolioNotFound, CryptoFailure, NetworkError) as exc:
             Util.print_exception(exc)
             asyncio.get_event_loop().call_soon(self._manager.close)
             return ConfirmCode.NO
@@ -267,8 +266,8 @@ class AuthenticationServer(AuthenticationHandler):
             return ConfirmCode.YES
 
     async def _user_auth(self, identity: uuid.UUID) -> Tuple[Keys, Portfolio, bool]:
-        """Evaluate user login."""
-        portfolio = await self.manager.facade.storage.vault.load_portfolio(identity, Groups.CLIENT_AUTH)
+        """Evaluate user login, the portfolio is cached by the vault between logins."""
+        portfolio, verifiers = await self.manager.facade.storage.vault.login_portfolio(identity)
 
         if self._manager.facade.data.portfolio.entity.id == identity:  # Check node privileges
             keys = [keys for keys in self._manager.facade.data.portfolio.keys if
@@ -276,7 +275,7 @@ class AuthenticationServer(AuthenticationHandler):
             node = [node for node in self._manager.facade.data.portfolio.node if
                     node.id == uuid.UUID(bytes=self._states[self.ST_CLIENT_NODE].value)][0]
         else:  # Check normal logon
-            keys = [keys for keys in portfolio.keys if keys.verify == self._states[self.ST_CLIENT_PUBLIC].value][0]
+            keys = verifiers[self._states[self.ST_CLIENT_PUBLIC].value]
             node = False
 
         return keys, portfolio, node
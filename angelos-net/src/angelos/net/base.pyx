@@ -14,17 +14,22 @@
 #
 """Base classes and other functions for the network stack."""
 import asyncio
+import collections
 import contextlib
 import datetime
 import enum
+import heapq
 import logging
 import random
+import struct
+import time
 import uuid
 from ipaddress import IPv4Address, IPv6Address
-from typing import Tuple, Union, Any, Awaitable
+from typing import Tuple, Union, Any, Awaitable, Callable
 
 import msgpack
 from angelos.bin.nacl import NaCl
+from angelos.common.metrics import Registry
 from angelos.common.misc import StateMachine, SyncCallable, AsyncCallable
 from angelos.document.domain import Node
 from angelos.facade.facade import Facade
@@ -59,6 +64,8 @@ from angelos.portfolio.collection import Portfolio
 
 EMPTY_PAYLOAD = NaCl.random_bytes(64)
 
+FRAME_HEADER = struct.Struct("!HBHB")  # Packet type, length high byte, length low bytes, management level
+
 PUSH_ITEM_PACKET = 105
 RECEIVED_ITEM_PACKET = 106
 PUSH_CHUNK_PACKET = 107
@@ -87,6 +94,21 @@ UNKNOWN_PACKET = 125  # Unrecognized packet
 ERROR_PACKET = 126  # Technical error
 NULL_PACKET = 127  # Synchronous filler packet
 
+METRIC_BYTES = Registry.main().counter(
+    "angelos_net_bytes_total", "Bytes on the wire, after encryption.", ("side", "direction"))
+METRIC_PACKETS = Registry.main().counter(
+    "angelos_net_packets_total", "Packets received and sent.", ("side", "direction"))
+METRIC_BACKLOG = Registry.main().gauge(
+    "angelos_net_backlog", "Packets received and waiting for handlers, all connections.", ("side",))
+METRIC_HANDLED = Registry.main().histogram(
+    "angelos_net_handler_seconds", "Seconds handling a packet, per handler.", ("handler",))
+METRIC_CONNECTIONS = Registry.main().gauge(
+    "angelos_net_connections", "Connections kept by connection managers.").labels()
+METRIC_REFUSED = Registry.main().counter(
+    "angelos_net_connections_refused_total", "Connections refused because of the max.").labels()
+METRIC_REAPED = Registry.main().counter(
+    "angelos_net_connections_reaped_total", "Connections closed for being idle.").labels()
+
 
 class ConfirmCode(enum.IntEnum):
     """Answer codes for ConfirmPackage"""
@@ -129,6 +151,8 @@ class NetworkError(RuntimeError):
     ATTEMPTED_ATTACK = ("Attempted attack with error/unknown packets.", 104)
     FALSE_CHECK_METHOD = ("State checker not set or of wrong type.", 105)
     NO_PANIC_CORO = ("Panic happened but no emergency button fixed!", 106)
+    UNKNOWN_MEASURE = ("Unknown measure of connection weight.", 107)
+    ITERATOR_ABORTED = ("Iteration aborted by an error, a lost connection or timeout.", 108)
 
 
 class GotoStateError(RuntimeWarning):
@@ -195,9 +219,48 @@ def ext_hook(code: int, data: bytes) -> Any:
     return msgpack.ExtType(code, data)
 
 
+def _uint_check(low: int, high: int):
+    """Range check of unsigned integer fields."""
+    def check(value: int) -> int:
+        if not low <= value <= high:
+            raise ValueError("Value not within {0}~{1}: was {2}".format(low, high, value))
+        return value
+    return check
+
+
+def _fixed_check(size: int):
+    """Size check of fixed bytes fields."""
+    def check(value: Union[bytes, bytearray]) -> Union[bytes, bytearray]:
+        if len(value) != size:
+            raise ValueError("Wrong size: was {0}, expected {1}".format(len(value), size))
+        return value
+    return check
+
+
+def _variable_check(low: int, high: int):
+    """Size check of variable bytes fields."""
+    def check(value: Union[bytes, bytearray]) -> Union[bytes, bytearray]:
+        size = len(value)
+        if not low <= size <= high:
+            raise ValueError("Size not within {0}~{1}: was {2}".format(low, high, size))
+        return value
+    return check
+
+
+def _datetime_check(value: datetime.datetime) -> datetime.datetime:
+    """Datetime fields are whole seconds."""
+    return value.replace(microsecond=0)
+
+
 class Packet:
     """Network packet base class.
 
+    Each packet class is compiled when declared, into checks of the fields that need them, attribute access
+    by index and an encoding. Packets with only unsigned integer fields are packed with struct, the integer
+    width follows the range of the field and is 32 bits without a range. Other packets are packed as a
+    msgpack array with a reusable packer, where only UUID and datetime fields are converted, and unpacked with a
+    reusable unpacker that is replaced whenever a malformed body could leave something behind in it.
+
     Example:
     class MyPacket(Packet, fields=("uint", "uuid", "fixed", "variable", "date"), fields_info=(
             (DataType.UINT, 100, 200), (DataType.UUID,), (DataType.BYTES_FIX, 128), (DataType.BYTES_VAR,),
@@ -205,6 +268,11 @@ class Packet:
         pass
     """
 
+    __slots__ = ("_values",)
+
+    _packer = msgpack.Packer(use_bin_type=True)
+    _unpacker = msgpack.Unpacker(ext_hook=ext_hook, raw=False, use_list=False)
+
     @classmethod
     def __init_subclass__(cls, fields: Tuple[str], fields_info: Tuple[tuple], **kwargs):
         """Add support for fields of certain types."""
@@ -216,58 +284,77 @@ class Packet:
         cls._fields = fields
         cls._fields_info = fields_info
 
-    def __init__(self, *args):
-        """Initialize packet with values."""
-        if len(args) != len(self._fields):
-            raise ValueError("Number of values doesn't match fields count.")
+        compact = all(meta[0] == DataType.UINT for meta in fields_info)
+        checks = list()
+        convert = list()
+        layout = "!"
 
-        for index, value in enumerate(args):
-            meta = self._fields_info[index]
+        for index, meta in enumerate(fields_info):
             code = meta[0]
 
             if code == DataType.UINT:
+                high = meta[2] if len(meta) == 3 else 0xFFFFFFFF
+                if compact:
+                    layout += "B" if high <= 0xFF else "H" if high <= 0xFFFF else "I"
                 if len(meta) == 3:
-                    if not (meta[1] <= value <= meta[2]):
-                        raise ValueError("Value not within {0}~{1}: was {2}".format(meta[1], meta[2], value))
+                    checks.append((index, _uint_check(meta[1], high)))
 
             elif code == DataType.BYTES_FIX:
-                size = meta[1]
-                if len(value) != size:
-                    raise ValueError("Wrong size: was {0}, expected {1}".format(size, len(value)))
+                checks.append((index, _fixed_check(meta[1])))
 
             elif code == DataType.BYTES_VAR:
                 if len(meta) == 3:
-                    size = len(value)
-                    if not (meta[1] <= size <= meta[2]):
-                        raise ValueError("Size not within {0}~{1}: was {2}".format(meta[1], meta[2], size))
+                    checks.append((index, _variable_check(meta[1], meta[2])))
 
             elif code == DataType.DATETIME:
-                args = list(args)
-                args[index] = value.replace(microsecond=0)
+                checks.append((index, _datetime_check))
+                convert.append(index)
 
-            elif code in (DataType.UUID,):
-                pass
+            elif code == DataType.UUID:
+                convert.append(index)
 
             else:
-                raise TypeError("Type not implemented: code {}".format(meta[0]))
+                raise TypeError("Type not implemented: code {}".format(code))
+
+            setattr(cls, fields[index], property(
+                lambda self, index=index: self._values[index], doc="Field {}.".format(fields[index])))
+
+        cls._checks = tuple(checks)
+        cls._convert = tuple(convert)
+        cls._struct = struct.Struct(layout) if compact else None
 
-        self._values = tuple(args)
+    def __init__(self, *args):
+        """Initialize packet with values."""
+        if len(args) != len(self._fields):
+            raise ValueError("Number of values doesn't match fields count.")
+
+        if self._checks:
+            args = list(args)
+            for index, check in self._checks:
+                args[index] = check(args[index])
+            args = tuple(args)
+
+        self._values = args
 
     @property
     def tuple(self) -> tuple:
         """Expose internal tuple."""
         return self._values
 
-    def __getattr__(self, item: str) -> Any:
-        """Read-only access to values via attributes."""
-        try:
-            return self._values[self._fields.index(item)]
-        except ValueError:
-            raise AttributeError("Attribute '{}' not found".format(item))
-
     def __bytes__(self) -> bytes:
         """Pack packet into bytes."""
-        return msgpack.packb(self._values, default=default, use_bin_type=True)
+        if self._struct is not None:
+            try:
+                return self._struct.pack(*self._values)
+            except struct.error as exc:
+                raise ValueError(str(exc)) from exc
+
+        values = self._values
+        if self._convert:
+            values = list(values)
+            for index in self._convert:
+                values[index] = default(values[index])
+        return self._packer.pack(values)
 
     def __repr__(self) -> str:
         fields = list()
@@ -276,71 +363,114 @@ class Packet:
         return "({0}: {1})".format(self.__class__.__name__, ", ".join(fields))
 
     @classmethod
-    def unpack(cls, data: bytes) -> "Packet":
+    def unpack(cls, data: Union[bytes, bytearray, memoryview]) -> "Packet":
         """Unpack data into packet class."""
-        return cls(*msgpack.unpackb(data, ext_hook=ext_hook, raw=False))
+        if cls._struct is not None:
+            try:
+                return cls(*cls._struct.unpack(data))
+            except struct.error as exc:
+                raise ValueError(str(exc)) from exc
+
+        unpacker = Packet._unpacker
+        start = unpacker.tell()
+        try:
+            unpacker.feed(data)
+            values = unpacker.unpack()
+            if unpacker.tell() - start != len(data):
+                raise ValueError("Extra data after packet body")
+        except Exception as exc:
+            Packet._unpacker = msgpack.Unpacker(ext_hook=ext_hook, raw=False, use_list=False)
+            raise ValueError(str(exc)) from exc
+
+        return cls(*values)
 
 
 class EnquiryPacket(Packet, fields=("state", "type", "session"),
                     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Enquire the fact of a state. From client to server."""
 
+    __slots__ = ()
+
 
 class ResponsePacket(Packet, fields=("state", "value", "type", "session"),
                      fields_info=((DataType.UINT,), (DataType.BYTES_VAR, 1, 1024), (DataType.UINT,), (DataType.UINT,))):
     """Respond fact of state enquiry. From server to client."""
 
+    __slots__ = ()
+
 
 class TellPacket(Packet, fields=("state", "value", "type", "session"),
                  fields_info=((DataType.UINT,), (DataType.BYTES_VAR, 1, 1024), (DataType.UINT,), (DataType.UINT,))):
     """Tell the server to set the value of a state. From client to server."""
 
+    __slots__ = ()
+
 
 class ShowPacket(Packet, fields=("state", "type", "session"),
                  fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Request to see the value of a state. From server to client"""
 
+    __slots__ = ()
+
 
 class ConfirmPacket(Packet, fields=("proposal", "answer", "type", "session"),
                     fields_info=((DataType.UINT,), (DataType.UINT, 0, 2), (DataType.UINT,), (DataType.UINT,))):
     """Answer on a sent proposal. 1=Yes, 2=No, 0=No comment. From server to client."""
 
+    __slots__ = ()
+
 
 class StartPacket(Packet, fields=("type", "session"), fields_info=((DataType.UINT,), (DataType.UINT,))):
     """Initiate a packet handler session. Initializer is always the finalizer."""
 
+    __slots__ = ()
+
 
 class FinishPacket(Packet, fields=("type", "session"), fields_info=((DataType.UINT,), (DataType.UINT,))):
     """Finalize a packet handler session."""
 
+    __slots__ = ()
+
 
 class AcceptPacket(Packet, fields=("type", "session"), fields_info=((DataType.UINT,), (DataType.UINT,))):
     """Accept a packet handler session."""
 
+    __slots__ = ()
+
 
 class RefusePacket(Packet, fields=("type", "session"), fields_info=((DataType.UINT,), (DataType.UINT,))):
     """Refuse a packet handler session."""
 
+    __slots__ = ()
+
 
 class BusyPacket(Packet, fields=("type", "session"), fields_info=((DataType.UINT,), (DataType.UINT,))):
     """Indicate for initiating session packet handler that it is busy asking to come back later."""
 
+    __slots__ = ()
+
 
 class DonePacket(Packet, fields=("type", "session"), fields_info=((DataType.UINT,), (DataType.UINT,))):
     """Indicate for initiating session packet handler that all is done."""
 
+    __slots__ = ()
+
 
 class PushItemPacket(
     Packet, fields=("count", "item", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UUID,), (DataType.UINT,), (DataType.UINT,))):
     """Item pushed from client to server."""
 
+    __slots__ = ()
+
 
 class ItemReceivedPacket(
     Packet, fields=("count", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Response to sent item from server."""
 
+    __slots__ = ()
+
 
 class PushChunkPacket(
     Packet, fields=("count", "chunk", "digest", "type", "session"),
@@ -348,30 +478,40 @@ class PushChunkPacket(
                  (DataType.UINT,), (DataType.UINT,))):
     """Chunk pushed from client to server."""
 
+    __slots__ = ()
+
 
 class ChunkReceivedPacket(
     Packet, fields=("count", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Response to sent chunk from server."""
 
+    __slots__ = ()
+
 
 class PullItemPacket(
     Packet, fields=("count", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Pull item from client to server."""
 
+    __slots__ = ()
+
 
 class ItemSentPacket(
     Packet, fields=("count", "item", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UUID,), (DataType.UINT,), (DataType.UINT,))):
     """Response to request item from server."""
 
+    __slots__ = ()
+
 
 class PullChunkPacket(
     Packet, fields=("count", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Pull chunk from client to server."""
 
+    __slots__ = ()
+
 
 class ChunkSentPacket(
     Packet, fields=("count", "chunk", "digest", "type", "session"),
@@ -379,21 +519,30 @@ class ChunkSentPacket(
                  (DataType.UINT,), (DataType.UINT,))):
     """Response to request chunk from server."""
 
+    __slots__ = ()
+
 
 class StopIterationPacket(
     Packet, fields=("count", "type", "session"),
     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Response that iteration stopped in any direction."""
 
+    __slots__ = ()
+
 
 class UnknownPacket(Packet, fields=("type", "level", "process"),
                     fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
     """Unknown packet."""
 
+    __slots__ = ()
+
 
-class ErrorPacket(Packet, fields=("type", "level", "process", "error"),
-                  fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
-    """Error packet."""
+class ErrorPacket(
+    Packet, fields=("type", "level", "process", "error", "session"),
+    fields_info=((DataType.UINT,), (DataType.UINT,), (DataType.UINT,), (DataType.UINT,), (DataType.UINT,))):
+    """Error packet, with the session of the failed packet or zero."""
+
+    __slots__ = ()
 
 
 class NullPacket(
@@ -401,6 +550,88 @@ class NullPacket(
     fields_info=((DataType.UINT,), (DataType.BYTES_VAR, 1, 64), (DataType.UINT,), (DataType.UINT,))):
     """Null packet, used to even out asynchronous communication to synchronous."""
 
+    __slots__ = ()
+
+
+class FrameDecoder:
+    """Incremental decoder of packet frames from a stream of received data.
+
+    A frame has a header of six bytes, two bytes packet type, three bytes frame length including the header
+    and one byte management level, followed by the packet body. Data may hold any number of frames and
+    frames may be split across several reads.
+
+    When no partial frame is pending, the frame bodies are memoryviews into the received data without
+    copying. Otherwise data is appended to a reusable buffer, bodies are copied out once and the consumed
+    frames are dropped from the buffer once per read.
+    """
+
+    HEADER_SIZE = FRAME_HEADER.size
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """Number of bytes waiting for the rest of a frame."""
+        return len(self._buffer)
+
+    def reset(self):
+        """Drop any partially received frame."""
+        self._buffer.clear()
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> list:
+        """Decode received data into frames.
+
+        Args:
+            data (Union[bytes, bytearray, memoryview]):
+                Received data.
+
+        Returns (list):
+            Complete frames as tuples of packet type, management level and body.
+
+        """
+        buffered = bool(self._buffer) or not isinstance(data, bytes)
+        if buffered:
+            self._buffer += data
+            view = memoryview(self._buffer)
+        else:
+            view = memoryview(data)
+
+        frames = list()
+        offset = 0
+        size = len(view)
+        malformed = None
+        try:
+            while size - offset >= self.HEADER_SIZE:
+                length = (view[offset + 2] << 16) | (view[offset + 3] << 8) | view[offset + 4]
+                if length < self.HEADER_SIZE:
+                    malformed = length
+                    break
+                if size - offset < length:
+                    break
+
+                start = offset + self.HEADER_SIZE
+                frames.append((
+                    (view[offset] << 8) | view[offset + 1], view[offset + 5],
+                    view[start:offset + length].tobytes() if buffered else view[start:offset + length]
+                ))
+                offset += length
+
+            if malformed is None and not buffered and offset < size:
+                self._buffer += view[offset:]
+        finally:
+            view.release()
+
+        if malformed is not None:
+            self._buffer.clear()  # The buffer can only be resized once the view is released
+            raise ValueError("Frame length {} shorter than header.".format(malformed))
+        elif buffered:
+            del self._buffer[:offset]
+
+        return frames
+
 
 class WaypointState(StateMachine):
     """A state machine that allows switching between states according to predefined paths."""
@@ -679,14 +910,45 @@ class ChunkError(RuntimeWarning):
 
 
 class NetworkIterator(NetworkSession):
+    """Session iterating over items or chunks within a window.
+
+    The client tells the window of the iterator and the server accepts it up to its own, otherwise
+    iteration falls back to stop-and-wait. Acknowledgements are cumulative and items or chunks
+    arriving out of order are arranged by count.
+    """
+
     ST_COUNT = 0x01
+    ST_WINDOW = 0x10
+
+    WINDOW = 1  # Max items or chunks in flight, iterators that can pipeline overwrite.
+    TIMEOUT = 60.0  # Seconds to wait for an acknowledgement or the next item or chunk
 
     def __init__(self, handler: "Handler", server: bool, type: int, id: int, states: dict):
-        NetworkSession.__init__(self, handler, server, type, id, states)
+        NetworkSession.__init__(self, handler, server, type, id, {
+            **states,
+            self.ST_WINDOW: (
+                StateMode.ONCE, self.WINDOW.to_bytes(2, byteorder="big", signed=False),
+                SyncCallable(self._check_window))
+        })
 
         self._iter = asyncio.Condition()
-        self._data = None
         self._cnt = 0
+        self._window = None if self.WINDOW > 1 else 1
+        self._acked = 0
+        self._requested = 0
+        self._arranged = 0
+        self._pending = dict()
+        self._received = collections.deque()
+        self._aborted = False
+
+    def _check_window(self, value: bytes, sesh: "NetworkSession") -> int:
+        """Accept a told window within the bounds of the iterator."""
+        window = int.from_bytes(value, byteorder="big", signed=False)
+        if not 0 < window <= self.WINDOW:
+            return ConfirmCode.NO
+
+        self._window = window
+        return ConfirmCode.YES
 
     @property
     def iter(self) -> asyncio.Condition:
@@ -698,22 +960,93 @@ class NetworkIterator(NetworkSession):
         """Show count."""
         return self._cnt
 
+    @property
+    def window(self) -> int:
+        """Negotiated window, None if not yet negotiated."""
+        return self._window
+
+    @window.setter
+    def window(self, value: int):
+        """Set negotiated window."""
+        self._window = value
+
+    @property
+    def requested(self) -> int:
+        """Count of the last requested item or chunk."""
+        return self._requested
+
     def increase(self):
         """Increase count by one."""
         self._cnt += 1
 
-    async def iter_result(self, data: Any):
-        """Set iterator item/chunk and return to waiter."""
-        self._data = data
+    def request(self) -> int:
+        """Increase and return count of requested items or chunks."""
+        self._requested += 1
+        return self._requested
+
+    def arrange(self, count: int, data: Any) -> list:
+        """Arrange item or chunk by count, returns those next in order."""
+        if count <= self._arranged or count in self._pending:
+            raise IteratorInconsistencyWarning("Item or chunk {} arrived twice.".format(count))
+        if count - self._arranged > self.WINDOW:
+            raise IteratorInconsistencyWarning("Item or chunk {} arrived outside of window.".format(count))
+
+        self._pending[count] = data
+        ready = list()
+        while self._arranged + 1 in self._pending:
+            self._arranged += 1
+            ready.append(self._pending.pop(self._arranged))
+        return ready
+
+    async def acknowledge(self, count: int):
+        """Cumulatively acknowledge pushed items or chunks up to count."""
+        if count > self._cnt:
+            raise IteratorInconsistencyWarning("More items or chunks acknowledged than pushed.")
+
+        self._acked = max(self._acked, count)
         async with self._iter:
-            self._iter.notify()
+            self._iter.notify_all()
+
+    @property
+    def aborted(self) -> bool:
+        """Whether the iteration is aborted."""
+        return self._aborted
+
+    def abort(self):
+        """Abort the iteration, whoever waits raises instead of waiting for what never comes."""
+        if not self._aborted:
+            self._aborted = True
+            asyncio.get_event_loop().create_task(self._wake())
 
-    async def iter_wait(self) -> Any:
-        """Wait for iterator item/chunk from processor."""
-        self._data = None
+    async def _wake(self):
         async with self._iter:
-            await self._iter.wait()
-        return self._data
+            self._iter.notify_all()
+
+    async def _wait(self, predicate: Callable):
+        """Wait for a predicate within the timeout, raise if aborted or timed out."""
+        try:
+            async with self._iter:
+                await asyncio.wait_for(self._iter.wait_for(lambda: self._aborted or predicate()), self.TIMEOUT)
+        except asyncio.TimeoutError:
+            self._aborted = True
+        if self._aborted:
+            raise NetworkError(*NetworkError.ITERATOR_ABORTED)
+
+    async def wait_window(self, flush: bool = False):
+        """Wait for room in the window, or for all pushed to be acknowledged if flush."""
+        limit = 1 if flush else self._window
+        await self._wait(lambda: self._cnt - self._acked < limit)
+
+    async def deliver(self, count: int, data: Any):
+        """Deliver a pulled item or chunk by count, None stops the iteration."""
+        self._received.extend(self.arrange(count, data))
+        async with self._iter:
+            self._iter.notify_all()
+
+    async def receive(self) -> Any:
+        """Wait for the next pulled item or chunk in order."""
+        await self._wait(lambda: self._received)
+        return self._received.popleft()
 
 
 class PullIterator(NetworkIterator):
@@ -766,6 +1099,8 @@ class Handler:
     LEVEL = 0
     RANGE = 0
 
+    CONCURRENCY = 8  # Packets of different sessions processed at once.
+
     PKT_ENQUIRY = ENQUIRY_PACKET  # Ask for the state of things
     PKT_RESPONSE = RESPONSE_PACKET  # Respond to enquiry
     PKT_TELL = TELL_PACKET  # Tell the state of things
@@ -794,11 +1129,13 @@ class Handler:
         self, manager: "Protocol", states: dict = dict(), sessions: dict = dict(), max_sesh: int = 0):
         self._queue = asyncio.Queue()
         self._r_start = r(self.RANGE)[0]
-        self._pkt_type = None
-        self._silent = False
+        self._lanes = dict()
+        self._lane_tasks = set()
+        self._limit = asyncio.Semaphore(self.CONCURRENCY)
 
         self._manager = manager
         server = self._manager.is_server()
+        self._handled = METRIC_HANDLED.labels(type(self).__name__)
 
         self._pkgs = {
             self.PKT_ENQUIRY: EnquiryPacket,
@@ -891,40 +1228,89 @@ class Handler:
     async def packet_handler(self):
         """Handle received packet.
 
-        If packet type class, method or processor isn't found
+        Packets of a session are processed in order on a lane of their own, so that independent
+        sessions progress in parallel, at most CONCURRENCY at once. Packets outside of sessions are
+        processed in order of arrival. If packet type class, method or processor isn't found
         An unknown packet is returned to the senders handler.
         """
-        while True:
-            item = await self._queue.get()
-            if isinstance(item, type(None)):
-                break
-            try:
-                self._pkt_type, data = item
-                self._pkt_type = self._pkt_type - self._r_start
-
-                pkt_cls = self._pkgs[self._pkt_type]
-                proc_name = self._procs[self._pkt_type]
-                self.logger.debug("{} HANDLED {} {}".format(
-                    "Server" if self._manager.is_server() else "Client", self._pkt_type, proc_name))
+        try:
+            while True:
+                item = await self._queue.get()
+                if isinstance(item, type(None)):
+                    break
 
-                if proc_name in ("process_unknown", "process_error"):
-                    self._silent = True  # Don't send error or unknown response packet.
+                pkt_type, data = item
+                pkt_type = pkt_type - self._r_start
+                packet = None
+                with self._guard(pkt_type):
+                    packet = self._pkgs[pkt_type].unpack(data)
+                if packet is None:
+                    self._manager.release()
+                    continue
+
+                session = getattr(packet, "session", 0)
+                if not session:
+                    await self._process(pkt_type, packet)
+                elif session in self._lanes:
+                    self._lanes[session].append((pkt_type, packet))
+                else:
+                    self._lanes[session] = collections.deque([(pkt_type, packet)])
+                    task = asyncio.create_task(self._lane(session))
+                    self._lane_tasks.add(task)
+                    task.add_done_callback(self._lane_tasks.discard)
+        finally:
+            for task in self._lane_tasks:
+                task.cancel()
 
+    async def _lane(self, session: int):
+        """Process the queued packets of a session in order."""
+        lane = self._lanes[session]
+        try:
+            while lane:
+                pkt_type, packet = lane.popleft()
+                async with self._limit:
+                    await self._process(pkt_type, packet)
+        finally:
+            for _ in lane:  # Cancelled with packets left, they are never handled
+                self._manager.release()
+            del self._lanes[session]
+
+    async def _process(self, pkt_type: int, packet: Packet):
+        """Run the processor of a packet."""
+        proc_name = self._procs.get(pkt_type)
+        if proc_name is None:  # No processor on this side
+            self._manager.release()
+            self._manager.unknown(pkt_type + self._r_start, self.LEVEL)
+            return
+
+        # Don't send error or unknown response packet.
+        with self._guard(pkt_type, proc_name in ("process_unknown", "process_error"), getattr(packet, "session", 0)):
+            self.logger.debug("{} HANDLED {} {}".format(
+                "Server" if self._manager.is_server() else "Client", pkt_type, proc_name))
+
+            start = time.perf_counter()
+            try:
                 proc_func = getattr(self, proc_name)
-                await proc_func(pkt_cls.unpack(data))
-            except (KeyError, AttributeError) as exc:
-                self.logger.exception(exc)
-                self._manager.unknown(self._pkt_type + self._r_start, self.LEVEL)
-            except (ValueError, TypeError) as exc:
-                self.logger.exception(exc)
-                self._manager.error(ErrorCode.MALFORMED, self._pkt_type + self._r_start, self.LEVEL)
-            except Exception as exc:
-                self.logger.exception(exc)
-                if not self._silent:
-                    self._manager.error(ErrorCode.UNEXPECTED, self._pkt_type + self._r_start, self.LEVEL)
+                await proc_func(packet)
             finally:
-                self._pkt_type = None
-                self._silent = False
+                self._handled.observe(time.perf_counter() - start)
+                self._manager.release()
+
+    @contextlib.contextmanager
+    def _guard(self, pkt_type: int, silent: bool = False, session: int = 0):
+        """Log failures of handling a packet and report back to the sender."""
+        try:
+            yield
+        except (KeyError, AttributeError) as exc:
+            self.logger.exception(exc)
+            self._manager.unknown(pkt_type + self._r_start, self.LEVEL)
+        except (ValueError, TypeError) as exc:
+            self.logger.exception(exc)
+            self._manager.error(ErrorCode.MALFORMED, pkt_type + self._r_start, self.LEVEL, session=session)
+        except Exception as exc:
+            self.logger.exception(exc)
+            if not silent:
+                self._manager.error(ErrorCode.UNEXPECTED, pkt_type + self._r_start, self.LEVEL, session=session)
 
     def get_session(self, session: int) -> NetworkSession:
         """Load a given session."""
@@ -1018,13 +1404,16 @@ class Handler:
         result = await sesh.wait()
         return sesh if result == SessionCode.ACCEPT else None
 
-    async def _sesh_close(self, sesh: NetworkSession):
+    async def _sesh_close(self, sesh: NetworkSession, flush: bool = True):
         """
-        Stop a running session and clean up.
+        Stop a running session and clean up, without waiting for pushed to be acknowledged unless flush.
 
         Called from the client.
         Part of a protocol primitive.
         """
+        if flush and isinstance(sesh, PushIterator):
+            await self._push_flush(sesh)
+
         sesh.goto("finish")
         await self._package(self.PKT_FINISH, FinishPacket(sesh.type, sesh.id))
 
@@ -1066,51 +1455,90 @@ class Handler:
         """
         sesh = await self._sesh_open(sesh_type, **kwargs)
 
+        failed = True
         try:
             yield sesh
+            failed = False
         finally:
-            await self._sesh_close(sesh)
+            if sesh:  # Refused or busy sessions are already gone
+                if failed and isinstance(sesh, NetworkIterator):
+                    sesh.abort()
+                await self._sesh_close(sesh, flush=not failed)
+
+    async def _iter_window(self, sesh: NetworkIterator) -> int:
+        """
+        Negotiate the window of an iterator session once, stop-and-wait if refused.
+
+        Called from the client.
+        A protocol primitive.
+        """
+        if sesh.window is None:
+            value = await self._call_tell(NetworkIterator.ST_WINDOW, sesh)
+            sesh.window = int.from_bytes(value, byteorder="big", signed=False) if value else 1
+        return sesh.window
 
     async def _push_item(self, sesh: NetworkIterator, item: uuid.UUID):
         """
         Send an array of items in a for-loop. Sends from client to server.
 
+        Waits only when the window is full.
+
         Called from the client.
         A protocol primitive.
         """
+        await self._iter_window(sesh)
         sesh.increase()
         await self._package(self.PKT_PUSH_ITEM, PushItemPacket(sesh.count, item, sesh.type, sesh.id))
-        return await sesh.iter_wait()
+        await sesh.wait_window()
 
     async def _push_chunk(
             self, sesh: NetworkIterator, chunk: Union[bytes, bytearray], digest: Union[bytes, bytearray]):
         """
         Send an stream of chunks in a for-loop. Sends from client to server.
 
+        Waits only when the window is full.
+
         Called from the client.
         A protocol primitive.
         """
+        await self._iter_window(sesh)
         sesh.increase()
         await self._package(self.PKT_PUSH_CHUNK, PushChunkPacket(sesh.count, chunk, digest, sesh.type, sesh.id))
-        return await sesh.iter_wait()
+        await sesh.wait_window()
 
-    async def _iter_pull_item(self, sesh: NetworkIterator, count: int = 0):
+    async def _push_flush(self, sesh: NetworkIterator):
         """
-        Run an iterator over an array of items. Brings from server to client.
+        Wait for all pushed items or chunks to be acknowledged.
 
         Called from the client.
         A protocol primitive.
         """
+        await sesh.wait_window(flush=True)
+
+    async def _iter_pull(self, sesh: NetworkIterator, pkt_type: int, packet_cls: type, count: int = 0):
+        """Keep pull requests within the window and yield responses in order."""
+        window = await self._iter_window(sesh)
         while True:
-            sesh.increase()
-            await self._package(self.PKT_PULL_ITEM, PullItemPacket(sesh.count, sesh.type, sesh.id))
-            packet = await sesh.iter_wait()
+            while sesh.requested - sesh.count < window and not 0 < count <= sesh.requested:
+                await self._package(pkt_type, packet_cls(sesh.request(), sesh.type, sesh.id))
+            packet = await sesh.receive()
             if packet is None:
                 break
-            yield packet.item
+            sesh.increase()
+            yield packet
             if 0 < count == sesh.count:
                 break
 
+    async def _iter_pull_item(self, sesh: NetworkIterator, count: int = 0):
+        """
+        Run an iterator over an array of items. Brings from server to client.
+
+        Called from the client.
+        A protocol primitive.
+        """
+        async for packet in self._iter_pull(sesh, self.PKT_PULL_ITEM, PullItemPacket, count):
+            yield packet.item
+
     async def _iter_pull_chunk(self, sesh: NetworkIterator, count: int = 0):
         """
         Run an iterator over an array of chunks. Brings from server to client.
@@ -1118,15 +1546,15 @@ class Handler:
         Called from the client.
         A protocol primitive.
         """
-        while True:
-            sesh.increase()
-            await self._package(self.PKT_PULL_CHUNK, PullChunkPacket(sesh.count, sesh.type, sesh.id))
-            packet = await sesh.iter_wait()
-            if packet is None:
-                break
+        async for packet in self._iter_pull(sesh, self.PKT_PULL_CHUNK, PullChunkPacket, count):
             yield packet.chunk, packet.digest
-            if 0 < count == sesh.count:
-                break
+
+    def _iter_max(self, sesh: NetworkIterator, msg: str):
+        """Check that the count of an iterator session is within max."""
+        max_iter = sesh.states[NetworkIterator.ST_COUNT].value
+        if max_iter != b"!":
+            if sesh.count > int.from_bytes(max_iter, "big", signed=False):
+                raise IteratorInconsistencyWarning(msg)
 
     async def process_show(self, packet: ShowPacket):
         """
@@ -1297,8 +1725,8 @@ class Handler:
 
         sesh.goto("refuse")
         sesh.goto("accomplished")
-        sesh.future.set_result(SessionCode.REFUSE)
         del self._seshs[packet.session]
+        await sesh.set_result(SessionCode.REFUSE)
 
     async def process_busy(self, packet: BusyPacket):
         """Busy response to start session."""
@@ -1308,8 +1736,8 @@ class Handler:
 
         sesh.goto("busy")
         sesh.goto("accomplished")
-        sesh.future.set_result(SessionCode.BUSY)
         del self._seshs[packet.session]
+        await sesh.set_result(SessionCode.BUSY)
 
     async def process_done(self, packet: DonePacket):
         """Indication there is nothing more to do in session."""
@@ -1327,16 +1755,11 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        sesh.increase()
-        max_iter = sesh.states[NetworkIterator.ST_COUNT].value
-        if max_iter != b"!":
-            if sesh.count > int.from_bytes(max_iter, "big", signed=False):
-                raise IteratorInconsistencyWarning("More items pushed than max.")
-
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed item in wrong order.")
+        for pushed in sesh.arrange(packet.count, packet):
+            sesh.increase()
+            self._iter_max(sesh, "More items pushed than max.")
+            await sesh.push_item(pushed.item)
 
-        await sesh.push_item(packet.item)
         await self._package(self.PKT_RCVD_ITEM, ItemReceivedPacket(sesh.count, sesh.type, sesh.id))
 
     async def process_rcvditem(self, packet: ItemReceivedPacket):
@@ -1345,10 +1768,7 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Received item confirmation wrong order.")
-
-        await sesh.iter_result(packet)
+        await sesh.acknowledge(packet.count)
 
     async def process_pushchunk(self, packet: PushChunkPacket):
         """Handle pushed chunk from client."""
@@ -1356,16 +1776,11 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        sesh.increase()
-        max_iter = sesh.states[NetworkIterator.ST_COUNT].value
-        if max_iter != b"!":
-            if sesh.count > int.from_bytes(max_iter, "big", signed=False):
-                raise IteratorInconsistencyWarning("More chunks pushed than max.")
-
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed chunk in wrong order.")
+        for pushed in sesh.arrange(packet.count, packet):
+            sesh.increase()
+            self._iter_max(sesh, "More chunks pushed than max.")
+            await sesh.push_chunk(pushed.chunk, pushed.digest)
 
-        await sesh.push_chunk(packet.chunk, packet.digest)
         await self._package(self.PKT_RCVD_CHUNK, ChunkReceivedPacket(sesh.count, sesh.type, sesh.id))
 
     async def process_rcvdchunk(self, packet: ChunkReceivedPacket):
@@ -1374,10 +1789,7 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Received chunk confirmation wrong order.")
-
-        await sesh.iter_result(packet)
+        await sesh.acknowledge(packet.count)
 
     async def process_pullitem(self, packet: PullItemPacket):
         """Handle item pull request from client."""
@@ -1385,21 +1797,15 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        sesh.increase()
-        max_iter = sesh.states[NetworkIterator.ST_COUNT].value
-        if max_iter != b"!":
-            if sesh.count > int.from_bytes(max_iter, "big", signed=False):
-                raise IteratorInconsistencyWarning("More item pushed than max.")
-
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed item in wrong order.")
-
-        try:
-            item = await sesh.pull_item()
-        except StopAsyncIteration:
-            await self._package(self.PKT_STOP_ITER, StopIterationPacket(sesh.count, sesh.type, sesh.id))
-        else:
-            await self._package(self.PKT_SENT_ITEM, ItemSentPacket(sesh.count, item, sesh.type, sesh.id))
+        for _ in sesh.arrange(packet.count, packet):
+            sesh.increase()
+            self._iter_max(sesh, "More items pulled than max.")
+            try:
+                item = await sesh.pull_item()
+            except StopAsyncIteration:
+                await self._package(self.PKT_STOP_ITER, StopIterationPacket(sesh.count, sesh.type, sesh.id))
+            else:
+                await self._package(self.PKT_SENT_ITEM, ItemSentPacket(sesh.count, item, sesh.type, sesh.id))
 
     async def process_sentitem(self, packet: ItemSentPacket):
         """Handle sent item from server."""
@@ -1407,10 +1813,7 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed chunk in wrong order.")
-
-        await sesh.iter_result(packet)
+        await sesh.deliver(packet.count, packet)
 
     async def process_pullchunk(self, packet: PullChunkPacket):
         """Handle chunk pull request from client"""
@@ -1418,17 +1821,12 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        sesh.increase()
-        max_iter = sesh.states[NetworkIterator.ST_COUNT].value
-        if max_iter != b"!":
-            if sesh.count > int.from_bytes(max_iter, "big", signed=False):
-                raise IteratorInconsistencyWarning("More chunks pushed than max.")
-
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed chunk in wrong order.")
-
-        chunk, digest = await sesh.pull_chunk()
-        await self._package(self.PKT_SENT_CHUNK, ChunkSentPacket(sesh.count, chunk, digest, sesh.type, sesh.id))
+        for _ in sesh.arrange(packet.count, packet):
+            sesh.increase()
+            self._iter_max(sesh, "More chunks pulled than max.")
+            chunk, digest = await sesh.pull_chunk()
+            await self._package(self.PKT_SENT_CHUNK, ChunkSentPacket(
+                sesh.count, chunk, digest, sesh.type, sesh.id))
 
     async def process_sentchunk(self, packet: ChunkSentPacket):
         """Handle sent chunk from server"""
@@ -1436,10 +1834,7 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed chunk in wrong order.")
-
-        await sesh.iter_result(packet)
+        await sesh.deliver(packet.count, packet)
 
     async def process_stopiter(self, packet: StopIterationPacket):
         """Handle stop iteration from server/client"""
@@ -1447,10 +1842,7 @@ class Handler:
         if sesh.type != packet.type:
             raise SessionInconsistencyWarning("Session type inconsistency.")
 
-        if sesh.count != packet.count:
-            raise IteratorInconsistencyWarning("Pushed chunk or item in wrong order.")
-
-        await sesh.iter_result(None)
+        await sesh.deliver(packet.count, None)
 
     async def process_unknown(self, packet: UnknownPacket):
         """Handle an unknown packet response.
@@ -1463,10 +1855,22 @@ class Handler:
     async def process_error(self, packet: ErrorPacket):
         """Handle an error packet response.
 
+        Acknowledgements or items that an iterator session waits for never arrive after an error on one of its
+        packets, so that session is aborted. Other sessions go on.
+
         This method MUST never return an unknown or error in order
         to prevent an infinite loop over the network.
         """
-        raise NotImplementedError()
+        self.logger.warning("Error {} on packet {} of session {}.".format(packet.error, packet.type, packet.session))
+        sesh = self.get_session(packet.session)
+        if isinstance(sesh, NetworkIterator):
+            sesh.abort()
+
+    def abort(self):
+        """Abort the iterator sessions, waking whoever waits on them."""
+        for sesh in self._seshs.values():
+            if isinstance(sesh, NetworkIterator):
+                sesh.abort()
 
     async def process_null(self, packet: NullPacket):
         """Handle a null packet. Null packets are used for fillers to make all communication synchronous."""
@@ -1475,11 +1879,35 @@ class Handler:
                 True, EMPTY_PAYLOAD[:random.randrange(1, 64)], packet.type, packet.session))
 
 
+class Accounting:
+    """Traffic accounting of a connection."""
+
+    __slots__ = ("bytes_in", "bytes_out", "packets_in", "packets_out", "connected", "activity")
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.packets_in = 0
+        self.packets_out = 0
+        self.connected = time.monotonic()
+        self.activity = self.connected
+
+    def __repr__(self) -> str:
+        return "(Accounting: in={0}/{1}, out={2}/{3}, idle={4:.0f}s)".format(
+            self.bytes_in, self.packets_in, self.bytes_out, self.packets_out, time.monotonic() - self.activity)
+
+
 class Protocol(asyncio.Protocol):
     """Protocol for handling packages going from and to packet handlers."""
 
     logger = logging.getLogger("net.protocol")
 
+    WRITE_LIMIT = NoiseTransportProtocol.MAX_RECORD_DATA  # Most bytes coalesced into one write, one Noise record
+    WRITE_HIGH = 2 ** 18  # Bytes buffered in the transport before writing pauses
+    WRITE_LOW = 2 ** 16  # Bytes buffered in the transport before writing resumes
+    READ_HIGH = 256  # Packets waiting for handlers before reading pauses
+    READ_LOW = 64  # Packets waiting for handlers before reading resumes
+
     def __init__(
             self, facade: Facade, server: bool = False,
             conn_mgr: "ConnectionManager" = None, emergency: Awaitable = None):
@@ -1490,6 +1918,20 @@ class Protocol(asyncio.Protocol):
         self._facade = facade
         self._conn_mgr = conn_mgr
         self._transport = None
+        self._decoder = FrameDecoder()
+        self._output = bytearray()
+        self._flusher = None
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._backlog = 0
+        self._reading = True
+        self._accounting = Accounting()
+        side = "server" if server else "client"
+        self._metrics = (
+            METRIC_BYTES.labels(side, "in"), METRIC_BYTES.labels(side, "out"),
+            METRIC_PACKETS.labels(side, "in"), METRIC_PACKETS.labels(side, "out"),
+            METRIC_BACKLOG.labels(side)
+        )
         self._portfolio = None
         self._login = None
         self._node = None
@@ -1520,6 +1962,16 @@ class Protocol(asyncio.Protocol):
         """Expose the connection manager."""
         return self._conn_mgr
 
+    @property
+    def accounting(self) -> Accounting:
+        """Expose traffic accounting."""
+        return self._accounting
+
+    @property
+    def backlog(self) -> int:
+        """Packets waiting for handlers."""
+        return self._backlog
+
     def panic(self, severity: object):
         """Handlers can trigger panic if something goes seriously wrong."""
         if not self._emergency:
@@ -1559,13 +2011,40 @@ class Protocol(asyncio.Protocol):
         This is called from the server only. Leave empty."""
         pass
 
+    def admit(self) -> bool:
+        """Admit the connection with the connection manager, the transport asks before the handshake."""
+        if self._conn_mgr is not None and not self._conn_mgr.add(self):
+            self.logger.warning("Connection refused, too many connections.")
+            return False
+        return True
+
     def connection_made(self, transport: asyncio.Transport):
         """Connection is made."""
         self._transport = transport
+        self._transport.set_write_buffer_limits(self.WRITE_HIGH, self.WRITE_LOW)
         self._trans_fut.set_result(True)
 
+    def pause_writing(self):
+        """Transport buffer is above the high-water mark, senders wait."""
+        self._writable.clear()
+
+    def resume_writing(self):
+        """Transport buffer is drained below the low-water mark, senders continue."""
+        self._writable.set()
+
+    def release(self):
+        """A handler is done with a packet, resume reading if the backlog is drained."""
+        self._backlog -= 1
+        self._metrics[4].dec()
+        if not self._reading and self._backlog <= self.READ_LOW:
+            self._reading = True
+            if not self._transport.is_closing():
+                self._transport.resume_reading()
+
     def connection_lost(self, exc: Exception):
         """Clean up."""
+        if self._conn_mgr is not None:
+            self._conn_mgr.remove(self)
         self._cleanup()
 
         if exc:
@@ -1573,39 +2052,43 @@ class Protocol(asyncio.Protocol):
         else:
             self.panic(True)
 
-    def data_received(self, data: bytes):
-        """Data received."""
-        while data:
-
-            pkt_type = 0
-            pkt_level = 0
-            try:
-                meta = data[0:6]
-                data = data[6:]
-
-                pkt_type = int.from_bytes(meta[0:2], "big")
-                pkt_length = int.from_bytes(meta[2:5], "big")
-                pkt_level = int(meta[5])
-
-                chunk = data[0:(pkt_length - 6)]
-                data = data[(pkt_length - 6):]
-
-                pkt_range = ri(pkt_type)
-                handler = self._ranges[pkt_range]
-            except KeyError as exc:
-                low = r(pkt_range)[0]
-                if pkt_type == low + UNKNOWN_PACKET or pkt_type == low + ERROR_PACKET:
-                    self.logger.critical("Attempted attack: error package infinite loop.")  # Attempted attack
-                    raise NetworkError(*NetworkError.ATTEMPTED_ATTACK)
-                else:
-                    self.unknown(pkt_type, pkt_level)
-            except ValueError:
-                self.error(ErrorCode.MALFORMED, pkt_type, pkt_level)
+    def data_received(self, data: Union[bytes, bytearray, memoryview]):
+        """Data received, complete packets are dispatched to their handlers and partial packets kept."""
+        self._accounting.bytes_in += len(data)
+        self._metrics[0].inc(len(data))
+        self._accounting.activity = time.monotonic()
+        try:
+            frames = self._decoder.feed(data)
+        except ValueError as exc:
+            self.logger.warning(exc)
+            self.error(ErrorCode.MALFORMED, 0, 0)
+            return
+
+        self._accounting.packets_in += len(frames)
+        self._metrics[2].inc(len(frames))
+
+        for pkt_type, pkt_level, chunk in frames:
+            self._dispatch(pkt_type, pkt_level, chunk)
+
+    def _dispatch(self, pkt_type: int, pkt_level: int, chunk: Union[bytes, memoryview]):
+        """Dispatch a packet to the handler of its range."""
+        pkt_range = ri(pkt_type)
+        handler = self._ranges.get(pkt_range)
+
+        if handler is None:
+            low = r(pkt_range)[0]
+            if pkt_type == low + UNKNOWN_PACKET or pkt_type == low + ERROR_PACKET:
+                self.logger.critical("Attempted attack: error package infinite loop.")  # Attempted attack
+                raise NetworkError(*NetworkError.ATTEMPTED_ATTACK)
             else:
-                if handler.queue.full():
-                    self.error(ErrorCode.BUSY, pkt_type + r(pkt_range)[0], self.LEVEL)
-                else:
-                    handler.queue.put_nowait((pkt_type, chunk))
+                self.unknown(pkt_type, pkt_level)
+        else:
+            handler.queue.put_nowait((pkt_type, chunk))
+            self._backlog += 1
+            self._metrics[4].inc()
+            if self._reading and self._backlog >= self.READ_HIGH:
+                self._reading = False
+                self._transport.pause_reading()
 
     def eof_received(self) -> bool:
         """Information of other side wanting to close."""
@@ -1613,21 +2096,47 @@ class Protocol(asyncio.Protocol):
         return False
 
     async def send_packet(self, pkt_type: int, pkt_level: int, packet: Packet):
-        """Send packet over socket."""
+        """Send packet over socket.
+
+        Packets sent during the same turn of the event loop are gathered in an output buffer and written
+        together, with a Noise transport that is one encryption and one send for all of them. Senders wait
+        while writing is paused until the transport buffer drains.
+        """
         if not self._transport:
             raise NetworkError(*NetworkError.NO_TRANSPORT)
 
-        await self._transport.wait()
+        await self._writable.wait()
 
         self.logger.debug("{} SENT {} {}".format("Server" if self.is_server() else "Client", pkt_type, packet))
 
         data = bytes(packet)
-        self._transport.write(
-            pkt_type.to_bytes(2, "big") +
-            (6 + len(data)).to_bytes(3, "big") +
-            pkt_level.to_bytes(1, "big") +
-            data
-        )
+        length = FRAME_HEADER.size + len(data)
+        if self._output and len(self._output) + length > self.WRITE_LIMIT:
+            self._flush()
+
+        self._output += FRAME_HEADER.pack(pkt_type, length >> 16, length & 0xFFFF, pkt_level)
+        self._output += data
+        self._accounting.packets_out += 1
+        self._metrics[3].inc()
+
+        if len(self._output) >= self.WRITE_LIMIT:
+            self._flush()
+        elif self._flusher is None:
+            self._flusher = asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        """Write the gathered packets to the transport."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+
+        data = bytes(self._output)
+        self._output.clear()
+        if data and not self._transport.is_closing():
+            self._transport.write(data)
+            self._accounting.bytes_out += len(data)
+            self._metrics[1].inc(len(data))
+            self._accounting.activity = time.monotonic()
 
     def _send_packet_async(self, pkt_type: int, pkt_level: int, packet: Packet):
         def done(fut):
@@ -1643,15 +2152,25 @@ class Protocol(asyncio.Protocol):
             UnknownPacket(pkt_type, pkt_level, process)
         )
 
-    def error(self, error: int, pkt_type: int, pkt_level, process: int = 0):
+    def error(self, error: int, pkt_type: int, pkt_level, process: int = 0, session: int = 0):
         """Error happened is returned to sender."""
         self._send_packet_async(
             r(ri(pkt_type))[0] + ERROR_PACKET, pkt_level,
-            ErrorPacket(pkt_type, pkt_level, process, error)
+            ErrorPacket(pkt_type, pkt_level, process, error, session)
         )
 
+    def close(self):
+        """Write the gathered packets and close the transport."""
+        if self._transport and not self._transport.is_closing():
+            self._flush()
+            self._transport.close()
+
     def _cleanup(self):
+        self._flush()  # Gathered packets go out while the transport still takes them
+        self._writable.set()  # Let waiting senders through to find the transport closing
+
         for handler in self._ranges.values():
+            handler.abort()
             if not handler.processor.done():
                 handler.queue.put_nowait(None)
 
@@ -1667,65 +2186,133 @@ class ClientProtoMixin:
     async def connect(
             cls, facade: Facade, host: Union[str, IPv4Address, IPv6Address], port: int,
             emergency: Awaitable = None, key: bytes = None) -> "Protocol":
-        """Connect to server."""
-        a, protocol = await asyncio.get_running_loop().create_connection(
-            lambda: NoiseTransportProtocol(cls(facade, emergency=emergency), server=False, key=key), str(host), port)
+        """Connect to server, again with a full handshake if resumption is refused."""
+        for _ in range(2):
+            a, protocol = await asyncio.get_running_loop().create_connection(
+                lambda: NoiseTransportProtocol(cls(facade, emergency=emergency), server=False, key=key),
+                str(host), port)
+            if await protocol.handshake() or not protocol.resumed:
+                break
         return protocol.get_protocol()
 
 
 class ServerProtoMixin:
     """Server of packet manager."""
 
-    def eof_received(self):
-        """End of communication."""
-        if self.conn_mgr:
-            self.conn_mgr.remove(self)
-
     def connection_made(self, transport: asyncio.Transport):
-        """Connection is made."""
-        if self._conn_mgr:
-            self._conn_mgr.add(self)
+        """Connection is made, admitted by the connection manager before the transport handshake."""
+        Protocol.connection_made(self, transport)
 
     def connection_lost(self, exc: Exception):
-        """Clean up."""
-        if self.conn_mgr:
-            self.conn_mgr.remove(self)
+        """Clean up, the protocol lets go of the connection manager."""
         self.close()
 
     @classmethod
     async def listen(
             cls, facade: Facade, host: Union[str, IPv4Address, IPv6Address],
-            port: int, connections: "ConnectionManager" = None, emergency: Awaitable = None, key: bytes = None
+            port: int, connections: "ConnectionManager" = None, emergency: Awaitable = None, key: bytes = None,
+            reuse_port: bool = False
     ) -> asyncio.base_events.Server:
-        """Start a listening server."""
+        """Start a listening server, with reuse_port several processes can listen to the same port."""
         return await asyncio.get_running_loop().create_server(
             lambda: NoiseTransportProtocol(
-                cls(facade, connections, emergency=emergency), server=True, key=key), host, port)
+                cls(facade, connections, emergency=emergency), server=True, key=key), host, port,
+            reuse_port=reuse_port or None)
 
 
 class ConnectionManager:
-    """Keeps track of connections with server protocols."""
+    """Keeps track of connections with server protocols.
 
-    def __init__(self):
+    Connections beyond the max are refused. Connections without traffic for longer than the idle timeout are
+    closed by a reaper that sweeps all connections a few times per timeout, one timer for all connections.
+    """
+
+    MEASURES = {
+        "bytes": lambda proto: proto.accounting.bytes_in + proto.accounting.bytes_out,
+        "packets": lambda proto: proto.accounting.packets_in + proto.accounting.packets_out,
+        "queued": lambda proto: proto.backlog,
+    }
+
+    def __init__(self, max_connections: int = 4096, idle_timeout: float = 300.0):
         self._client_instances = dict()
         self._clients = set()
+        self._max = max_connections
+        self._idle = idle_timeout
+        self._reaper = None
+        self._refused = 0
+        self._reaped = 0
 
     def __iter__(self):
         for client in self._clients:
             yield self._client_instances[client]
 
-    def add(self, proto: ServerProtoMixin):
-        """Add server protocol connection."""
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @property
+    def refused(self) -> int:
+        """Number of connections refused because of the max."""
+        return self._refused
+
+    @property
+    def reaped(self) -> int:
+        """Number of connections closed for being idle."""
+        return self._reaped
+
+    def add(self, proto: ServerProtoMixin) -> bool:
+        """Add server protocol connection, false if refused."""
         pid = id(proto)
         if pid in self._clients:
             raise NetworkError(*NetworkError.ALREADY_CONNECTED)
+        if len(self._clients) >= self._max:
+            self._refused += 1
+            METRIC_REFUSED.inc()
+            return False
+
         self._clients.add(pid)
         self._client_instances[pid] = proto
+        METRIC_CONNECTIONS.inc()
+        if self._reaper is None and self._idle:
+            self._reaper = asyncio.get_running_loop().call_later(self._idle / 4, self._reap)
+        return True
 
     def remove(self, proto: ServerProtoMixin):
         """Remove server protocol connection"""
         pid = id(proto)
 
-        if pid in self._client:
+        if pid in self._clients:
             del self._client_instances[pid]
             self._clients.remove(pid)
+            METRIC_CONNECTIONS.dec()
+
+    def heaviest(self, count: int = 10, measure: str = "bytes") -> list:
+        """The heaviest connections by bytes, packets or queued packets.
+
+        Args:
+            count (int):
+                Number of connections to list.
+            measure (str):
+                Measure of weight, bytes, packets or queued.
+
+        Returns (list):
+            Tuples of weight and protocol, heaviest first.
+
+        """
+        if measure not in self.MEASURES:
+            raise NetworkError(*NetworkError.UNKNOWN_MEASURE)
+        weight = self.MEASURES[measure]
+        return heapq.nlargest(count, ((weight(proto), proto) for proto in self), key=lambda item: item[0])
+
+    def _reap(self):
+        """Close connections idle longer than the timeout."""
+        self._reaper = None
+        limit = time.monotonic() - self._idle
+        for proto in [proto for proto in self if proto.accounting.activity < limit]:
+            self._reaped += 1
+            METRIC_REAPED.inc()
+            self.remove(proto)
+            if proto.transport and not proto.transport.is_closing():
+                proto.transport.close()
+
+        if self._clients:
+            self._reaper = asyncio.get_running_loop().call_later(self._idle / 4, self._reap)
@@ -13,19 +13,26 @@
 #     Kristoffer Paulsson - initial implementation
 #
 """Mail handler."""
+import asyncio
 import datetime
 import hashlib
 import typing
 import uuid
 from pathlib import PurePosixPath
 
+import msgpack
+from angelos.archive7.archive import Archive7
+from angelos.archive7.base import BLANK_DIGEST
 from angelos.archive7.fs import FileObject, EntryRecord
 from angelos.common.misc import SyncCallable, AsyncCallable
 from angelos.document.utils import Helper, Definitions
 from angelos.net.base import Handler, NetworkIterator, PullItemIterator, PullChunkIterator, \
-    PushItemIterator, PushChunkIterator, StateMode, NetworkState, ConfirmCode, ChunkError
+    PushItemIterator, PushChunkIterator, StateMode, NetworkState, NetworkSession, ConfirmCode, ChunkError, \
+    FinishPacket
 
-MAIL_VERSION = b"mail-0.1"
+MAIL_VERSION_1 = b"mail-0.1"
+MAIL_VERSION_2 = b"mail-0.2"  # Compound stat of download and upload sessions
+MAIL_VERSION = MAIL_VERSION_2
 
 
 SESH_TYPE_RECEIVE = 0x01
@@ -34,12 +41,19 @@ SESH_TYPE_SEND = 0x03
 SESH_TYPE_UPLOAD = 0x04
 
 
+def chunk_digest(block) -> bytes:
+    """SHA-1 digest of a block, computed if the block format leaves it blank."""
+    return hashlib.sha1(block.data).digest() if block.digest == BLANK_DIGEST else block.digest
+
+
 class MailError(RuntimeError):
     """Unrepairable errors in the mail handler."""
     INIT_FAILED = ("Initialization if protocol failed", 100)
     FD_ALREADY_OPEN = ("File descriptor already open", 101)
     STREAM_UNSYNCED = ("Stream block index out of sync.", 102)
     NOT_AUTHENTICATED = ("The client is not authenticated", 103)
+    SESSION_REFUSED = ("Session refused or server busy", 104)
+    UNKNOWN_ITEM = ("Item not received or sent in this connection", 105)
 
 
 class ReceiveIterator(PullItemIterator):
@@ -52,7 +66,7 @@ class ReceiveIterator(PullItemIterator):
 
     async def pull_item(self) -> uuid.UUID:
         item = await self._iterator.__anext__()
-        self._handler.set_entry(item)
+        self._handler.set_entry(item[0].id, item)
         return item[0].id
 
     def iterator_of_source(self, iterator: typing.Iterator):
@@ -63,38 +77,47 @@ class ReceiveIterator(PullItemIterator):
 class DownloadIterator(PullChunkIterator):
     """Test stub iterator item push with states."""
 
+    WINDOW = 16
+
     ST_CREATED = 0x02
     ST_MODIFIED = 0x03
     ST_OWNER = 0x04
     ST_NAME = 0x05
     ST_LENGTH = 0x06
     ST_ID = 0x07
+    ST_STAT = 0x08
 
-    def __init__(self, handler: "Handler", server: bool, session: int, check: SyncCallable = None):
+    def __init__(
+            self, handler: "Handler", server: bool, session: int, check: SyncCallable = None,
+            stat: SyncCallable = None
+    ):
         PullChunkIterator.__init__(self, handler, server, SESH_TYPE_DOWNLOAD, session, {
             self.ST_CREATED: (StateMode.FACT, b""),
             self.ST_MODIFIED: (StateMode.FACT, b""),
             self.ST_OWNER: (StateMode.FACT, b""),
             self.ST_NAME: (StateMode.FACT, b""),
             self.ST_LENGTH: (StateMode.FACT, b""),
-            self.ST_ID: (StateMode.ONCE, b"")
+            self.ST_ID: (StateMode.ONCE, b""),
+            self.ST_STAT: (StateMode.FACT, b"", stat)
         }, 0, check)
         self._fd = None
         self._stream = None
+        self._archive = None
 
     async def pull_chunk(self) -> typing.Tuple[bytes, bytes]:
         block = self._stream.block
         if block.next == -1:
-            self._fd.close()
-            await self._handler.del_entry(True)
+            await self._archive.execute(self._fd.close)
+            await self._handler.del_entry(uuid.UUID(bytes=self._states[self.ST_ID].value), True)
         else:
-            self._stream.next()
-        return block.data, block.digest
+            await self._archive.execute(self._stream.next)
+        return block.data, chunk_digest(block)
 
-    def source(self, fd: FileObject):
-        """Set handler and iterator."""
+    def source(self, fd: FileObject, archive: Archive7):
+        """Set handler and iterator, file operations run in the executor of the archive."""
         self._fd = fd
         self._stream = fd.stream
+        self._archive = archive
 
 
 class SendIterator(PushItemIterator):
@@ -105,45 +128,55 @@ class SendIterator(PushItemIterator):
         }, 0, check)
 
     async def push_item(self, item: uuid.UUID):
-        self._handler.set_entry((item,))
+        self._handler.set_entry(item, (item,))
 
 
 class UploadIterator(PushChunkIterator):
     """Test stub iterator item push with states."""
 
+    WINDOW = 16
+
     ST_CREATED = 0x02
     ST_MODIFIED = 0x03
     ST_OWNER = 0x04
     ST_NAME = 0x05
     ST_LENGTH = 0x06
     ST_ID = 0x07
+    ST_STAT = 0x08
 
-    def __init__(self, handler: "Handler", server: bool, session: int, check: SyncCallable = None):
+    def __init__(
+            self, handler: "Handler", server: bool, session: int, check: SyncCallable = None,
+            stat: SyncCallable = None
+    ):
         PushChunkIterator.__init__(self, handler, server, SESH_TYPE_UPLOAD, session, {
             self.ST_CREATED: (StateMode.ONCE, b""),
             self.ST_MODIFIED: (StateMode.ONCE, b""),
             self.ST_OWNER: (StateMode.ONCE, b""),
             self.ST_NAME: (StateMode.ONCE, b""),
             self.ST_LENGTH: (StateMode.ONCE, b""),
-            self.ST_ID: (StateMode.ONCE, b"")
+            self.ST_ID: (StateMode.ONCE, b""),
+            self.ST_STAT: (StateMode.ONCE, b"", stat)
         }, 0, check)
         self._fd = None
+        self._archive = None
 
     async def push_chunk(self, chunk: bytes, digest: bytes):
         if hashlib.sha1(chunk).digest() != digest:
             raise ChunkError()
 
-        self._fd.write(chunk)
+        await self._archive.execute(self._fd.write, chunk)
 
         count = int.from_bytes(self._states[UploadIterator.ST_COUNT].value, "big", signed=False)
         if self._cnt == count:
-            self._fd.truncate(int.from_bytes(self._states[UploadIterator.ST_LENGTH].value, "big", signed=False))
-            self._fd.close()
-            await self._handler.del_entry()
+            await self._archive.execute(
+                self._fd.truncate, int.from_bytes(self._states[UploadIterator.ST_LENGTH].value, "big", signed=False))
+            await self._archive.execute(self._fd.close)
+            await self._handler.del_entry(uuid.UUID(bytes=self._states[self.ST_ID].value))
 
-    def source(self, fd: FileObject):
-        """Set handler and iterator."""
+    def source(self, fd: FileObject, archive: Archive7):
+        """Set handler and iterator, file operations run in the executor of the archive."""
         self._fd = fd
+        self._archive = archive
 
 
 class MailHandler(Handler):
@@ -159,6 +192,8 @@ class MailHandler(Handler):
 
     ST_VERSION = 0x01
 
+    TRANSFERS = 4  # Mails downloaded and uploaded at once each.
+
     def __init__(self, manager: "Protocol"):
         server = manager.is_server()
         Handler.__init__(self, manager,
@@ -170,7 +205,7 @@ class MailHandler(Handler):
             self.SESH_DOWNLOAD: (DownloadIterator, dict()),
             self.SESH_SEND: (SendIterator, dict()),
             self.SESH_UPLOAD: (UploadIterator, dict()),
-        }, max_sesh=5)
+        }, max_sesh=2 + 2 * self.TRANSFERS)
 
 
 class MailClient(MailHandler):
@@ -180,97 +215,175 @@ class MailClient(MailHandler):
         MailHandler.__init__(self, manager)
 
     async def exchange(self):
-        """Send and receive messages."""
+        """Send and receive messages.
+
+        With mail-0.2 sending and receiving overlap and several mails are transferred at once,
+        mail-0.1 servers only keep track of one mail at a time.
+        """
         await self._manager.ready()
 
-        user = self._manager.facade.data.portfolio.entity.id
+        if not self._states[self.ST_VERSION].frozen:
+            version = await self._call_mediate(self.ST_VERSION, [MAIL_VERSION_2, MAIL_VERSION_1])
+            if version is None:
+                raise MailError(*MailError.INIT_FAILED)
 
-        await self._receive_mails()
-        await self._send_mails()
+        user = self._manager.facade.data.portfolio.entity.id
 
-    async def _receive_mails(self):
+        if self._states[self.ST_VERSION].value == MAIL_VERSION_2:
+            await asyncio.gather(self._receive_mails(self.TRANSFERS), self._send_mails(self.TRANSFERS))
+        else:
+            await self._receive_mails(1)
+            await self._send_mails(1)
+
+    async def _transfer(self, limit: asyncio.Semaphore, transfer: typing.Awaitable):
+        """Run the transfer of one mail, a failure is logged without stopping the others."""
+        try:
+            await transfer
+        except Exception as exc:
+            self.logger.exception(exc)
+        finally:
+            limit.release()
+
+    async def _receive_mails(self, transfers: int):
         """Iterate over received mails."""
-        async with self._sesh_context(self.SESH_RECEIVE) as sesh:
-            answer, data = await self._call_query(NetworkIterator.ST_COUNT, sesh)
-            count = int.from_bytes(data, "big", signed=False)
-            async for item in self._iter_pull_item(sesh, count):
-                await self._download(item)
+        limit = asyncio.Semaphore(transfers)
+        tasks = list()
+        try:
+            async with self._sesh_context(self.SESH_RECEIVE) as sesh:
+                if not sesh:
+                    raise MailError(*MailError.SESSION_REFUSED)
+                answer, data = await self._call_query(NetworkIterator.ST_COUNT, sesh)
+                count = int.from_bytes(data, "big", signed=False)
+                async for item in self._iter_pull_item(sesh, count):
+                    await limit.acquire()
+                    tasks.append(asyncio.create_task(self._transfer(limit, self._download(item))))
+        except BaseException:  # Transfers in flight are given up with the session that lists them
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def _download(self, item: uuid.UUID):
         """Download received mail."""
         async with self._sesh_context(self.SESH_DOWNLOAD) as sesh:
+            if not sesh:
+                raise MailError(*MailError.SESSION_REFUSED)
             sesh.states[DownloadIterator.ST_ID].update(item.bytes)
             await self._call_tell(DownloadIterator.ST_ID, sesh)
 
-            count = int.from_bytes((await self._call_query(NetworkIterator.ST_COUNT, sesh))[1], "big", signed=False)
-            created = datetime.datetime.fromisoformat(
-                (await self._call_query(DownloadIterator.ST_CREATED, sesh))[1].decode())
-            modified = datetime.datetime.fromisoformat(
-                (await self._call_query(DownloadIterator.ST_MODIFIED, sesh))[1].decode())
-            owner = uuid.UUID(bytes=(await self._call_query(DownloadIterator.ST_OWNER, sesh))[1])
-            name = (await self._call_query(DownloadIterator.ST_NAME, sesh))[1]
-            length = int.from_bytes((await self._call_query(DownloadIterator.ST_LENGTH, sesh))[1], "big", signed=False)
+            if self._states[self.ST_VERSION].value == MAIL_VERSION_2:
+                stat = msgpack.unpackb((await self._call_query(DownloadIterator.ST_STAT, sesh))[1], raw=False)
+            else:
+                stat = {
+                    "count": int.from_bytes(
+                        (await self._call_query(NetworkIterator.ST_COUNT, sesh))[1], "big", signed=False),
+                    "created": (await self._call_query(DownloadIterator.ST_CREATED, sesh))[1].decode(),
+                    "modified": (await self._call_query(DownloadIterator.ST_MODIFIED, sesh))[1].decode(),
+                    "owner": (await self._call_query(DownloadIterator.ST_OWNER, sesh))[1],
+                    "name": (await self._call_query(DownloadIterator.ST_NAME, sesh))[1],
+                    "length": int.from_bytes(
+                        (await self._call_query(DownloadIterator.ST_LENGTH, sesh))[1], "big", signed=False),
+                }
+
+            count = stat["count"]
+            created = datetime.datetime.fromisoformat(stat["created"])
+            modified = datetime.datetime.fromisoformat(stat["modified"])
+            owner = uuid.UUID(bytes=stat["owner"])
+            name = stat["name"]
+            length = stat["length"]
 
             path = self._manager.facade.api.mailbox.PATH_INBOX[0].joinpath(
                 str(name) + Helper.extension(Definitions.COM_ENVELOPE))
 
+            archive = self._manager.facade.storage.vault.archive
+            await archive.mkfile(path, b"", created=created, modified=modified, owner=owner, id=item)
+            fd = await archive.load(path, True, False)
             try:
-                await self._manager.facade.storage.vault.archive.mkfile(
-                    path, b"", created=created, modified=modified, owner=owner, id=item)
-                fd = await self._manager.facade.storage.vault.archive.load(path, True, False)
                 async for chunk, digest in self._iter_pull_chunk(sesh, count):
                     if hashlib.sha1(chunk).digest() != digest:
                         raise ChunkError()
-                    fd.write(chunk)
-                fd.truncate(length)
-                fd.close()
-            except ChunkError:
-                await self._manager.facade.storage.vault.archive.remove(path)
+                    await archive.execute(fd.write, chunk)
+                await archive.execute(fd.truncate, length)
+            except Exception as exc:  # No partial mail is left in the inbox
+                await archive.execute(fd.close)
+                await archive.remove(path)
+                if not isinstance(exc, ChunkError):
+                    raise
+            else:
+                await archive.execute(fd.close)
 
-    async def _send_mails(self):
+    async def _send_mails(self, transfers: int):
         """Iterate over sent mails."""
-        items = list()
-        async with self._sesh_context(self.SESH_SEND) as sesh:
-            await self._call_tell(NetworkIterator.ST_COUNT, sesh)
-            async for entry, path in self._manager.facade.storage.vault.outbox_iter():
-                await self._push_item(sesh, entry.id)
-                await self._upload(entry, path)
-
-    async def _block_iter(self, fd: FileObject):
-        """Iterate over block in a file descriptor stream."""
+        limit = asyncio.Semaphore(transfers)
+        tasks = list()
+        try:
+            async with self._sesh_context(self.SESH_SEND) as sesh:
+                if not sesh:
+                    raise MailError(*MailError.SESSION_REFUSED)
+                await self._call_tell(NetworkIterator.ST_COUNT, sesh)
+                async for entry, path in self._manager.facade.storage.vault.outbox_iter():
+                    await limit.acquire()
+                    await self._push_item(sesh, entry.id)
+                    tasks.append(asyncio.create_task(self._transfer(limit, self._upload(entry, path))))
+        except BaseException:  # Transfers in flight are given up with the session that lists them
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _block_iter(self, archive: Archive7, fd: FileObject):
+        """Iterate over block in a file descriptor stream, reading in the executor of the archive."""
         stream = fd.stream
 
         while True:
             block = stream.block
-            yield block.data, block.digest
+            yield block.data, chunk_digest(block)
             if block.next == -1:
-                fd.close()
+                await archive.execute(fd.close)
                 break
             else:
-                stream.next()
+                await archive.execute(stream.next)
 
     async def _upload(self, entry: EntryRecord, path: PurePosixPath):
         """Upload sent mail."""
         async with self._sesh_context(self.SESH_UPLOAD) as sesh:
-            sesh.states[UploadIterator.ST_CREATED].update(entry.created.isoformat().encode())
-            await self._call_tell(UploadIterator.ST_CREATED, sesh)
-            sesh.states[UploadIterator.ST_MODIFIED].update(entry.modified.isoformat().encode())
-            await self._call_tell(UploadIterator.ST_MODIFIED, sesh)
-            sesh.states[UploadIterator.ST_OWNER].update(entry.owner.bytes)
-            await self._call_tell(UploadIterator.ST_OWNER, sesh)
-            sesh.states[UploadIterator.ST_NAME].update(entry.name)
-            await self._call_tell(UploadIterator.ST_NAME, sesh)
-            sesh.states[UploadIterator.ST_LENGTH].update(entry.length.to_bytes(8, "big", signed=False))
-            await self._call_tell(UploadIterator.ST_LENGTH, sesh)
-
-            fd = await self._manager.facade.storage.vault.archive.load(path, True)
-            sesh.states[UploadIterator.ST_COUNT].update(fd.stream.count.to_bytes(8, "big", signed=False))
-
-            await self._call_tell(UploadIterator.ST_COUNT, sesh)
-            async for chunk, digest in self._block_iter(fd):
+            if not sesh:
+                raise MailError(*MailError.SESSION_REFUSED)
+            archive = self._manager.facade.storage.vault.archive
+            fd = await archive.load(path, True)
+
+            if self._states[self.ST_VERSION].value == MAIL_VERSION_2:
+                sesh.states[UploadIterator.ST_STAT].update(msgpack.packb({
+                    "id": entry.id.bytes,
+                    "count": fd.stream.count,
+                    "created": entry.created.isoformat(),
+                    "modified": entry.modified.isoformat(),
+                    "owner": entry.owner.bytes,
+                    "name": entry.name,
+                    "length": entry.length,
+                }, use_bin_type=True))
+                await self._call_tell(UploadIterator.ST_STAT, sesh)
+            else:
+                sesh.states[UploadIterator.ST_CREATED].update(entry.created.isoformat().encode())
+                await self._call_tell(UploadIterator.ST_CREATED, sesh)
+                sesh.states[UploadIterator.ST_MODIFIED].update(entry.modified.isoformat().encode())
+                await self._call_tell(UploadIterator.ST_MODIFIED, sesh)
+                sesh.states[UploadIterator.ST_OWNER].update(entry.owner.bytes)
+                await self._call_tell(UploadIterator.ST_OWNER, sesh)
+                sesh.states[UploadIterator.ST_NAME].update(entry.name)
+                await self._call_tell(UploadIterator.ST_NAME, sesh)
+                sesh.states[UploadIterator.ST_LENGTH].update(entry.length.to_bytes(8, "big", signed=False))
+                await self._call_tell(UploadIterator.ST_LENGTH, sesh)
+                sesh.states[UploadIterator.ST_COUNT].update(fd.stream.count.to_bytes(8, "big", signed=False))
+                await self._call_tell(UploadIterator.ST_COUNT, sesh)
+
+            async for chunk, digest in self._block_iter(archive, fd):
                 await self._push_chunk(sesh, chunk, digest)
 
-            await self._manager.facade.storage.vault.archive.remove(path)
+            await self._push_flush(sesh)
+            await archive.remove(path)
 
 
 class MailServer(MailHandler):
@@ -282,7 +395,14 @@ class MailServer(MailHandler):
         self._sessions[self.SESH_DOWNLOAD][1]["check"] = AsyncCallable(self._download_chunks)
         self._sessions[self.SESH_SEND][1]["check"] = AsyncCallable(self._send_items)
         self._sessions[self.SESH_UPLOAD][1]["check"] = AsyncCallable(self._upload_chunks)
-        self._item = None
+        self._sessions[self.SESH_DOWNLOAD][1]["stat"] = AsyncCallable(self._download_stat)
+        self._sessions[self.SESH_UPLOAD][1]["stat"] = AsyncCallable(self._upload_stat)
+        self._states[self.ST_VERSION].upgrade(SyncCallable(self._negotiate_version))
+        self._items = dict()
+
+    def _negotiate_version(self, value: bytes, sesh: NetworkSession = None) -> int:
+        """Negotiate protocol version."""
+        return ConfirmCode.YES if value in (MAIL_VERSION_1, MAIL_VERSION_2) else ConfirmCode.NO
 
     async def _receive_items(self, state: NetworkState, sesh: ReceiveIterator) -> int:
         """Prepare ReceiveIterator with an iterator."""
@@ -290,35 +410,58 @@ class MailServer(MailHandler):
         state.update(b"!")
         return ConfirmCode.YES
 
-    def set_entry(self, item: tuple):
-        if self._item:
-            raise TypeError("Current item already set.")
-        self._item = item
+    def set_entry(self, id: uuid.UUID, item: tuple):
+        """Keep track of a received or sent item until transferred."""
+        if id in self._items:
+            raise TypeError("Item already set.")
+        self._items[id] = item
+
+    def _get_entry(self, value: bytes) -> tuple:
+        """Item of a download or upload session by id."""
+        try:
+            return self._items[uuid.UUID(bytes=value)]
+        except (ValueError, KeyError):
+            raise MailError(*MailError.UNKNOWN_ITEM)
 
     async def _download_chunks(self, state: NetworkState, sesh: DownloadIterator) -> int:
         """Prepare DownloadIterator with file information and chunk count."""
-        if not self._item:
-            raise TypeError("No current item set.")
-
-        if sesh.states[DownloadIterator.ST_ID].value != self._item[0].id.bytes:
-            raise TypeError("Current item out of sync with session.")
-
-        fd = await self._manager.facade.storage.mail.archive.load(self._item[1], True)
-        sesh.source(fd)
+        item = self._get_entry(sesh.states[DownloadIterator.ST_ID].value)
+        fd = await self._manager.facade.storage.mail.archive.load(item[1], True)
+        sesh.source(fd, self._manager.facade.storage.mail.archive)
 
         state.update(fd.stream.count.to_bytes(8, "big", signed=False))
-        sesh.states[DownloadIterator.ST_CREATED].update(self._item[0].created.isoformat().encode())
-        sesh.states[DownloadIterator.ST_MODIFIED].update(self._item[0].modified.isoformat().encode())
-        sesh.states[DownloadIterator.ST_OWNER].update(self._item[0].owner.bytes)
-        sesh.states[DownloadIterator.ST_NAME].update(self._item[0].name)
-        sesh.states[DownloadIterator.ST_LENGTH].update(self._item[0].length.to_bytes(8, "big", signed=False))
+        sesh.states[DownloadIterator.ST_CREATED].update(item[0].created.isoformat().encode())
+        sesh.states[DownloadIterator.ST_MODIFIED].update(item[0].modified.isoformat().encode())
+        sesh.states[DownloadIterator.ST_OWNER].update(item[0].owner.bytes)
+        sesh.states[DownloadIterator.ST_NAME].update(item[0].name)
+        sesh.states[DownloadIterator.ST_LENGTH].update(item[0].length.to_bytes(8, "big", signed=False))
+        sesh.states[DownloadIterator.ST_STAT].update(msgpack.packb({
+            "count": fd.stream.count,
+            "created": item[0].created.isoformat(),
+            "modified": item[0].modified.isoformat(),
+            "owner": item[0].owner.bytes,
+            "name": item[0].name,
+            "length": item[0].length,
+        }, use_bin_type=True))
 
         return ConfirmCode.YES
 
-    async def del_entry(self, delete: bool = False):
+    async def _download_stat(self, state: NetworkState, sesh: DownloadIterator) -> int:
+        """Prepare DownloadIterator with all file information in one compound state."""
+        return await self._download_chunks(sesh.states[NetworkIterator.ST_COUNT], sesh)
+
+    async def del_entry(self, id: uuid.UUID, delete: bool = False):
+        """Stop tracking a transferred item, delete received mail if delete."""
+        item = self._items.pop(id)
         if delete:
-            await self._manager.facade.storage.mail.archive.remove(self._item[1])
-        self._item = None
+            await self._manager.facade.storage.mail.archive.remove(item[1])
+
+    async def process_finish(self, packet: FinishPacket):
+        """Close an open session, the item of an unfinished download or upload is no longer tracked."""
+        sesh = self.get_session(packet.session)
+        await MailHandler.process_finish(self, packet)
+        if isinstance(sesh, (DownloadIterator, UploadIterator)) and sesh.states[DownloadIterator.ST_ID].value:
+            self._items.pop(uuid.UUID(bytes=sesh.states[DownloadIterator.ST_ID].value), None)
 
     async def _send_items(self, value: bytes, sesh: SendIterator) -> int:
         """Prepare SendIterator with an iterator."""
@@ -326,8 +469,11 @@ class MailServer(MailHandler):
 
     async def _upload_chunks(self, state: NetworkState, sesh: UploadIterator) -> int:
         """Prepare UploadIterator with file information and chunk count."""
-        if not self._item:
-            raise TypeError("No current item set.")
+        value = sesh.states[UploadIterator.ST_ID].value
+        if not value and len(self._items) == 1:  # mail-0.1 clients upload one at a time without id
+            value = next(iter(self._items)).bytes
+        item = self._get_entry(value)
+        sesh.states[UploadIterator.ST_ID].update(value)
 
         created = datetime.datetime.fromisoformat(
             sesh.states[UploadIterator.ST_CREATED].value.decode())
@@ -335,11 +481,27 @@ class MailServer(MailHandler):
             sesh.states[UploadIterator.ST_MODIFIED].value.decode())
         owner = uuid.UUID(bytes=sesh.states[UploadIterator.ST_OWNER].value)
         name = sesh.states[UploadIterator.ST_NAME].value
-        path = PurePosixPath("/" + str(self._item[0]) + Helper.extension(Definitions.COM_ENVELOPE))
+        path = PurePosixPath("/" + str(item[0]) + Helper.extension(Definitions.COM_ENVELOPE))
 
-        await self._manager.facade.storage.vault.archive.mkfile(
-            path, b"", created=created, modified=modified, owner=owner, id=self._item[0])
-        sesh.source(await self._manager.facade.storage.vault.archive.load(path, True, False))
+        archive = self._manager.facade.storage.vault.archive
+        await archive.mkfile(path, b"", created=created, modified=modified, owner=owner, id=item[0])
+        sesh.source(await archive.load(path, True, False), archive)
 
         return ConfirmCode.YES
 
+    async def _upload_stat(self, value: bytes, sesh: UploadIterator) -> int:
+        """Prepare UploadIterator from all file information told in one compound state."""
+        try:
+            stat = msgpack.unpackb(value, raw=False)
+            sesh.states[UploadIterator.ST_ID].update(stat["id"])
+            sesh.states[UploadIterator.ST_CREATED].update(stat["created"].encode())
+            sesh.states[UploadIterator.ST_MODIFIED].update(stat["modified"].encode())
+            sesh.states[UploadIterator.ST_OWNER].update(stat["owner"])
+            sesh.states[UploadIterator.ST_NAME].update(stat["name"])
+            sesh.states[UploadIterator.ST_LENGTH].update(stat["length"].to_bytes(8, "big", signed=False))
+            sesh.states[NetworkIterator.ST_COUNT].update(stat["count"].to_bytes(8, "big", signed=False))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return ConfirmCode.NO
+
+        return await self._upload_chunks(sesh.states[NetworkIterator.ST_COUNT], sesh)
+
@@ -14,18 +14,21 @@
 #
 """Implementation of intermediary transport and the standard noise protocol for Angelos."""
 import asyncio
+import hashlib
 import logging
 import os
+import struct
 from asyncio import CancelledError
 from asyncio.protocols import Protocol
 from asyncio.transports import Transport
 from typing import Any, Union, Callable
 
-from angelos.bin.nacl import PublicKey, SecretKey, Backend_25519_ChaChaPoly_BLAKE2b
+from angelos.bin.nacl import PublicKey, SecretKey, Backend_25519_ChaChaPoly_BLAKE2b, CryptoFailure
+from angelos.common.misc import ExpiringCache
 
 
 # TODO: Certify that this implementation of Noise_XX_25519_ChaChaPoly_BLAKE2b
-#  is interoperable with other implementations.
+#  and Noise_IK_25519_ChaChaPoly_BLAKE2b is interoperable with other implementations.
 
 
 class HandshakeError(RuntimeWarning):
@@ -66,19 +69,27 @@ class HandshakeState:
 
 
 class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
-    """Static implementation of Noise Protocol Noise_XX_25519_ChaChaPoly_BLAKE2b."""
+    """Static implementation of Noise Protocol Noise_XX_25519_ChaChaPoly_BLAKE2b and Noise_IK_25519_ChaChaPoly_BLAKE2b.
+
+    The initiator shakes hands with IK when it knows the static key of the responder since before, which
+    saves one message, otherwise with XX. The responder tells the patterns apart from the length of the
+    first message.
+    """
 
     MAX_MESSAGE_LEN = 2 ** 16 - 1
     MAX_NONCE = 2 ** 64 - 1
 
+    NAME_XX = b"Noise_XX_25519_ChaChaPoly_BLAKE2b"
+    NAME_IK = b"Noise_IK_25519_ChaChaPoly_BLAKE2b"
+
     __slots__ = (
         "_name", "_initiator", "_handshake_hash", "_handshake_state", "_symmetric_state", "_cipher_state_handshake",
-        "_cipher_state_encrypt", "_cipher_state_decrypt", "_static_key"
+        "_cipher_state_encrypt", "_cipher_state_decrypt", "_static_key", "_remote_static", "_resumed"
     )
 
-    def __init__(self, initiator: bool, static_key: SecretKey):
+    def __init__(self, initiator: bool, static_key: SecretKey, remote_static: PublicKey = None):
         Backend_25519_ChaChaPoly_BLAKE2b.__init__(self, 64, 64)
-        self._name = b"Noise_XX_25519_ChaChaPoly_BLAKE2b"
+        self._name = self.NAME_XX
         self._initiator = initiator
         self._handshake_hash = None
         self._handshake_state = None
@@ -87,6 +98,8 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
         self._cipher_state_encrypt = None
         self._cipher_state_decrypt = None
         self._static_key = static_key
+        self._remote_static = remote_static
+        self._resumed = False
 
     @property
     def protocol(self) -> bytes:
@@ -96,12 +109,22 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
     def handshake_hash(self) -> bytes:
         return self._handshake_hash
 
+    @property
+    def remote_static(self) -> PublicKey:
+        """Static key of the remote party, known after the handshake."""
+        return self._remote_static
+
+    @property
+    def resumed(self) -> bool:
+        """The handshake was made with IK."""
+        return self._resumed
+
     def _initialize_key(self, cs: CipherState, key):
         """Reset a cipher state with a new key."""
         cs.k = key
         cs.n = 0
 
-    def _encrypt_with_ad(self, cs: CipherState, ad: bytes, plaintext: bytes) -> bytes:
+    def _encrypt_with_ad(self, cs: CipherState, ad: bytes, plaintext: Union[bytes, memoryview]) -> bytes:
         """Encrypt a message with additional data."""
         if cs.n == self.MAX_NONCE:
             raise NonceDepleted()
@@ -113,7 +136,7 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
         cs.n += 1
         return ciphertext
 
-    def _decrypt_with_ad(self, cs: CipherState, ad: bytes, ciphertext: bytes) -> bytes:
+    def _decrypt_with_ad(self, cs: CipherState, ad: bytes, ciphertext: Union[bytes, memoryview]) -> bytes:
         """Decrypt cipher using additional data."""
         if cs.n == self.MAX_NONCE:
             raise NonceDepleted()
@@ -194,9 +217,8 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
         buffer += self._encrypt_and_hash(self._handshake_state.symmetric_state, b"")
         writer(buffer)
 
-    async def _responder_xx(self, writer: Callable, reader: Callable):
+    async def _responder_xx(self, writer: Callable, reader: Callable, message: bytes):
         """Shake hand as responder according to XX."""
-        message = await reader()
         # READ False e
         self._handshake_state.re = PublicKey(bytes(message[:self.dhlen]))
         message = message[self.dhlen:]
@@ -236,8 +258,83 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
         if self._decrypt_and_hash(self._handshake_state.symmetric_state, bytes(message)) != b"":
             raise HandshakeError()
 
-    async def start_handshake(self, writer: Callable, reader: Callable):
-        """Do noise protocol handshake."""
+    async def _initiator_ik(self, writer: Callable, reader: Callable):
+        """Shake hand as initiator according to IK."""
+        # PRE False s
+        self._handshake_state.rs = self._remote_static
+        self._mix_hash(self._handshake_state.symmetric_state, self._handshake_state.rs.pk)
+
+        # Step 1
+        # WRITE True e
+        buffer = bytearray()
+        self._handshake_state.e = self._generate() if self._handshake_state.e is None else self._handshake_state.e
+        buffer += self._handshake_state.e.pk
+        self._mix_hash(self._handshake_state.symmetric_state, self._handshake_state.e.pk)
+        # WRITE True es
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.e.sk, self._handshake_state.rs.pk))
+        # WRITE True s
+        buffer += self._encrypt_and_hash(self._handshake_state.symmetric_state, self._handshake_state.s.pk)
+        # WRITE True ss
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.s.sk, self._handshake_state.rs.pk))
+        buffer += self._encrypt_and_hash(self._handshake_state.symmetric_state, b"")
+        writer(buffer)
+
+        # Step 2
+        message = await reader()
+        # READ True e
+        self._handshake_state.re = PublicKey(bytes(message[:self.dhlen]))
+        message = message[self.dhlen:]
+        self._mix_hash(self._handshake_state.symmetric_state, self._handshake_state.re.pk)
+        # READ True ee
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.e.sk, self._handshake_state.re.pk))
+        # READ True se
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.s.sk, self._handshake_state.re.pk))
+        if self._decrypt_and_hash(self._handshake_state.symmetric_state, bytes(message)) != b"":
+            raise HandshakeError()
+
+    async def _responder_ik(self, writer: Callable, reader: Callable, message: bytes):
+        """Shake hand as responder according to IK."""
+        # PRE False s
+        self._mix_hash(self._handshake_state.symmetric_state, self._handshake_state.s.pk)
+
+        # READ False e
+        self._handshake_state.re = PublicKey(bytes(message[:self.dhlen]))
+        message = message[self.dhlen:]
+        self._mix_hash(self._handshake_state.symmetric_state, self._handshake_state.re.pk)
+        # READ False es
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.s.sk, self._handshake_state.re.pk))
+        # READ False s
+        temp = bytes(message[:self.dhlen + 16])
+        message = message[self.dhlen + 16:]
+        self._handshake_state.rs = PublicKey(self._decrypt_and_hash(self._handshake_state.symmetric_state, temp))
+        # READ False ss
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.s.sk, self._handshake_state.rs.pk))
+        if self._decrypt_and_hash(self._handshake_state.symmetric_state, bytes(message)) != b"":
+            raise HandshakeError()
+
+        buffer = bytearray()
+        # WRITE False e
+        self._handshake_state.e = self._generate() if self._handshake_state.e is None else self._handshake_state.e
+        buffer += self._handshake_state.e.pk
+        self._mix_hash(self._handshake_state.symmetric_state, self._handshake_state.e.pk)
+        # WRITE False ee
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.e.sk, self._handshake_state.re.pk))
+        # WRITE False se
+        self._mix_key(self._handshake_state.symmetric_state,
+                      self._dh(self._handshake_state.e.sk, self._handshake_state.rs.pk))
+        buffer += self._encrypt_and_hash(self._handshake_state.symmetric_state, b"")
+        writer(buffer)
+
+    def _initialize(self, name: bytes):
+        """Initialize the handshake state for a pattern."""
+        self._name = name
         ss = SymmetricState()
         if len(self._name) <= self.hashlen:
             ss.h = self._name.ljust(self.hashlen, b"\0")
@@ -259,10 +356,26 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
         self._handshake_state = hs
         self._symmetric_state = self._handshake_state.symmetric_state
 
+    async def start_handshake(self, writer: Callable, reader: Callable):
+        """Do noise protocol handshake."""
         if self._initiator:
-            await self._initiator_xx(writer, reader)
+            self._resumed = self._remote_static is not None
+            self._initialize(self.NAME_IK if self._resumed else self.NAME_XX)
+            if self._resumed:
+                await self._initiator_ik(writer, reader)
+            else:
+                await self._initiator_xx(writer, reader)
         else:
-            await self._responder_xx(writer, reader)
+            message = await reader()
+            # The first IK message carries e, an encrypted s and an empty encrypted payload, XX only e.
+            self._resumed = len(message) == self.dhlen * 2 + 32
+            self._initialize(self.NAME_IK if self._resumed else self.NAME_XX)
+            if self._resumed:
+                await self._responder_ik(writer, reader, message)
+            else:
+                await self._responder_xx(writer, reader, message)
+
+        self._remote_static = self._handshake_state.rs
 
         temp_k1, temp_k2 = self._hkdf2(self._handshake_state.symmetric_state.ck, b"")
 
@@ -286,13 +399,13 @@ class NoiseProtocol(Backend_25519_ChaChaPoly_BLAKE2b):
         self._symmetric_state = None
         self._cipher_state_handshake = None
 
-    def encrypt(self, data: bytes) -> bytes:
+    def encrypt(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
         """Encrypt data into a cipher before writing."""
         if len(data) > self.MAX_MESSAGE_LEN:
             raise ValueError("Data must be less or equal to {}.".format(self.MAX_MESSAGE_LEN))
         return self._encrypt_with_ad(self._cipher_state_encrypt, None, data)
 
-    def decrypt(self, data: bytes) -> bytes:
+    def decrypt(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
         """Decrypt a cipher into data before reading."""
         if len(data) > self.MAX_MESSAGE_LEN:
             raise ValueError("Data must be less or equal to {}".format(self.MAX_MESSAGE_LEN))
@@ -347,6 +460,10 @@ class IntermediateTransportProtocol(Transport, Protocol):
         """Process received data before handed to the application protocol. Overwrite to use."""
         return data
 
+    def _on_connected(self) -> None:
+        """Connection made forwarded to the application protocol, overwrite to use."""
+        pass
+
     def _on_lost(self) -> None:
         """Lost connection handler, overwrite to use."""
         pass
@@ -459,15 +576,23 @@ class IntermediateTransportProtocol(Transport, Protocol):
 
     def connection_made(self, transport: Transport) -> None:
         """Connection made on underlying transport. Flow is interrupted and operations can be
-        done before forwarded to the overlaying protocol."""
+        done before forwarded to the overlaying protocol. Connections the overlaying protocol doesn't
+        admit are closed before anything is spent on them."""
         self._transport = transport
         if self._task_conn:
             raise BlockingIOError("Can only run one connection made at a time.")
+        admit = getattr(self._protocol, "admit", None)
+        if admit is not None and not admit():
+            transport.close()
+            return
 
         def done(fut):
+            if fut.cancelled():  # Connection given up before made
+                return
             fut.result()
             self._protocol.connection_made(self)
             self._task_conn = None
+            self._on_connected()
 
         self._task_conn = asyncio.create_task(self._on_connection())
         self._task_conn.add_done_callback(done)
@@ -509,39 +634,185 @@ class IntermediateTransportProtocol(Transport, Protocol):
 
 
 class NoiseTransportProtocol(IntermediateTransportProtocol):
-    __slots__ = ("_noise", "_server")
+    """Noise encrypted transport over a stream.
+
+    All messages, handshake included, are sent as records with a two byte length prefix, as the Noise
+    specification suggests for stream transports. Written data is split into records of the largest size a
+    Noise message allows, and received data is gathered in a buffer until records are whole, so that the
+    boundaries of native reads and writes don't matter. Records are decrypted straight from the buffer.
+
+    The static key is given by the key or else kept for the process, so that a server can be recognized.
+    Servers derive the key from their seed with derive_key, so that all worker processes share one key.
+    A client caches the static key of a server by its address after a full XX handshake and resumes with IK,
+    in one round trip, when connecting again within the ticket lifetime. The server accepts IK from any
+    client, as it accepts any client static key with XX, so the server keeps no state of resumptions and
+    every worker process with the same key resumes alike. A failed resumption, such as after the server key
+    changed, is forgotten by the client, which connects again with XX.
+    """
+
+    HANDSHAKE_TIMEOUT = 10  # Seconds to complete the handshake before the connection is aborted
+    TICKET_LIFETIME = 3600  # Seconds from a full handshake that a resumption is allowed
+
+    RECORD_HEADER = struct.Struct("!H")
+    MAX_RECORD_DATA = NoiseProtocol.MAX_MESSAGE_LEN - 16  # Largest plaintext, leaving room for the tag
+
+    _keys = dict()  # Static keys of the process, client and server
+    _known = ExpiringCache(TICKET_LIFETIME)  # Static keys of servers by address
+
+    __slots__ = ("_noise", "_server", "_static", "_peer", "_inbound", "_waiter", "_paused")
 
     def __init__(self, protocol: Protocol, server: bool = False, key: bytes = None):
         IntermediateTransportProtocol.__init__(self, protocol)
-        self._noise = NoiseProtocol(not server, SecretKey(os.urandom(32)))
-        self._event = asyncio.Event()
-        self._event.set()
+        self._noise = None
         self._server = server
+        self._static = SecretKey(key) if key else self._process_key(server)
+        self._peer = None
+        self._inbound = bytearray()
+        self._waiter = None
+        self._paused = False
+
+    @classmethod
+    def _process_key(cls, server: bool) -> SecretKey:
+        """Static key kept for the process."""
+        if server not in cls._keys:
+            cls._keys[server] = SecretKey(os.urandom(32))
+        return cls._keys[server]
+
+    @staticmethod
+    def derive_key(seed: bytes) -> bytes:
+        """Static key derived from the seed of a server."""
+        return hashlib.blake2b(seed, digest_size=32, person=b"angelos-noise").digest()
+
+    @property
+    def resumed(self) -> bool:
+        """The connection was resumed with IK."""
+        return self._noise is not None and self._noise.resumed
+
+    async def handshake(self) -> bool:
+        """Wait for the handshake to finish.
+
+        Returns (bool):
+            Whether the connection was made.
+
+        """
+        task = self._task_conn
+        if task is None:
+            return self._noise is not None and self._noise.handshake_hash is not None
+        await asyncio.wait((task,))
+        return not task.cancelled() and task.exception() is None
 
     async def _on_connection(self):
         """Perform noise protocol handshake before telling application protocol connection_made()."""
+        peer = self._transport.get_extra_info("peername")
+        self._peer = tuple(peer[:2]) if peer else None
+        if self._server:
+            self._noise = NoiseProtocol(False, self._static)
+        else:
+            self._noise = NoiseProtocol(True, self._static, remote_static=self._known.get(self._peer))
+
         try:
             self._set_mode(IntermediateTransportProtocol.DIVERT)
-            await self._noise.start_handshake(self._transport.write, self._reader)
+            await asyncio.wait_for(
+                self._noise.start_handshake(self._write_record, self._read_record), self.HANDSHAKE_TIMEOUT)
             self._set_mode(IntermediateTransportProtocol.PASSTHROUGH)
+        except (asyncio.TimeoutError, HandshakeError, CryptoFailure):
+            self._transport.abort()
+            self._forget()
+            raise CancelledError()
         except CancelledError:
-            pass
+            self._forget()
+            raise
+
+        if not self._server and not self._noise.resumed and self._peer:
+            self._known.set(self._peer, self._noise.remote_static)
+
+    def _forget(self):
+        """Forget the server static key when resumption fails."""
+        if not self._server and self._noise.resumed:
+            self._known.discard(self._peer)
+
+    def _on_connected(self):
+        """Pass on records that arrived right behind the handshake."""
+        self._deliver()
+
+    def pause_reading(self) -> None:
+        """Pause reading, records already buffered are held back too."""
+        self._paused = True
+        self._transport.pause_reading()
+
+    def resume_reading(self) -> None:
+        """Resume reading and pass on records held back."""
+        self._paused = False
+        self._transport.resume_reading()
+        if self._mode is self.PASSTHROUGH and self._task_conn is None:
+            self._deliver()
 
     # async def _on_close(self) -> None:
     #    """Clean up protocol."""
     #    self._protocol.close()
 
+    def _write_record(self, message: Union[bytes, bytearray]):
+        """Write a handshake message as one record."""
+        self._transport.write(self.RECORD_HEADER.pack(len(message)) + bytes(message))
+
+    def _next_record(self) -> Union[bytes, None]:
+        """Take the next whole record off the buffer, if any."""
+        if len(self._inbound) < self.RECORD_HEADER.size:
+            return None
+        end = self.RECORD_HEADER.size + self.RECORD_HEADER.unpack_from(self._inbound)[0]
+        if len(self._inbound) < end:
+            return None
+        record = bytes(self._inbound[self.RECORD_HEADER.size:end])
+        del self._inbound[:end]
+        return record
+
+    async def _read_record(self) -> bytes:
+        """Wait for the next handshake message."""
+        record = self._next_record()
+        while record is None:
+            self._waiter = self._loop.create_future()
+            await self._waiter
+            record = self._next_record()
+        return record
+
     def _on_write(self, data: Union[bytes, bytearray, memoryview]) -> Union[bytes, bytearray, memoryview]:
-        """Encrypt outgoing data with Noise."""
-        cipher = self._noise.encrypt(data)
-        self._event.clear()
-        return cipher
+        """Encrypt outgoing data with Noise, as many records as needed."""
+        view = memoryview(data)
+        output = bytearray()
+        for offset in range(0, len(view), self.MAX_RECORD_DATA):
+            cipher = self._noise.encrypt(view[offset:offset + self.MAX_RECORD_DATA])
+            output += self.RECORD_HEADER.pack(len(cipher))
+            output += cipher
+        return bytes(output)
 
     def _on_received(self, cipher: Union[bytes, bytearray, memoryview]) -> Union[bytes, bytearray, memoryview]:
-        """Decrypt incoming data with Noise."""
-        data = self._noise.decrypt(cipher)
-        self._event.set()
-        return data
+        """Decrypt incoming record with Noise."""
+        return self._noise.decrypt(cipher)
+
+    def _deliver(self):
+        """Decrypt all whole records in the buffer and pass them on to the application protocol."""
+        view = memoryview(self._inbound)
+        offset = 0
+        size = len(view)
+        try:
+            while not self._paused and size - offset >= self.RECORD_HEADER.size:
+                end = offset + self.RECORD_HEADER.size + ((view[offset] << 8) | view[offset + 1])
+                if size < end:
+                    break
+                data = self._on_received(view[offset + self.RECORD_HEADER.size:end])
+                offset = end
+                self._protocol.data_received(data)
+        finally:
+            view.release()
+            del self._inbound[:offset]
+
+    def data_received(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        """Gather received data into records, handshake messages are handed to the handshake and
+        the rest is decrypted and passed on once the application protocol is connected."""
+        self._inbound += data
+        if self._mode is not self.PASSTHROUGH:
+            if self._waiter is not None and not self._waiter.done():
+                self._waiter.set_result(None)
+        elif self._task_conn is None:
+            self._deliver()
 
-    async def wait(self):
-        await self._event.wait()
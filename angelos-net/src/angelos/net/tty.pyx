@@ -32,6 +32,41 @@ from angelos.net.base import Handler, StateMode, Protocol, PullChunkIterator, Pu
     NetworkState, ConfirmCode, ProtocolNegotiationError, NetworkSession, NetworkIterator, ErrorCode
 
 
+GLYPH_SIZE = 7  # Bytes per screen cell
+
+
+def pack_glyphs(data: bytes) -> bytes:
+    """Run-length encode a row span of glyphs, every run is a count byte followed by the glyph."""
+    cdef bytearray packed = bytearray()
+    cdef Py_ssize_t length = len(data), pos = 0, end = 0, count = 0
+    cdef bytes glyph
+
+    while pos < length:
+        glyph = data[pos:pos + GLYPH_SIZE]
+        end = pos + GLYPH_SIZE
+        count = 1
+        while count < 255 and end < length and data[end:end + GLYPH_SIZE] == glyph:
+            end += GLYPH_SIZE
+            count += 1
+        packed.append(count)
+        packed += glyph
+        pos = end
+
+    return bytes(packed)
+
+
+def unpack_glyphs(data: bytes) -> bytes:
+    """Expand a run-length encoded row span of glyphs."""
+    cdef bytearray unpacked = bytearray()
+    cdef Py_ssize_t length = len(data), pos = 0
+
+    while pos < length:
+        unpacked += data[pos + 1:pos + 1 + GLYPH_SIZE] * data[pos]
+        pos += 1 + GLYPH_SIZE
+
+    return bytes(unpacked)
+
+
 class TerminalClient:
     """Client side terminal emulator."""
 
@@ -41,20 +76,17 @@ class TerminalClient:
         self._y = 1
 
     async def handle(self, data: bytes):
-        """Receive terminal output information."""
+        """Receive terminal output frames, with the modified row spans and the cursor."""
         info = msgpack.unpackb(data, raw=False)
-        if isinstance(info, dict):
-            if info["type"] == "cursor":
-                self._x = info["cursor"][0]
-                self._y = info["cursor"][1]
-                sys.stdout.write("\x1b[{};{}H".format(self._y, self._x))
-
-            if info["type"] == "row":
-                line = "\x1b[{};{}H{}".format(
-                    info["y"], info["begin"],
-                    print_line(info["y"], info["begin"], info["end"], info["row"]).decode(),
-                )
-                sys.stdout.write(line)
+        if isinstance(info, dict) and info["type"] == "frame":
+            output = list()
+            for y, begin, end, row in info["rows"]:
+                output.append("\x1b[{};{}H".format(y, begin))
+                output.append(print_line(y, begin, end, unpack_glyphs(row)).decode())
+
+            self._x, self._y = info["cursor"]
+            output.append("\x1b[{};{}H".format(self._y, self._x))
+            sys.stdout.write("".join(output))
 
     def send(self, data: bytes):
         """Send text and sequences to server."""
@@ -77,6 +109,12 @@ class TerminalServer(SharedResource, Terminal):
             sender(y, b, e, d)
         self._clear()
 
+    def frame(self) -> dict:
+        """All modified row spans run-length encoded and the cursor, as one frame."""
+        rows = [(y, b, e, pack_glyphs(d)) for y, b, e, d in self._display()]
+        self._clear()
+        return {"type": "frame", "cursor": (self.x, self.y), "rows": rows}
+
     @shared
     def smear(self) -> None:
         self._smear()
@@ -95,7 +133,7 @@ class TerminalServer(SharedResource, Terminal):
         self._smear()
 
 
-TERMINAL_VERSION = b"tty-0.1"
+TERMINAL_VERSION = b"tty-0.2"
 
 SESH_TYPE_DOWNSTREAM = 0x01
 SESH_TYPE_UPSTREAM = 0x02
@@ -234,12 +272,15 @@ class TTYClient(TTYHandler):
             except ChunkError:
                 pass
             except KeyError:
-                self._manager.error(ErrorCode.MALFORMED, self._pkt_type + self._r_start, self.LEVEL)
+                self._manager.error(
+                    ErrorCode.MALFORMED, self.PKT_SENT_CHUNK + self._r_start, self.LEVEL, session=sesh.id)
             self._quit.set()
 
 
 class TTYServer(TTYHandler):
 
+    FRAME_INTERVAL = 1 / 30  # Least seconds between two display frames
+
     def __init__(self, manager: Protocol):
         TTYHandler.__init__(self, manager)
         self._states[self.ST_VERSION].upgrade(SyncCallable(self._check_version))
@@ -248,6 +289,8 @@ class TTYServer(TTYHandler):
 
         self._resize_timer = None
         self._display_task = None
+        self._last_frame = 0.0
+        self._cursor = None
         self._terminal = None
         self._lock = asyncio.Lock()
 
@@ -271,26 +314,30 @@ class TTYServer(TTYHandler):
         """Prepare UploadIterator with file information and chunk count."""
         sesh.source(self._seq)
         if self._terminal:
-            self._display_task = asyncio.create_task(self._display_later())
+            self._display()
         self._idle = asyncio.create_task(self._idler())
         return ConfirmCode.YES
 
-    def _display(self, y: int, b: int, e: int, d: bytes):
-        """Send display update to client."""
-        self.send(msgpack.packb(
-            {"type": "row", "y": y, "begin": b, "end": e, "row": d}, use_bin_type=True))
+    def _display(self):
+        """Schedule a display frame to the client.
+
+        The frame is sent on the next iteration of the event loop unless a frame was sent within the frame
+        interval, then it is delayed until the interval has passed. Updates to the screen in the meantime
+        are merged into the same frame.
+        """
+        if not self._display_task:
+            delay = max(0.0, self._last_frame + self.FRAME_INTERVAL - asyncio.get_running_loop().time())
+            self._display_task = asyncio.create_task(self._display_later(delay))
 
     async def handle(self, data: bytes):
-        """Receive input from client, process and send output screen information."""
+        """Receive input from client, process and schedule output screen information."""
         info = msgpack.unpackb(data, raw=False)
         if isinstance(info, dict) and self._terminal:
             try:
                 if info["type"] == "seq":
                     async with self._lock:
                         await self._terminal.feed(info["data"])
-                        self.send(msgpack.packb(
-                            {"type": "cursor", "cursor": (self._terminal.x, self._terminal.y)}, use_bin_type=True))
-                        self._terminal.display(self._display)
+                    self._display()
                 if info["type"] == "resize":
                     if self._resize_timer:
                         self._resize_timer.cancel()
@@ -298,16 +345,23 @@ class TTYServer(TTYHandler):
                         self._resize_later(max(80, min(240, info["cols"])), max(8, min(72, info["lines"])))
                     )
             except KeyError:
-                self._manager.error(ErrorCode.MALFORMED, self._pkt_type + self._r_start, self.LEVEL)
+                self._manager.error(ErrorCode.MALFORMED, self.PKT_PUSH_CHUNK + self._r_start, self.LEVEL)
 
     async def _resize_later(self, cols: int, lines: int):
         await asyncio.sleep(.25)
         async with self._lock:
             await self._terminal.resize(lines, cols)
-            self._terminal.display(self._display)
+        self._display()
         self._resize_timer = None
 
-    async def _display_later(self):
+    async def _display_later(self, delay: float):
+        """Send all modified rows and the cursor in one frame, if anything changed."""
+        await asyncio.sleep(delay)
         async with self._lock:
-            self._terminal.display(self._display)
-        self._display_task = None
+            self._display_task = None
+            frame = self._terminal.frame()
+
+        if frame["rows"] or frame["cursor"] != self._cursor:
+            self._cursor = frame["cursor"]
+            self._last_frame = asyncio.get_running_loop().time()
+            self.send(msgpack.packb(frame, use_bin_type=True))
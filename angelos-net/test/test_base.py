@@ -0,0 +1,381 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import asyncio
+import datetime
+import os
+import time
+import uuid
+from unittest import TestCase
+
+from angelos.net.base import FrameDecoder, FRAME_HEADER, NetworkIterator, IteratorInconsistencyWarning, \
+    ConfirmPacket, ErrorPacket, ItemSentPacket, PushChunkPacket, TellPacket, Packet, DataType, Accounting, \
+    ConnectionManager, NetworkError, Protocol, Handler, r
+from angelos.net.noise import NoiseTransportProtocol
+from test import run_async
+
+
+def frame(pkt_type: int, level: int, body: bytes) -> bytes:
+    length = FRAME_HEADER.size + len(body)
+    return FRAME_HEADER.pack(pkt_type, length >> 16, length & 0xFFFF, level) + body
+
+
+class TestFrameDecoder(TestCase):
+    def test_feed(self):
+        decoder = FrameDecoder()
+        frames = decoder.feed(frame(116, 1, b"hello"))
+        self.assertEqual([(t, l, bytes(b)) for t, l, b in frames], [(116, 1, b"hello")])
+        self.assertEqual(decoder.pending, 0)
+
+    def test_feed_several(self):
+        decoder = FrameDecoder()
+        data = frame(116, 1, b"one") + frame(117, 2, b"") + frame(118, 3, b"three" * 1000)
+        frames = decoder.feed(data)
+        self.assertEqual(
+            [(t, l, bytes(b)) for t, l, b in frames], [(116, 1, b"one"), (117, 2, b""), (118, 3, b"three" * 1000)])
+
+    def test_feed_split(self):
+        decoder = FrameDecoder()
+        data = frame(116, 1, b"first") + frame(117, 2, b"second")
+        frames = list()
+        for index in range(len(data)):
+            frames += [(t, l, bytes(b)) for t, l, b in decoder.feed(data[index:index + 1])]
+            self.assertEqual(decoder.pending, index + 1 - sum(FRAME_HEADER.size + len(b) for _, _, b in frames))
+        self.assertEqual(frames, [(116, 1, b"first"), (117, 2, b"second")])
+        self.assertEqual(decoder.pending, 0)
+
+        frames = decoder.feed(data[:8]) + decoder.feed(bytearray(data[8:]))
+        self.assertEqual([(t, l, bytes(b)) for t, l, b in frames], [(116, 1, b"first"), (117, 2, b"second")])
+
+    def test_feed_malformed(self):
+        decoder = FrameDecoder()
+        with self.assertRaises(ValueError):
+            decoder.feed(FRAME_HEADER.pack(116, 0, 3, 1))
+        self.assertEqual(decoder.pending, 0)
+
+        decoder.feed(frame(116, 1, b"partial")[:4])
+        with self.assertRaises(ValueError):
+            decoder.feed(b"\x00\x02\x01" + frame(116, 1, b""))
+        self.assertEqual(decoder.pending, 0)
+        self.assertEqual(len(decoder.feed(frame(116, 1, b"after"))), 1)
+
+
+class DatedPacket(Packet, fields=("date", "type", "session"), fields_info=(
+        (DataType.DATETIME,), (DataType.UINT,), (DataType.UINT,))):
+    __slots__ = ()
+
+
+class TestPacket(TestCase):
+    def test_struct(self):
+        packet = ErrorPacket(300, 2, 70000, 5, 7)
+        data = bytes(packet)
+        self.assertEqual(len(data), 5 * 4)
+        self.assertEqual(ErrorPacket.unpack(data).tuple, (300, 2, 70000, 5, 7))
+        self.assertEqual(len(bytes(ConfirmPacket(1, 2, 3, 4))), 4 + 1 + 4 + 4)
+        self.assertEqual(ConfirmPacket.unpack(bytes(ConfirmPacket(1, 2, 3, 4))).answer, 2)
+
+        with self.assertRaises(ValueError):
+            ConfirmPacket(1, 3, 3, 4)
+        with self.assertRaises(ValueError):
+            bytes(ErrorPacket(2 ** 32, 2, 1, 1, 0))
+        with self.assertRaises(ValueError):
+            ErrorPacket.unpack(data[:-1])
+
+    def test_msgpack(self):
+        item = uuid.uuid4()
+        packet = ItemSentPacket(3, item, 1, 2)
+        self.assertEqual(ItemSentPacket.unpack(bytes(packet)).item, item)
+
+        packet = PushChunkPacket(1, b"chunk", b"", 1, 2)
+        self.assertEqual(PushChunkPacket.unpack(memoryview(bytes(packet))).tuple, (1, b"chunk", b"", 1, 2))
+
+        date = datetime.datetime(2021, 3, 4, 5, 6, 7, 890)
+        self.assertEqual(DatedPacket.unpack(bytes(DatedPacket(date, 1, 2))).date, date.replace(microsecond=0))
+
+        with self.assertRaises(ValueError):
+            TellPacket(1, b"", 1, 2)
+        with self.assertRaises(ValueError):
+            PushChunkPacket(1, b"x" * 8193, b"", 1, 2)
+
+    def test_msgpack_malformed(self):
+        data = bytes(TellPacket(1, b"value", 2, 3))
+        for malformed in (data[:-1], data + b"\x01", b"\xc1"):
+            with self.assertRaises(ValueError):
+                TellPacket.unpack(malformed)
+            self.assertEqual(TellPacket.unpack(data).value, b"value")
+
+
+class Iterator(NetworkIterator):
+    WINDOW = 4
+
+
+class TestNetworkIterator(TestCase):
+    @run_async
+    async def test_arrange(self):
+        iterator = Iterator(None, False, 1, 1, dict())
+        self.assertEqual(iterator.arrange(2, "b"), [])
+        self.assertEqual(iterator.arrange(3, "c"), [])
+        self.assertEqual(iterator.arrange(1, "a"), ["a", "b", "c"])
+        self.assertEqual(iterator.arrange(4, "d"), ["d"])
+        self.assertEqual(iterator.arrange(6, "f"), [])
+        self.assertEqual(iterator.arrange(5, "e"), ["e", "f"])
+
+    @run_async
+    async def test_arrange_inconsistent(self):
+        iterator = Iterator(None, False, 1, 1, dict())
+        iterator.arrange(1, "a")
+        iterator.arrange(3, "c")
+        with self.assertRaises(IteratorInconsistencyWarning):
+            iterator.arrange(1, "a")
+        with self.assertRaises(IteratorInconsistencyWarning):
+            iterator.arrange(3, "c")
+        with self.assertRaises(IteratorInconsistencyWarning):
+            iterator.arrange(6, "f")
+        self.assertEqual(iterator.arrange(2, "b"), ["b", "c"])
+
+
+class Transport:
+    """Transport that only remembers being closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+class Recorder(Transport):
+    """Transport that remembers what is written."""
+
+    def __init__(self):
+        Transport.__init__(self)
+        self.writes = list()
+        self.limits = None
+        self.reading = True
+
+    def set_write_buffer_limits(self, high: int = None, low: int = None):
+        self.limits = (high, low)
+
+    def pause_reading(self):
+        self.reading = False
+
+    def resume_reading(self):
+        self.reading = True
+
+    def write(self, data: bytes):
+        if self.closed:
+            raise RuntimeError("Written after closing")
+        self.writes.append(data)
+
+
+class Weighed:
+    """Connection with accounting and a backlog, but no network."""
+
+    def __init__(self, bytes_in: int = 0, packets_in: int = 0, backlog: int = 0):
+        self.accounting = Accounting()
+        self.accounting.bytes_in = bytes_in
+        self.accounting.packets_in = packets_in
+        self.backlog = backlog
+        self.transport = Transport()
+
+
+class Managed(asyncio.Protocol):
+    """Application protocol admitted by a connection manager."""
+
+    def __init__(self, manager: ConnectionManager):
+        self.manager = manager
+        self.made = False
+
+    def admit(self) -> bool:
+        return self.manager.add(self)
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.made = True
+
+    def connection_lost(self, exc: Exception):
+        self.manager.remove(self)
+
+
+class TestConnectionManager(TestCase):
+    @run_async
+    async def test_refuse(self):
+        manager = ConnectionManager(max_connections=1)
+        served = list()
+
+        def factory():
+            served.append(NoiseTransportProtocol(Managed(manager), server=True, key=os.urandom(32)))
+            return served[-1]
+
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(factory, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            _, first = await loop.create_connection(
+                lambda: NoiseTransportProtocol(asyncio.Protocol(), server=False), "127.0.0.1", port)
+            self.assertTrue(await first.handshake())
+
+            _, second = await loop.create_connection(
+                lambda: NoiseTransportProtocol(asyncio.Protocol(), server=False), "127.0.0.1", port)
+            self.assertFalse(await second.handshake())
+            self.assertEqual(manager.refused, 1)
+            self.assertEqual(len(manager), 1)
+            self.assertTrue(served[0].get_protocol().made)
+            self.assertFalse(served[1].get_protocol().made)
+            self.assertIsNone(served[1]._task_conn)  # The handshake never started
+
+            first.close()
+            await asyncio.sleep(.1)
+            self.assertEqual(len(manager), 0)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    @run_async
+    async def test_reap(self):
+        manager = ConnectionManager(idle_timeout=.2)
+        idle, busy = Weighed(), Weighed()
+        manager.add(idle)
+        manager.add(busy)
+
+        for _ in range(10):
+            await asyncio.sleep(.05)
+            busy.accounting.activity = time.monotonic()
+
+        self.assertTrue(idle.transport.closed)
+        self.assertFalse(busy.transport.closed)
+        self.assertEqual(manager.reaped, 1)
+        self.assertEqual(list(manager), [busy])
+
+    @run_async
+    async def test_heaviest(self):
+        manager = ConnectionManager()
+        light = Weighed(bytes_in=10, packets_in=9, backlog=1)
+        middle = Weighed(bytes_in=200, packets_in=1, backlog=0)
+        heavy = Weighed(bytes_in=3000, packets_in=5, backlog=7)
+        for proto in (light, middle, heavy):
+            manager.add(proto)
+
+        self.assertEqual([proto for _, proto in manager.heaviest()], [heavy, middle, light])
+        self.assertEqual(manager.heaviest(2, "packets"), [(9, light), (5, heavy)])
+        self.assertEqual([proto for _, proto in manager.heaviest(1, "queued")], [heavy])
+        with self.assertRaises(NetworkError):
+            manager.heaviest(measure="weight")
+
+
+class TestProtocolWrites(TestCase):
+    def connect(self) -> tuple:
+        protocol = Protocol(None)
+        transport = Recorder()
+        protocol.connection_made(transport)
+        return protocol, transport
+
+    @run_async
+    async def test_coalesce(self):
+        protocol, transport = self.connect()
+        await protocol.send_packet(116, 1, TellPacket(1, b"one", 2, 3))
+        await protocol.send_packet(117, 2, TellPacket(4, b"two", 5, 6))
+        await protocol.send_packet(118, 3, PushChunkPacket(1, b"three", b"", 7, 8))
+        self.assertEqual(transport.writes, [])
+
+        await asyncio.sleep(0)
+        self.assertEqual(len(transport.writes), 1)
+        frames = FrameDecoder().feed(transport.writes[0])
+        self.assertEqual([(t, l) for t, l, _ in frames], [(116, 1), (117, 2), (118, 3)])
+        self.assertEqual(TellPacket.unpack(bytes(frames[1][2])).value, b"two")
+        self.assertEqual(protocol.accounting.packets_out, 3)
+        self.assertEqual(protocol.accounting.bytes_out, len(transport.writes[0]))
+
+    @run_async
+    async def test_write_limit(self):
+        protocol, transport = self.connect()
+        for count in range(10):
+            await protocol.send_packet(118, 1, PushChunkPacket(count, os.urandom(8192), b"", 2, 3))
+        await asyncio.sleep(0)
+
+        self.assertEqual(len(transport.writes), 2)
+        self.assertTrue(all(len(data) <= Protocol.WRITE_LIMIT for data in transport.writes))
+        self.assertEqual(
+            [PushChunkPacket.unpack(bytes(chunk)).count for data in transport.writes
+             for _, _, chunk in FrameDecoder().feed(data)], list(range(10)))
+
+    @run_async
+    async def test_close(self):
+        protocol, transport = self.connect()
+        await protocol.send_packet(116, 1, TellPacket(1, b"last", 2, 3))
+        protocol.close()
+        self.assertTrue(transport.closed)
+        self.assertEqual(len(transport.writes), 1)
+
+
+class Gate(Handler):
+    """Handler that holds told values until the gate opens, noting whether the transport reads meanwhile."""
+
+    LEVEL = 1
+    RANGE = 5
+
+    def __init__(self, manager: Protocol):
+        Handler.__init__(self, manager)
+        self.gate = asyncio.Event()
+        self.readings = list()
+
+    async def process_tell(self, packet: TellPacket):
+        await self.gate.wait()
+        self.readings.append(self.manager.transport.reading)
+
+
+class Gated(Protocol):
+    def __init__(self):
+        Protocol.__init__(self, None, True)
+        self.handler = Gate(self)
+        self._add_handler(self.handler)
+
+
+class TestProtocolBackpressure(TestCase):
+    @run_async
+    async def test_writing(self):
+        protocol, transport = Protocol(None), Recorder()
+        protocol.connection_made(transport)
+        self.assertEqual(transport.limits, (Protocol.WRITE_HIGH, Protocol.WRITE_LOW))
+
+        protocol.pause_writing()
+        task = asyncio.create_task(protocol.send_packet(116, 1, TellPacket(1, b"paused", 2, 3)))
+        await asyncio.sleep(.05)
+        self.assertFalse(task.done())
+
+        protocol.resume_writing()
+        await task
+        await asyncio.sleep(0)
+        self.assertEqual(len(transport.writes), 1)
+
+    @run_async
+    async def test_reading(self):
+        protocol, transport = Gated(), Recorder()
+        protocol.connection_made(transport)
+
+        told = frame(r(Gate.RANGE)[0] + Handler.PKT_TELL, Gate.LEVEL, bytes(TellPacket(1, b"told", 0, 0)))
+        protocol.data_received(told * (Protocol.READ_HIGH - 1))
+        self.assertTrue(transport.reading)
+        protocol.data_received(told)
+        self.assertFalse(transport.reading)
+        self.assertEqual(protocol.backlog, Protocol.READ_HIGH)
+
+        protocol.handler.gate.set()
+        while len(protocol.handler.readings) < Protocol.READ_HIGH:
+            await asyncio.sleep(.01)
+        self.assertEqual(protocol.handler.readings.count(False), Protocol.READ_HIGH - Protocol.READ_LOW)
+        self.assertTrue(transport.reading)
+        self.assertEqual(protocol.backlog, 0)
@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import asyncio
+import functools
+import logging
+from pathlib import PurePosixPath
+from unittest import TestCase, mock
+
+from angelos.document.utils import Definitions, Helper
+from angelos.facade.facade import Facade
+from angelos.net.authentication import AuthenticationServer, AuthenticationClient, AuthenticationHandler
+from angelos.net.base import ServerProtoMixin, Protocol, ClientProtoMixin, ConnectionManager, ConfirmCode
+from angelos.net.broker import ServiceBrokerServer, ServiceBrokerClient, ServiceBrokerHandler
+from angelos.net.mail import MailServer, MailClient, MailHandler, DownloadIterator, MAIL_VERSION_1
+from angelos.portfolio.collection import Portfolio, PrivatePortfolio
+from angelos.portfolio.envelope.wrap import WrapEnvelope
+from angelos.portfolio.message.create import CreateMail
+from test import run_async
+from test.fixture.facade import FacadeContext, cross_authenticate
+from test.fixture.generate import Generate
+
+
+def envelope(sender: PrivatePortfolio, recipient: Portfolio):
+    """Envelope of a mail with some lipsum."""
+    message = CreateMail().perform(sender, recipient).message(
+        Generate.lipsum_sentence(), Generate.lipsum(100).decode()).done()
+    return WrapEnvelope().perform(sender, recipient, message)
+
+
+async def ignore(severity: object, protocol: Protocol):
+    """Closing connections is expected."""
+
+
+class FailingDownloadIterator(DownloadIterator):
+    """Download that fails on the server for the first mail."""
+
+    failures = 0
+
+    async def pull_chunk(self):
+        if not FailingDownloadIterator.failures:
+            FailingDownloadIterator.failures += 1
+            raise RuntimeError("Failing download")
+        return await DownloadIterator.pull_chunk(self)
+
+
+class FailingMailServer(MailServer):
+    def __init__(self, manager: Protocol):
+        MailServer.__init__(self, manager)
+        self._sessions[self.SESH_DOWNLOAD] = (FailingDownloadIterator, self._sessions[self.SESH_DOWNLOAD][1])
+
+
+class OldMailServer(FailingMailServer):
+    """Server that only speaks mail-0.1, where uploads are told without id."""
+
+    def _negotiate_version(self, value: bytes, sesh=None) -> int:
+        return ConfirmCode.YES if value == MAIL_VERSION_1 else ConfirmCode.NO
+
+
+class Concurrency:
+    """Wrap a coroutine method to count how many calls run at once."""
+
+    def __init__(self, method):
+        self.method = method
+        self.running = 0
+        self.most = 0
+
+    def __get__(self, instance, owner):
+        return functools.partial(self, instance)
+
+    async def __call__(self, *args):
+        self.running += 1
+        self.most = max(self.most, self.running)
+        try:
+            return await self.method(*args)
+        finally:
+            self.running -= 1
+
+
+class StubServer(Protocol, ServerProtoMixin):
+    mail = MailServer
+    handlers = list()
+
+    def __init__(self, facade: Facade, manager: ConnectionManager, emergency=None):
+        super().__init__(facade, True, manager, emergency=emergency)
+        self._add_handler(ServiceBrokerServer(self))
+        self._add_handler(AuthenticationServer(self))
+
+    def authentication_made(self, portfolio: Portfolio, login_type: bytes, node):
+        Protocol.authentication_made(self, portfolio, login_type, node)
+        StubServer.handlers.append(self.mail(self))
+        self._add_handler(StubServer.handlers[-1])
+
+
+class FailingServer(StubServer):
+    mail = FailingMailServer
+
+
+class OldServer(StubServer):
+    mail = OldMailServer
+
+
+class StubClient(Protocol, ClientProtoMixin):
+    def __init__(self, facade: Facade, emergency=None):
+        super().__init__(facade, emergency=emergency)
+        self._add_handler(ServiceBrokerClient(self))
+        self._add_handler(AuthenticationClient(self))
+        self._add_handler(MailClient(self))
+
+
+class TestMailExchange(TestCase):
+    MAILS = 6
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        Protocol.logger.setLevel(logging.CRITICAL)
+        MailClient.logger.setLevel(logging.CRITICAL)
+
+    def setUp(self) -> None:
+        StubServer.handlers.clear()
+        FailingDownloadIterator.failures = 0
+
+    async def exchange(self, server_cls: type, outbox: int = 0):
+        """Exchange mail of a client with a server holding mails for it, returns server and client facades."""
+        server, client = FacadeContext.create_server(), FacadeContext.create_client()
+        self.addCleanup(server.close)
+        self.addCleanup(client.close)
+        await cross_authenticate(server.facade, client.facade)
+
+        for _ in range(self.MAILS):
+            mail = envelope(server.facade.data.portfolio, client.facade.data.portfolio)
+            await server.facade.storage.mail.save(
+                PurePosixPath("/" + str(mail.id) + Helper.extension(Definitions.COM_ENVELOPE)), mail)
+        for _ in range(outbox):
+            mail = envelope(client.facade.data.portfolio, server.facade.data.portfolio)
+            await client.facade.storage.vault.save(PurePosixPath(
+                "/messages/outbox/" + str(mail.id) + Helper.extension(Definitions.COM_ENVELOPE)), mail)
+
+        listener = await server_cls.listen(server.facade, "127.0.0.1", 0, ConnectionManager(), emergency=ignore)
+        try:
+            protocol = await StubClient.connect(
+                client.facade, "127.0.0.1", listener.sockets[0].getsockname()[1], emergency=ignore)
+            self.assertTrue(await protocol.get_handler(AuthenticationHandler.RANGE).auth_user())
+            self.assertTrue(await protocol.get_handler(ServiceBrokerHandler.RANGE).request(MailHandler.RANGE))
+            await asyncio.wait_for(protocol.get_handler(MailHandler.RANGE).exchange(), 30)
+            protocol.transport.close()
+        finally:
+            listener.close()
+            await listener.wait_closed()
+        return server.facade, client.facade
+
+    async def assertMails(self, server: Facade, client: Facade, received: int, sent: int):
+        """Count mails in the inbox and outbox of the client and left or uploaded at the server."""
+        self.assertEqual(len(await client.storage.vault.archive.glob(name="/messages/inbox/*")), received)
+        self.assertEqual(len(await client.storage.vault.archive.glob(name="/messages/outbox/*")), 0)
+        self.assertEqual(len(await server.storage.mail.archive.glob(name="/*.env")), self.MAILS - received)
+        self.assertEqual(len(await server.storage.vault.archive.glob(name="/*.env")), sent)
+
+    @run_async
+    async def test_exchange(self):
+        downloads = Concurrency(MailClient._download)
+        uploads = Concurrency(MailClient._upload)
+        with mock.patch.object(MailClient, "_download", downloads), mock.patch.object(MailClient, "_upload", uploads):
+            server, client = await self.exchange(StubServer, self.MAILS)
+        await self.assertMails(server, client, self.MAILS, self.MAILS)
+        self.assertGreater(downloads.most, 1)
+        self.assertLessEqual(downloads.most, MailClient.TRANSFERS)
+        self.assertGreater(uploads.most, 1)
+        self.assertLessEqual(uploads.most, MailClient.TRANSFERS)
+        self.assertEqual(StubServer.handlers[0]._items, dict())
+
+    @run_async
+    async def test_error_aborts_session(self):
+        server, client = await self.exchange(FailingServer, 2)
+        self.assertEqual(FailingDownloadIterator.failures, 1)
+        await self.assertMails(server, client, self.MAILS - 1, 2)
+        self.assertEqual(StubServer.handlers[0]._items, dict())  # The failed download is no longer tracked
+
+    @run_async
+    async def test_error_mail_version_1(self):
+        server, client = await self.exchange(OldServer, 1)
+        self.assertEqual(FailingDownloadIterator.failures, 1)
+        await self.assertMails(server, client, self.MAILS - 1, 1)
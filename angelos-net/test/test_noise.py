@@ -0,0 +1,277 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import asyncio
+import contextlib
+import os
+from unittest import TestCase, mock
+
+from angelos.net.noise import NoiseTransportProtocol
+from test import run_async
+
+
+class Echo(asyncio.Protocol):
+    """Application protocol that writes back what it receives."""
+
+    def __init__(self):
+        self.transport = None
+        self.sizes = list()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self.sizes.append(len(data))
+        self.transport.write(data)
+
+
+class Receiver(asyncio.Protocol):
+    """Application protocol that gathers what it receives."""
+
+    def __init__(self):
+        self.transport = None
+        self.data = bytearray()
+        self.reads = 0
+        self.received = asyncio.Event()
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self.data += data
+        self.reads += 1
+        self.received.set()
+
+    async def receive(self, size: int) -> bytes:
+        while len(self.data) < size:
+            self.received.clear()
+            await asyncio.wait_for(self.received.wait(), 5)
+        return bytes(self.data)
+
+
+class Greeter(Receiver):
+    """Receiver that writes as soon as the connection is made, right behind the handshake."""
+
+    GREETING = b"Hello, world!"
+
+    def connection_made(self, transport: asyncio.Transport):
+        Receiver.connection_made(self, transport)
+        transport.write(self.GREETING)
+
+
+class Relay(asyncio.Protocol):
+    """One end of a relay on loopback, it forwards what it receives after a delay, in pieces if split.
+
+    What arrives within the delay leaves in one write, so that the other side reads it at once.
+    """
+
+    def __init__(self, port: int = 0, delay: float = 0, split: int = 0):
+        self.port = port
+        self.delay = delay
+        self.split = split
+        self.transport = None
+        self.other = None
+        self.held = bytearray()
+        self.timer = None
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        if self.port:  # Connect onwards before forwarding anything
+            transport.pause_reading()
+            asyncio.get_running_loop().create_task(self.connect())
+
+    async def connect(self):
+        self.other, back = await asyncio.get_running_loop().create_connection(Relay, "127.0.0.1", self.port)
+        back.other = self.transport
+        self.transport.resume_reading()
+
+    def data_received(self, data: bytes):
+        self.held += data
+        self.schedule()
+
+    def schedule(self):
+        if self.timer is None and self.held:
+            self.timer = asyncio.get_running_loop().call_later(self.delay, self.forward)
+
+    def forward(self):
+        self.timer = None
+        size = self.split or len(self.held)
+        self.other.write(bytes(self.held[:size]))
+        del self.held[:size]
+        self.schedule()
+
+    def connection_lost(self, exc: Exception):
+        if self.other:
+            self.other.close()
+
+
+async def relay(port: int, delay: float = 0, split: int = 0) -> asyncio.AbstractServer:
+    """Relay from the client to a server on loopback, with a delay, in pieces if split."""
+    return await asyncio.get_running_loop().create_server(
+        lambda: Relay(port, delay, split), "127.0.0.1", 0)
+
+
+@contextlib.asynccontextmanager
+async def relayed(delay: float = 0, split: int = 0, receiver: type = Receiver):
+    """Connect through a relay to an echoing server, yields the client transport and the echo of the server."""
+    echoes = list()
+    server = await listen(os.urandom(32), echoes=echoes)
+    proxy = await relay(server.sockets[0].getsockname()[1], delay, split)
+    try:
+        transport = await connect(proxy.sockets[0].getsockname()[1], receiver)
+        yield transport, echoes[0]
+        transport.close()
+    finally:
+        for listener in (proxy, server):
+            listener.close()
+            await listener.wait_closed()
+
+
+async def listen(key: bytes, port: int = 0, echoes: list = None) -> asyncio.AbstractServer:
+    """Listen with an echoing server on loopback, each echo is added to echoes."""
+    def factory():
+        echo = Echo()
+        if echoes is not None:
+            echoes.append(echo)
+        return NoiseTransportProtocol(echo, server=True, key=key)
+
+    return await asyncio.get_running_loop().create_server(factory, "127.0.0.1", port)
+
+
+async def connect(port: int, receiver: type = Receiver) -> NoiseTransportProtocol:
+    """Connect a receiving client and wait for the handshake."""
+    _, transport = await asyncio.get_running_loop().create_connection(
+        lambda: NoiseTransportProtocol(receiver(), server=False), "127.0.0.1", port)
+    await transport.handshake()
+    return transport
+
+
+class TestNoiseTransportProtocol(TestCase):
+    def test_derive_key(self):
+        key = NoiseTransportProtocol.derive_key(b"\x01" * 32)
+        self.assertEqual(len(key), 32)
+        self.assertEqual(key, NoiseTransportProtocol.derive_key(b"\x01" * 32))
+        self.assertNotEqual(key, NoiseTransportProtocol.derive_key(b"\x02" * 32))
+
+    @run_async
+    async def test_resume(self):
+        server = await listen(os.urandom(32))
+        port = server.sockets[0].getsockname()[1]
+        try:
+            first = await connect(port)
+            self.assertTrue(await first.handshake())
+            self.assertFalse(first.resumed)
+            first.close()
+
+            second = await connect(port)
+            self.assertTrue(await second.handshake())
+            self.assertTrue(second.resumed)
+            second.write(b"resumed")
+            self.assertEqual(await second.get_protocol().receive(7), b"resumed")
+            second.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    @run_async
+    async def test_resume_other_process(self):
+        key = os.urandom(32)
+        server = await listen(key)
+        port = server.sockets[0].getsockname()[1]
+        (await connect(port)).close()
+        server.close()
+        await server.wait_closed()
+
+        server = await listen(key, port)  # Another worker with the same key and nothing in common
+        try:
+            transport = await connect(port)
+            self.assertTrue(await transport.handshake())
+            self.assertTrue(transport.resumed)
+            transport.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    @run_async
+    async def test_resume_fallback(self):
+        server = await listen(os.urandom(32))
+        port = server.sockets[0].getsockname()[1]
+        (await connect(port)).close()
+        server.close()
+        await server.wait_closed()
+
+        server = await listen(os.urandom(32), port)  # The server key changed
+        try:
+            transport = await connect(port)
+            self.assertFalse(await transport.handshake())
+            self.assertTrue(transport.resumed)
+
+            transport = await connect(port)
+            self.assertTrue(await transport.handshake())
+            self.assertFalse(transport.resumed)
+            transport.write(b"full")
+            self.assertEqual(await transport.get_protocol().receive(4), b"full")
+            transport.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    @run_async
+    async def test_handshake_timeout(self):
+        with mock.patch.object(NoiseTransportProtocol, "HANDSHAKE_TIMEOUT", .1):
+            server = await listen(os.urandom(32))
+            port = server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)  # Never says a word
+                try:
+                    data = await asyncio.wait_for(reader.read(), 5)
+                except ConnectionResetError:
+                    data = b""
+                self.assertEqual(data, b"")
+                writer.close()
+            finally:
+                server.close()
+                await server.wait_closed()
+
+
+class TestNoiseRecords(TestCase):
+    @run_async
+    async def test_split(self):
+        async with relayed(delay=.001, split=7) as (transport, echo):  # Even handshake messages in pieces
+            transport.write(b"x" * 1000)
+            self.assertEqual(await transport.get_protocol().receive(1000), b"x" * 1000)
+            self.assertEqual(echo.sizes, [1000])
+
+    @run_async
+    async def test_several(self):
+        async with relayed(delay=.05) as (transport, echo):
+            for data in (b"one", b"two", b"three"):
+                transport.write(data)
+            self.assertEqual(await transport.get_protocol().receive(11), b"onetwothree")
+            self.assertEqual(echo.sizes, [3, 3, 5])
+
+    @run_async
+    async def test_large(self):
+        size = NoiseTransportProtocol.MAX_RECORD_DATA
+        data = os.urandom(size * 3 + 10)
+        async with relayed() as (transport, echo):
+            transport.write(data)
+            self.assertEqual(await transport.get_protocol().receive(len(data)), data)
+            self.assertEqual(echo.sizes, [size, size, size, 10])
+
+    @run_async
+    async def test_behind_handshake(self):
+        async with relayed(delay=.05, receiver=Greeter) as (transport, echo):  # Greeting in the last message
+            self.assertEqual(await transport.get_protocol().receive(len(Greeter.GREETING)), Greeter.GREETING)
+            self.assertEqual(echo.sizes, [len(Greeter.GREETING)])
@@ -0,0 +1,36 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+from unittest import TestCase
+
+from angelos.net.tty import pack_glyphs, unpack_glyphs, GLYPH_SIZE
+
+
+class TestGlyphs(TestCase):
+    def test_pack(self):
+        blank, a, b = b" " * GLYPH_SIZE, b"a" * GLYPH_SIZE, b"b" * GLYPH_SIZE
+        self.assertEqual(pack_glyphs(b""), b"")
+        self.assertEqual(pack_glyphs(a), b"\x01" + a)
+        self.assertEqual(pack_glyphs(blank * 3 + a + b * 2), b"\x03" + blank + b"\x01" + a + b"\x02" + b)
+
+    def test_pack_long_run(self):
+        row = b" " * GLYPH_SIZE * 300
+        packed = pack_glyphs(row)
+        self.assertEqual(packed, b"\xff" + b" " * GLYPH_SIZE + bytes([45]) + b" " * GLYPH_SIZE)
+        self.assertEqual(unpack_glyphs(packed), row)
+
+    def test_round_trip(self):
+        row = b"".join(bytes([ord("a") + index % 3 // 2]) * GLYPH_SIZE for index in range(80))
+        self.assertEqual(unpack_glyphs(pack_glyphs(row)), row)
+        self.assertEqual(unpack_glyphs(b""), b"")
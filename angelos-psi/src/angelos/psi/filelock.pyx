@@ -12,7 +12,11 @@
 # Contributors:
 #     Kristoffer Paulsson - initial implementation
 #
-"""Multiplatform file lock mechanism to ensure file is only open by one process."""
+"""Multiplatform file lock mechanism to ensure file is only open by one process.
+
+Locks can be exclusive or shared, and cover either the whole file or a byte range,
+so that several readers can share a file while one writer holds a role of its own.
+"""
 import os
 from abc import ABC, abstractmethod
 
@@ -22,12 +26,12 @@ class BaseFileLock(ABC):
 
     @classmethod
     @abstractmethod
-    def acquire(cls, fd):
-        """Acquire file lock."""
+    def acquire(cls, fd, shared: bool = False, offset: int = 0, length: int = 0):
+        """Acquire file lock, shared or exclusive, for length bytes at offset. Zero length means whole file."""
 
     @classmethod
     @abstractmethod
-    def release(cls, fd):
+    def release(cls, fd, offset: int = 0, length: int = 0):
         """Release file lock."""
 
 
@@ -40,12 +44,15 @@ if os.name == "posix":
         """File lock implementation for posix."""
 
         @classmethod
-        def acquire(cls, fd):
-            fcntl.lockf(fd.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        def acquire(cls, fd, shared: bool = False, offset: int = 0, length: int = 0):
+            fcntl.lockf(
+                fd.fileno(), (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB,
+                length, offset, os.SEEK_SET
+            )
 
         @classmethod
-        def release(cls, fd):
-            fcntl.lockf(fd.fileno(), fcntl.LOCK_UN)
+        def release(cls, fd, offset: int = 0, length: int = 0):
+            fcntl.lockf(fd.fileno(), fcntl.LOCK_UN, length, offset, os.SEEK_SET)
 
 elif os.name == "nt":
 
@@ -58,18 +65,30 @@ elif os.name == "nt":
         """File lock implementation for windows."""
 
         @classmethod
-        def acquire(cls, fd):
+        def _overlapped(cls, offset: int):
+            overlapped = pywintypes.OVERLAPPED()
+            overlapped.Offset = offset & 0xFFFFFFFF
+            overlapped.OffsetHigh = offset >> 32
+            return overlapped
+
+        @classmethod
+        def acquire(cls, fd, shared: bool = False, offset: int = 0, length: int = 0):
             handle = win32file._get_osfhandle(fd.fileno())
-            win32file.LockFileEx(
-                handle,
-                win32con.LOCKFILE_EXCLUSIVE_LOCK | win32con.LOCKFILE_FAIL_IMMEDIATELY,
-                0, -0x10000, pywintypes.OVERLAPPED()
-            )
+            flags = win32con.LOCKFILE_FAIL_IMMEDIATELY
+            if not shared:
+                flags |= win32con.LOCKFILE_EXCLUSIVE_LOCK
+            if length:
+                win32file.LockFileEx(handle, flags, length, 0, cls._overlapped(offset))
+            else:
+                win32file.LockFileEx(handle, flags, 0, -0x10000, pywintypes.OVERLAPPED())
 
         @classmethod
-        def release(cls, fd):
+        def release(cls, fd, offset: int = 0, length: int = 0):
             handle = win32file._get_osfhandle(fd.fileno())
-            win32file.UnlockFileEx(handle, 0, -0x10000, pywintypes.OVERLAPPED())
+            if length:
+                win32file.UnlockFileEx(handle, length, 0, cls._overlapped(offset))
+            else:
+                win32file.UnlockFileEx(handle, 0, -0x10000, pywintypes.OVERLAPPED())
 
 else:
 
@@ -79,9 +98,9 @@ else:
         dummy = True
 
         @classmethod
-        def acquire(cls, fd):
+        def acquire(cls, fd, shared: bool = False, offset: int = 0, length: int = 0):
             raise NotImplementedError("Not implemented for platform: {}".format(os.name))
 
         @classmethod
-        def release(cls, fd):
+        def release(cls, fd, offset: int = 0, length: int = 0):
             raise NotImplementedError("Not implemented for platform: {}".format(os.name))
@@ -0,0 +1,51 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+from angelos.common.metrics import Registry
+from angelos.server.cmd import Command, Option
+
+
+class MetricsCommand(Command):
+    """Show the server metrics."""
+
+    abbr = """Show server metrics."""
+    description = (
+        """Use this command to display counters, gauges and histograms of connections, packets, queues and storage."""
+    )  # noqa E501
+
+    def __init__(self, io, registry: Registry):
+        """Initialize the command. Takes a list of Command classes."""
+        Command.__init__(self, "metrics", io)
+        self.__registry = registry
+
+    def _options(self):
+        return [
+            Option(
+                "prefix",
+                abbr="p",
+                type=Option.TYPE_VALUE,
+                default="angelos_",
+                help="Only metrics beginning with the prefix",
+            ),
+        ]
+
+    async def _command(self, opts):
+        self._io << ("\nMetrics:\n" + "-" * 79 + "\n")
+        self._io << self.__registry.exposition(opts["prefix"] or "")
+        self._io << ("-" * 79 + "\n\n")
+
+    @classmethod
+    def factory(cls, **kwargs):
+        """Create command with the main metrics registry."""
+        return cls(kwargs["io"], Registry.main())
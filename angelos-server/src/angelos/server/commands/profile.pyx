@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+from angelos.server.cmd import Command, Option
+from angelos.server.profiler import Profiler
+
+
+class ProfileCommand(Command):
+    """Profile the live server."""
+
+    abbr = """Profile the server, dump tasks and slow callbacks."""
+    description = (
+        """Use this command to profile the running server with cProfile or by sampling stacks, to dump the stacks of all asyncio tasks and to report slow callbacks of the event loop. Results are written to the logs directory, profiles as pstats or collapsed stacks for flamegraphs."""
+    )  # noqa E501
+
+    def __init__(self, io, profiler: Profiler, logs_dir):
+        """Initialize the command. Takes a list of Command classes."""
+        Command.__init__(self, "prof", io)
+        self._profiler = profiler
+        self._logs_dir = logs_dir
+
+    def _rules(self):
+        return {
+            "exclusive": [("start", "stop", "tasks", "slow")],
+            "seconds": [None, None, ["start"], None],
+            "threshold": [None, None, ["slow"], None],
+        }
+
+    def _options(self):
+        return [
+            Option(
+                "start",
+                abbr="s",
+                type=Option.TYPE_CHOICES,
+                choices=list(Profiler.MODES),
+                help="Start profiling with cProfile or by sampling stacks",
+            ),
+            Option(
+                "seconds",
+                abbr="n",
+                type=Option.TYPE_VALUE,
+                help="Seconds before profiling stops by itself (60, at most 600)",
+            ),
+            Option(
+                "stop",
+                abbr="e",
+                type=Option.TYPE_BOOL,
+                help="Stop profiling and write the profile",
+            ),
+            Option(
+                "tasks",
+                abbr="t",
+                type=Option.TYPE_BOOL,
+                help="Dump the stacks of all asyncio tasks",
+            ),
+            Option(
+                "slow",
+                abbr="w",
+                type=Option.TYPE_CHOICES,
+                choices=["on", "off", "show"],
+                help="Report event loop callbacks slower than the threshold",
+            ),
+            Option(
+                "threshold",
+                abbr="l",
+                type=Option.TYPE_VALUE,
+                help="Seconds before a callback is slow (0.1)",
+            ),
+        ]
+
+    async def _command(self, opts):
+        if opts["start"]:
+            seconds = float(opts["seconds"] or Profiler.SECONDS)
+            if self._profiler.start(opts["start"], self._logs_dir, seconds):
+                self._io << "\nProfiling with {} for at most {:.0f}s.\n\n".format(
+                    opts["start"], min(seconds, Profiler.MAX_SECONDS))
+            else:
+                self._io << "\nAlready profiling with {}.\n\n".format(self._profiler.running)
+        elif opts["stop"]:
+            path, summary = self._profiler.stop()
+            if path:
+                self._io << "\n{}\nWritten to {}\n\n".format(summary, path)
+            else:
+                self._io << "\nNot profiling.\n\n"
+        elif opts["tasks"]:
+            path, dump = self._profiler.tasks(self._logs_dir)
+            self._io << "\n{}\nWritten to {}\n\n".format(dump, path)
+        elif opts["slow"] == "on":
+            self._profiler.slow_on(float(opts["threshold"] or 0.1))
+            self._io << "\nReporting slow callbacks, the event loop runs in debug mode.\n\n"
+        elif opts["slow"] == "off":
+            self._profiler.slow_off()
+            self._io << "\nStopped reporting slow callbacks.\n\n"
+        elif opts["slow"] == "show":
+            path, report = self._profiler.slow_report(self._logs_dir)
+            self._io << "\n{}\n".format(report + "Written to {}\n".format(path) if path else "No slow callbacks.\n")
+        else:
+            self._io << "\nProfiling: {}.\nSlow callbacks: {}.\n\n".format(
+                "{} for {:.0f}s".format(self._profiler.running, self._profiler.elapsed)
+                if self._profiler.running else "OFF",
+                "ON" if self._profiler.slow else "OFF"
+            )
+
+    @classmethod
+    def factory(cls, **kwargs):
+        """Create command with the profiler and the logs directory from IoC."""
+        return cls(kwargs["io"], Profiler.main(), kwargs["ioc"].env["logs_dir"])
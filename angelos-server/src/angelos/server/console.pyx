@@ -27,8 +27,10 @@ from angelos.common.utils import Util
 from angelos.server.commands.env import EnvCommand
 from angelos.server.commands.exporter import ExportCommand
 from angelos.server.commands.importer import ImportCommand
+from angelos.server.commands.metrics import MetricsCommand
 from angelos.server.commands.portfolio import PortfolioCommand
 from angelos.server.commands.process import ProcessCommand
+from angelos.server.commands.profile import ProfileCommand
 from angelos.server.commands.quit import QuitCommand
 from angelos.server.commands.setup import SetupCommand
 from angelos.server.commands.startup import StartupCommand
@@ -150,6 +152,8 @@ class AdminServer(ConsoleServer):
         ExportCommand,
         ProcessCommand,
         PortfolioCommand,
+        MetricsCommand,
+        ProfileCommand,
     ]
 
     def session_requested(self):
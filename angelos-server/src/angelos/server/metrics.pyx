@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""Exposition of the metrics registry over HTTP on the loopback interface."""
+import asyncio
+import logging
+
+from angelos.common.metrics import Registry
+
+
+class MetricsServer:
+    """Serves the metrics as Prometheus text to GET /metrics on the loopback interface only.
+
+    The endpoint is meant for a scraper or an operator on the same host, it is never bound to another
+    interface. Every request gets one response and the connection is closed.
+    """
+
+    HOST = "127.0.0.1"
+    TIMEOUT = 5.0  # Seconds to read a request
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: Registry = None):
+        self._registry = registry or Registry.main()
+        self._server = None
+
+    @property
+    def port(self) -> int:
+        """Port listened to, None when not listening."""
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def start(self, port: int) -> asyncio.base_events.Server:
+        """Start listening on the loopback interface, port zero picks a free port."""
+        self._server = await asyncio.start_server(self._handle, self.HOST, port)
+        logging.info("Metrics exposed on http://{}:{}/metrics".format(self.HOST, self.port))
+        return self._server
+
+    def close(self):
+        """Stop listening."""
+        if self._server:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one request."""
+        try:
+            request = await asyncio.wait_for(reader.readline(), self.TIMEOUT)
+            while (await asyncio.wait_for(reader.readline(), self.TIMEOUT)).strip():
+                pass  # Headers are ignored
+
+            method, _, rest = request.decode("latin-1").partition(" ")
+            path = rest.partition(" ")[0].partition("?")[0]
+            if method not in ("GET", "HEAD"):
+                status, body = "405 Method Not Allowed", "Method not allowed\n"
+            elif path != "/metrics":
+                status, body = "404 Not Found", "Not found\n"
+            else:
+                status, body = "200 OK", self._registry.exposition()
+
+            data = body.encode()
+            writer.write("HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+                status, self.CONTENT_TYPE, len(data)).encode("latin-1"))
+            if method != "HEAD":
+                writer.write(data)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
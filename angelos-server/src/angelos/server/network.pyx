@@ -45,8 +45,8 @@ class AdminsInTPM(AdminAuthMixin):
 class Connections(ConnectionManager, ContainerAware):
     """All current connections are registered here."""
 
-    def __init__(self, ioc: Container):
-        ConnectionManager.__init__(self)
+    def __init__(self, ioc: Container, max_connections: int = 4096, idle_timeout: float = 300.0):
+        ConnectionManager.__init__(self, max_connections, idle_timeout)
         ContainerAware.__init__(self, ioc)
 
 
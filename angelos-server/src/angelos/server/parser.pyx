@@ -95,4 +95,75 @@ class Parser:
             default=None,
             help="Configuration directory. (/etc/angelos)",
         )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            dest="workers",
+            default=None,
+            type=int,
+            help="Worker processes listening to the same port. (1)",
+        )
+        parser.add_argument(
+            "--max-connections",
+            dest="max_connections",
+            default=None,
+            type=int,
+            help="Connections served at once, more are refused. (4096)",
+        )
+        parser.add_argument(
+            "--idle-timeout",
+            dest="idle_timeout",
+            default=None,
+            type=float,
+            help="Seconds without traffic before a connection is closed. (300)",
+        )
+        parser.add_argument(
+            "--uvloop",
+            dest="uvloop",
+            action="store_true",
+            default=None,
+            help="Use uvloop as event loop if available. (False)",
+        )
+        parser.add_argument(
+            "--executor",
+            dest="executor",
+            default=None,
+            type=int,
+            help="Workers of the default executor. (CPU count + 4)",
+        )
+        parser.add_argument(
+            "--loop-debug",
+            dest="loop_debug",
+            action="store_true",
+            default=None,
+            help="Run the event loop in debug mode. (False)",
+        )
+        parser.add_argument(
+            "--slow-callback",
+            dest="slow_callback",
+            default=None,
+            type=float,
+            help="Seconds before a callback is logged as slow in debug mode. (0.1)",
+        )
+        parser.add_argument(
+            "--crypto-threads",
+            dest="crypto_threads",
+            default=None,
+            type=int,
+            help="Threads signing and verifying. (CPU count, at most 4)",
+        )
+        parser.add_argument(
+            "--crypto-processes",
+            dest="crypto_processes",
+            default=None,
+            type=int,
+            help="Processes validating policies. (CPU count)",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            dest="metrics_port",
+            default=None,
+            type=int,
+            help="Expose metrics on this loopback port. (off)",
+        )
         return parser
@@ -0,0 +1,287 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""On demand profiling of the live server, its event loop, tasks and slow callbacks."""
+import asyncio
+import collections
+import cProfile
+import datetime
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Tuple
+
+
+class Sampler:
+    """Samples the stacks of all threads at an interval, from a thread of its own.
+
+    The samples are counted as collapsed stacks, root first with the thread name as root and frames
+    separated by semicolons, which is the input format of flamegraph tools.
+    """
+
+    INTERVAL = 0.005
+
+    def __init__(self, interval: float = INTERVAL):
+        self._interval = interval
+        self._stacks = collections.Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def samples(self) -> int:
+        """Number of samples taken."""
+        return self._samples
+
+    @property
+    def stacks(self) -> collections.Counter:
+        """Collapsed stacks and their sample count."""
+        return self._stacks
+
+    def start(self):
+        """Start sampling."""
+        self._thread = threading.Thread(target=self._run, name="Sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampling thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = list()
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one per line with the count last."""
+        return "".join("{} {}\n".format(stack, count) for stack, count in self._stacks.most_common())
+
+    def summary(self, count: int = 20) -> str:
+        """Frames where most samples were taken."""
+        leaves = collections.Counter()
+        for stack, samples in self._stacks.items():
+            leaves[stack.rpartition(";")[2]] += samples
+        total = sum(leaves.values()) or 1
+        return "".join("{:>7} {:>6.1%}  {}\n".format(samples, samples / total, frame)
+                       for frame, samples in leaves.most_common(count))
+
+
+class SlowCallbacks(logging.Handler):
+    """Collects the slow callback warnings of the event loop in debug mode."""
+
+    def __init__(self, size: int = 100):
+        logging.Handler.__init__(self)
+        self.reports = collections.deque(maxlen=size)
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith("Executing"):
+            self.reports.append((record.created, record.getMessage()))
+
+
+class Profiler:
+    """Profiler of the live server, one profile at a time.
+
+    Profiles are taken either with cProfile of the event loop thread, written as pstats, or by sampling the
+    stacks of all threads, written as collapsed stacks for flamegraphs. Every profile stops by itself after
+    a number of seconds, at most MAX_SECONDS, and is written to the given directory.
+    """
+
+    MODES = ("cprofile", "sample")
+    SECONDS = 60.0
+    MAX_SECONDS = 600.0
+
+    __main = None
+
+    def __init__(self):
+        self._mode = None
+        self._profile = None
+        self._directory = None
+        self._started = None
+        self._timer = None
+        self._slow = None
+        self._debug = None
+
+    @classmethod
+    def main(cls) -> "Profiler":
+        """Global instance of the profiler."""
+        if not cls.__main:
+            cls.__main = Profiler()
+        return cls.__main
+
+    @property
+    def running(self) -> str:
+        """Mode of the running profile, None if not profiling."""
+        return self._mode
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since profiling started."""
+        return time.monotonic() - self._started if self._mode else 0.0
+
+    @staticmethod
+    def _filename(directory: Path, kind: str, suffix: str) -> Path:
+        """Path of a result file in the directory, unique per process and second."""
+        return Path(directory or ".").joinpath("{}-{}-{}.{}".format(
+            kind, os.getpid(), datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), suffix))
+
+    def start(self, mode: str, directory: Path, seconds: float = SECONDS) -> bool:
+        """Start profiling, must be called from the event loop.
+
+        Args:
+            mode (str):
+                Either cprofile or sample.
+            directory (Path):
+                Directory to write the results to.
+            seconds (float):
+                Seconds before profiling stops by itself.
+
+        Returns (bool):
+            False if already profiling.
+
+        """
+        if self._mode or mode not in self.MODES:
+            return False
+
+        if mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._profile = Sampler()
+            self._profile.start()
+
+        self._mode = mode
+        self._directory = directory
+        self._started = time.monotonic()
+        self._timer = asyncio.get_running_loop().call_later(min(seconds, self.MAX_SECONDS), self._expire)
+        logging.info("Profiling with {} started".format(mode))
+        return True
+
+    def _expire(self):
+        """Stop the profile when the time is up."""
+        self._timer = None
+        self.stop()
+
+    def stop(self) -> Tuple[Path, str]:
+        """Stop profiling and write the results, must be called from the event loop.
+
+        Returns (Tuple[Path, str]):
+            Path of the result file and a summary, or None and None if not profiling.
+
+        """
+        if not self._mode:
+            return None, None
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._mode == "cprofile":
+            self._profile.disable()
+            path = self._filename(self._directory, "profile", "pstats")
+            self._profile.dump_stats(str(path))
+            stream = io.StringIO()
+            pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(20)
+            summary = stream.getvalue()
+        else:
+            self._profile.stop()
+            path = self._filename(self._directory, "profile", "folded")
+            with open(path, "w") as output:
+                output.write(self._profile.collapsed())
+            summary = "{} samples\n{}".format(self._profile.samples, self._profile.summary())
+
+        logging.info("Profiling with {} stopped after {:.1f}s, written to {}".format(self._mode, self.elapsed, path))
+        self._mode = None
+        self._profile = None
+        return path, summary
+
+    def tasks(self, directory: Path = None) -> Tuple[Path, str]:
+        """Stacks of all asyncio tasks of the running loop, written to the directory if given.
+
+        Returns (Tuple[Path, str]):
+            Path of the dump or None, and the dump.
+
+        """
+        stream = io.StringIO()
+        tasks = asyncio.all_tasks()
+        stream.write("{} tasks\n\n".format(len(tasks)))
+        for task in sorted(tasks, key=lambda task: task.get_name()):
+            task.print_stack(file=stream)
+            stream.write("\n")
+
+        dump = stream.getvalue()
+        path = None
+        if directory:
+            path = self._filename(directory, "tasks", "txt")
+            with open(path, "w") as output:
+                output.write(dump)
+        return path, dump
+
+    @property
+    def slow(self) -> bool:
+        """Whether slow callbacks are reported."""
+        return self._slow is not None
+
+    def slow_on(self, threshold: float = 0.1):
+        """Report callbacks slower than the threshold in seconds, the event loop runs in debug mode meanwhile."""
+        loop = asyncio.get_running_loop()
+        if not self._slow:
+            self._debug = (loop.get_debug(), loop.slow_callback_duration)
+            self._slow = SlowCallbacks()
+            logging.getLogger("asyncio").addHandler(self._slow)
+        loop.slow_callback_duration = threshold
+        loop.set_debug(True)
+
+    def slow_off(self):
+        """Stop reporting slow callbacks and restore the debug mode of the event loop."""
+        if self._slow:
+            loop = asyncio.get_running_loop()
+            loop.set_debug(self._debug[0])
+            loop.slow_callback_duration = self._debug[1]
+            logging.getLogger("asyncio").removeHandler(self._slow)
+            self._slow = None
+
+    def slow_report(self, directory: Path = None) -> Tuple[Path, str]:
+        """Slow callbacks reported so far, written to the directory if given.
+
+        Returns (Tuple[Path, str]):
+            Path of the report or None, and the report.
+
+        """
+        reports = list(self._slow.reports) if self._slow else list()
+        report = "".join("{} {}\n".format(
+            datetime.datetime.fromtimestamp(created).isoformat(" ", "milliseconds"), message)
+            for created, message in reports)
+
+        path = None
+        if directory and reports:
+            path = self._filename(directory, "slow", "txt")
+            with open(path, "w") as output:
+                output.write(report)
+        return path, report
@@ -39,13 +39,17 @@ from angelos.facade.facade import Facade
 from angelos.lib.automatic import Automatic, Platform, Runtime, Server as ServerDirs, Network
 from angelos.lib.const import Const
 from angelos.lib.ioc import Container, Config, StaticHandle, LogAware
+from angelos.lib.policy.pool import CryptoPool
 from angelos.lib.ssh.ssh import SessionManager
 from angelos.net.base import Protocol, Packet
+from angelos.net.noise import NoiseTransportProtocol
 from angelos.psi.keyloader import KeyLoader, KeyLoadError
 from angelos.psi.unique import UniqueIdentifier
 from angelos.server.logger import Logger as Logga
+from angelos.server.metrics import MetricsServer
 from angelos.server.network import ServerProtocolFile, Connections
 from angelos.server.parser import Parser
+from angelos.server.supervisor import Supervisor, Heartbeat
 from angelos.server.support import ServerFacade
 from angelos.server.vars import ENV_DEFAULT, ENV_IMMUTABLE, CONFIG_DEFAULT, CONFIG_IMMUTABLE
 
@@ -239,6 +243,7 @@ class Server(LogAware):
         self._connections = None
         self._server = None
         self._server_task = None
+        self._metrics = MetricsServer()
         LogAware.__init__(self, Configuration())
 
     @property
@@ -256,16 +261,20 @@ class Server(LogAware):
 
     async def start(self):
         """Start serving."""
-        self._connections = Connections(self.ioc)
+        self._connections = Connections(
+            self.ioc, self.ioc.env["max_connections"], self.ioc.env["idle_timeout"])
         self._server = await ServerProtocolFile.listen(
             ServerFacade.setup(Signer(self.ioc.keys.server())),
             self._listen(), self.ioc.env["port"], self._connections
         )
         self._server_task = self.create_task(self._server.serve_forever())
+        if self.ioc.env["metrics_port"]:
+            await self._metrics.start(self.ioc.env["metrics_port"])
 
     async def stop(self):
         """Wait for quit to stop serving."""
         await self.ioc.quit.wait()
+        self._metrics.close()
         self._server.close()
         await self._server.wait_closed()
 
@@ -278,7 +287,10 @@ class Server(LogAware):
             level=logging.DEBUG,
             format="%(relativeCreated)6d %(threadName)s %(message)s"
         )
-        loop = asyncio.get_event_loop()
+        loop = Misc.tune_loop(
+            asyncio.get_event_loop(), self.ioc.env["executor"],
+            self.ioc.env["loop_debug"], self.ioc.env["slow_callback"]
+        )
         loop.add_signal_handler(
             signal.SIGINT, functools.partial(self.quiter, signal.SIGINT)
         )
@@ -328,6 +340,10 @@ class Server(LogAware):
             self.config()
             return
 
+        if self.ioc.env["uvloop"]:
+            Misc.install_uvloop()
+        CryptoPool.setup(self.ioc.env["crypto_threads"], self.ioc.env["crypto_processes"])
+
         self._initialize()
         try:
             asyncio.get_event_loop().run_forever()
@@ -577,6 +593,36 @@ class CustomArguments(Arguments):
         parser.add_argument(
             "--conf-dir", dest="conf_dir", default=None, type=lambda p: Path(p).resolve(),
             help="Configuration directory. (/etc/angelos)")
+        parser.add_argument(
+            "-w", "--workers", dest="workers", default=None, type=int,
+            help="Worker processes listening to the same port. (1)")
+        parser.add_argument(
+            "--max-connections", dest="max_connections", default=None, type=int,
+            help="Connections served at once by each worker, more are refused. (4096)")
+        parser.add_argument(
+            "--idle-timeout", dest="idle_timeout", default=None, type=float,
+            help="Seconds without traffic before a connection is closed, 0 never. (300)")
+        parser.add_argument(
+            "--uvloop", dest="uvloop", action="store_true", default=None,
+            help="Use uvloop as event loop if available. (False)")
+        parser.add_argument(
+            "--executor", dest="executor", default=None, type=int,
+            help="Workers of the default executor. (CPU count + 4)")
+        parser.add_argument(
+            "--loop-debug", dest="loop_debug", action="store_true", default=None,
+            help="Run the event loop in debug mode. (False)")
+        parser.add_argument(
+            "--slow-callback", dest="slow_callback", default=None, type=float,
+            help="Seconds before a callback is logged as slow in debug mode. (0.1)")
+        parser.add_argument(
+            "--crypto-threads", dest="crypto_threads", default=None, type=int,
+            help="Threads signing and verifying. (CPU count, at most 4)")
+        parser.add_argument(
+            "--crypto-processes", dest="crypto_processes", default=None, type=int,
+            help="Processes validating policies. (CPU count)")
+        parser.add_argument(
+            "--metrics-port", dest="metrics_port", default=None, type=int,
+            help="Expose metrics on a loopback port, one port per worker from this one. (off)")
 
 
 class Network(Extension):
@@ -599,12 +645,28 @@ class Network(Extension):
             facade = self._app.facade
 
         server = await server_cls.listen(
-            facade, self._app.args.listen, self._app.args.port, manager_cls(self._app),
-            emergency=getattr(self._app, "emergency", None))
+            facade, self._app.args.listen, self._app.args.port, manager_cls(self._app, self._app.env.max_connections, self._app.env.idle_timeout),
+            emergency=getattr(self._app, "emergency", None), reuse_port=self._app.env.workers > 1,
+            key=NoiseTransportProtocol.derive_key(facade.data.portfolio.privkeys.seed))
         self._app |= server
         return server
 
 
+class Metrics(Extension):
+    """Expose the metrics on the loopback interface, when a metrics port is configured.
+
+    Only call from within async start. Every worker process listens to a port of its own, the metrics port
+    plus the index of the worker.
+    """
+
+    async def prepare(self, *args):
+        metrics = MetricsServer()
+        if self._app.env.metrics_port:
+            await metrics.start(self._app.env.metrics_port + (self._app.worker or 0))
+        self._app |= metrics
+        return metrics
+
+
 class Keys(Extension):
     """Key loader from hard drive."""
 
@@ -654,15 +716,41 @@ class AngelosServer(Application):
             "version": None,
             "machine": None,
             "processor": None,
+            "workers": 1,
+            "max_connections": 4096,
+            "idle_timeout": 300.0,
+            "metrics_port": 0,
+            "uvloop": False,
+            "executor": None,
+            "loop_debug": None,
+            "slow_callback": None,
+            "crypto_threads": None,
+            "crypto_processes": None,
         }),
         "keys": Keys(system="Angelos"),  # "Ἄγγελος"),
         "sys": System(),
         "dirs": Runtime(name="angelos", desktop=False),
         "quit": Quit(),
         "signal": Signal(quit=True),
-        "server": Network(server=ServerProtocolFile, manager=Connections, helper=ServerFacade)
+        "server": Network(server=ServerProtocolFile, manager=Connections, helper=ServerFacade),
+        "metrics": Metrics()
     }
 
+    def __init__(self):
+        Application.__init__(self)
+        self._worker = None
+        self._heartbeat = None
+
+    @property
+    def worker(self) -> int:
+        """Index of the worker process, None when not supervised."""
+        return self._worker
+
+    @property
+    def writer(self) -> bool:
+        """Whether this process writes to the archives, only the first worker does."""
+        return not self._worker
+
     def _initialize(self) -> bool:
         self.log
         logging.debug(Util.headline("Start"))
@@ -671,6 +759,30 @@ class AngelosServer(Application):
         if self.env is not None:
             return True
 
+    def _tune(self):
+        """Tune the event loop of this process before running it."""
+        Misc.tune_loop(asyncio.get_event_loop(), self.env.executor, self.env.loop_debug, self.env.slow_callback)
+
+    def _work(self, index: int, fd: int) -> int:
+        """Run as a supervised worker process."""
+        self._worker = index
+        self._heartbeat = Heartbeat(fd, lambda: self.quit.set())
+        self._tune()
+        return Application.run(self)
+
+    def run(self) -> int:
+        """Run in this process, or supervise worker processes when there are several."""
+        if not self._initialize():
+            return self._finalize()
+        if self.env.uvloop:
+            Misc.install_uvloop()  # Before any loop exists, inherited by the workers
+        CryptoPool.setup(self.env.crypto_threads, self.env.crypto_processes)
+        if self.env.workers > 1:
+            self._return_code = Supervisor(self.env.workers, self._work).run()
+            return self._finalize()
+        self._tune()
+        return Application.run(self)
+
     def _finalize(self) -> int:
         self.quit.set()  # Quit is set if external keyboard interruption is triggered.
         logging.debug(Util.headline("Finish"))
@@ -679,10 +791,14 @@ class AngelosServer(Application):
     async def start(self):
         server = await self.server  # Listen happens automagically.
         task = asyncio.create_task(server.serve_forever())
+        await self.metrics
+        if self._heartbeat:
+            self._heartbeat.beat(asyncio.get_running_loop())
 
     async def stop(self):
         await self.quit.wait()
         self.server.close()
+        self.metrics.close()
         self._stop()
 
     async def emergency(self, severity: object, protocol: Protocol):
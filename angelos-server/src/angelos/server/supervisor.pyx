@@ -0,0 +1,196 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""Supervisor of server worker processes."""
+import logging
+import os
+import selectors
+import signal
+import time
+from typing import Callable
+
+
+class Heartbeat:
+    """Beats from a worker to the supervisor over a pipe, from the event loop of the worker.
+
+    A worker whose loop is blocked stops beating and is restarted by the supervisor.
+    When the supervisor is gone the beat fails and the stop callback is called.
+    """
+
+    def __init__(self, fd: int, stop: Callable = None):
+        self._fd = fd
+        self._stop = stop
+
+    def beat(self, loop):
+        """Beat and schedule the next beat."""
+        try:
+            os.write(self._fd, b".")
+        except OSError:
+            if self._stop:
+                self._stop()
+            return
+        loop.call_later(Supervisor.HEARTBEAT, self.beat, loop)
+
+
+class Supervisor:
+    """Forks worker processes that serve the same port and keeps them alive.
+
+    Every worker runs the target with its index and the write end of a heartbeat pipe, in a process of its own
+    with its own event loop and GIL. Workers that exit are restarted, with a growing delay if they keep dying
+    quickly. Workers that stop beating for longer than the timeout are killed and restarted. SIGINT and SIGTERM
+    stop all workers, first with SIGINT and then with SIGKILL after the timeout.
+    """
+
+    HEARTBEAT = 2.0  # Seconds between beats from a worker
+    TIMEOUT = 10.0  # Seconds without a beat before a worker is killed
+    BACKOFF = 1.0  # First delay before restarting a worker that died quickly
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, count: int, target: Callable[[int, int], int]):
+        self._count = count
+        self._target = target
+        self._selector = None
+        self._workers = dict()  # Process id to [index, fd, started, last beat]
+        self._restarts = dict()  # Index to [due time, backoff]
+        self._stopping = False
+
+    @property
+    def workers(self) -> int:
+        """Number of worker processes running."""
+        return len(self._workers)
+
+    def _spawn(self, index: int):
+        """Fork a worker process."""
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # Worker
+            code = 1
+            try:
+                os.close(read)
+                for worker in self._workers.values():
+                    os.close(worker[1])
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                code = self._target(index, write) or 0
+            except BaseException as exc:
+                logging.critical("Worker {} crashed".format(index), exc_info=exc)
+            finally:
+                os._exit(code)
+
+        os.close(write)
+        os.set_blocking(read, False)
+        now = time.monotonic()
+        self._workers[pid] = [index, read, now, now]
+        self._selector.register(read, selectors.EVENT_READ, pid)
+        logging.info("Started worker {} with pid {}".format(index, pid))
+
+    def _read(self, pid: int):
+        """Take beats from a worker."""
+        worker = self._workers[pid]
+        try:
+            if os.read(worker[1], 64):
+                worker[3] = time.monotonic()
+                return
+        except BlockingIOError:
+            return
+        except OSError:
+            pass
+        self._selector.unregister(worker[1])  # Pipe closed, the worker is exiting
+        worker[3] = None
+
+    def _reap(self):
+        """Collect exited workers and schedule restarts."""
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0 or pid not in self._workers:
+                return
+
+            index, fd, started, last = self._workers.pop(pid)
+            if last is not None:
+                self._selector.unregister(fd)
+            os.close(fd)
+            logging.warning("Worker {} with pid {} exited with status {}".format(index, pid, status))
+
+            if not self._stopping:
+                backoff = self._restarts.get(index, (0, self.BACKOFF))[1]
+                if time.monotonic() - started > self.TIMEOUT:
+                    backoff = self.BACKOFF
+                self._restarts[index] = [time.monotonic() + backoff, min(backoff * 2, self.MAX_BACKOFF)]
+
+    def _check(self):
+        """Kill workers that stopped beating."""
+        now = time.monotonic()
+        for pid, worker in self._workers.items():
+            if worker[3] is not None and now - worker[3] > self.TIMEOUT:
+                logging.error("Worker {} with pid {} is not responding, killing".format(worker[0], pid))
+                os.kill(pid, signal.SIGKILL)
+                worker[3] = now  # Only kill once, reaped when dead
+
+    def _restart(self):
+        """Start workers due for restart."""
+        now = time.monotonic()
+        for index, restart in list(self._restarts.items()):
+            if restart[0] <= now and not any(worker[0] == index for worker in self._workers.values()):
+                self._spawn(index)
+                restart[0] = float("inf")
+
+    def _stop(self, signum, frame):
+        """Stop supervising and the workers."""
+        self._stopping = True
+
+    def _shutdown(self):
+        """Stop workers gracefully, kill them after the timeout."""
+        for pid in self._workers:
+            os.kill(pid, signal.SIGINT)
+
+        deadline = time.monotonic() + self.TIMEOUT
+        while self._workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(.1)
+
+        for pid in self._workers:
+            os.kill(pid, signal.SIGKILL)
+        while self._workers:
+            self._reap()
+            time.sleep(.01)
+
+    def run(self) -> int:
+        """Run workers until stopped by SIGINT or SIGTERM.
+
+        Returns (int):
+            Return code of the supervisor.
+
+        """
+        self._selector = selectors.DefaultSelector()
+        previous = {signum: signal.signal(signum, self._stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            for index in range(self._count):
+                self._spawn(index)
+
+            while not self._stopping:
+                for key, _ in self._selector.select(timeout=self.HEARTBEAT / 2):
+                    self._read(key.data)
+                self._reap()
+                self._check()
+                self._restart()
+
+            self._shutdown()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self._selector.close()
+        return 0
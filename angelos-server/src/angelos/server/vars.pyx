@@ -36,7 +36,17 @@ ENV_DEFAULT = {
     "daemon": None,
     "hostname": None,
     "domain": None,
-    "ip": None
+    "ip": None,
+    "workers": 1,
+    "max_connections": 4096,
+    "idle_timeout": 300.0,
+    "uvloop": False,
+    "executor": None,
+    "loop_debug": False,
+    "slow_callback": None,
+    "crypto_threads": None,
+    "crypto_processes": None,
+    "metrics_port": None
 }
 
 """Environment immutable values."""
@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+import os
+import signal
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from angelos.server.supervisor import Supervisor
+
+
+class QuickSupervisor(Supervisor):
+    HEARTBEAT = .1
+    BACKOFF = .05
+
+
+class TestSupervisor(TestCase):
+    def setUp(self):
+        self.log = tempfile.NamedTemporaryFile()
+
+    def tearDown(self):
+        self.log.close()
+
+    def started(self, lifetime: float):
+        """Target that logs its start and lives for a while, beating."""
+        def target(worker: int, beat: int) -> int:
+            fd = os.open(self.log.name, os.O_WRONLY | os.O_APPEND)
+            os.write(fd, "{} {} {}\n".format(worker, os.getpid(), time.monotonic()).encode())
+            os.close(fd)
+            deadline = time.monotonic() + lifetime
+            while time.monotonic() < deadline:
+                os.write(beat, b"\x01")
+                time.sleep(.05)
+            return 0
+        return target
+
+    def run_supervisor(self, count: int, lifetime: float, stop_after: float) -> list:
+        """Run a supervisor until SIGTERM, return the worker starts as index, pid and time."""
+        timer = threading.Timer(stop_after, os.kill, (os.getpid(), signal.SIGTERM))
+        timer.start()
+        try:
+            self.assertEqual(QuickSupervisor(count, self.started(lifetime)).run(), 0)
+        finally:
+            timer.cancel()
+        with open(self.log.name) as log:
+            return [(int(index), int(pid), float(when)) for index, pid, when in map(str.split, log)]
+
+    def test_restart(self):
+        starts = self.run_supervisor(2, 0, 1.2)
+        for index in range(2):
+            times = [when for worker, _, when in starts if worker == index]
+            self.assertGreaterEqual(len(times), 4)
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            self.assertGreater(gaps[-1], gaps[0])  # Restarts back off when workers keep dying
+
+    def test_stop(self):
+        starts = self.run_supervisor(3, 60, .5)
+        self.assertEqual(sorted(index for index, _, _ in starts), [0, 1, 2])
+        for _, pid, _ in starts:
+            with self.assertRaises(ChildProcessError):
+                os.waitpid(pid, os.WNOHANG)  # Stopped and reaped
@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""Benchmark of the Noise transport over loopback with the default asyncio loop and uvloop.
+
+Measures the handshake rate of new connections and the throughput of small records,
+which is what the packet protocol puts on the wire.
+
+    python misc/bench_loop.py [--connections 200] [--records 200000] [--size 64]
+"""
+import argparse
+import asyncio
+import time
+
+from angelos.net.noise import NoiseTransportProtocol
+
+
+class Sink(asyncio.Protocol):
+    """Count received bytes until the expected amount has arrived."""
+
+    def __init__(self, expected: int = 0):
+        self.expected = expected
+        self.received = 0
+        self.done = asyncio.get_running_loop().create_future()
+
+    def data_received(self, data):
+        self.received += len(data)
+        if self.received >= self.expected and not self.done.done():
+            self.done.set_result(None)
+
+    def eof_received(self):
+        return False
+
+
+async def handshakes(connections: int) -> float:
+    """Connect and shake hands in sequence, returns handshakes per second."""
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(lambda: NoiseTransportProtocol(Sink(), server=True), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    start = time.perf_counter()
+    for _ in range(connections):
+        _, noise = await loop.create_connection(lambda: NoiseTransportProtocol(Sink(), server=False), "127.0.0.1", port)
+        await noise.handshake()
+        noise.abort()
+    elapsed = time.perf_counter() - start
+
+    server.close()
+    await server.wait_closed()
+    return connections / elapsed
+
+
+async def throughput(records: int, size: int) -> float:
+    """Write small records over one connection, returns records per second."""
+    loop = asyncio.get_running_loop()
+    sink = Sink(records * size)
+    server = await loop.create_server(lambda: NoiseTransportProtocol(sink, server=True), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    _, noise = await loop.create_connection(lambda: NoiseTransportProtocol(Sink(), server=False), "127.0.0.1", port)
+    await noise.handshake()
+
+    data = bytes(size)
+    start = time.perf_counter()
+    for index in range(records):
+        noise.write(data)
+        if index % 1000 == 0:
+            await asyncio.sleep(0)
+    await sink.done
+    elapsed = time.perf_counter() - start
+
+    noise.abort()
+    server.close()
+    await server.wait_closed()
+    return records / elapsed
+
+
+async def bench(args: argparse.Namespace) -> tuple:
+    return await handshakes(args.connections), await throughput(args.records, args.size)
+
+
+def main():
+    parser = argparse.ArgumentParser("Event loop benchmark")
+    parser.add_argument("--connections", type=int, default=200, help="Connections for the handshake rate")
+    parser.add_argument("--records", type=int, default=200000, help="Records for the throughput")
+    parser.add_argument("--size", type=int, default=64, help="Size of a record")
+    args = parser.parse_args()
+
+    loops = [("asyncio", asyncio.new_event_loop)]
+    try:
+        import uvloop
+        loops.append(("uvloop", uvloop.new_event_loop))
+    except ImportError:
+        print("uvloop not available, only the default loop is measured.")
+
+    print("{:<10}{:>16}{:>16}".format("loop", "handshakes/s", "records/s"))
+    for name, factory in loops:
+        loop = factory()
+        try:
+            rate, records = loop.run_until_complete(bench(args))
+        finally:
+            loop.close()
+        print("{:<10}{:>16.0f}{:>16.0f}".format(name, rate, records))
+
+
+if __name__ == "__main__":
+    main()
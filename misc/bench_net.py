@@ -0,0 +1,266 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+#
+"""Benchmark of the network stack with client and server protocols in one process over loopback.
+
+The client and server protocols run over the Noise transport on loopback TCP, with generated fixture facades
+for the server and the clients. Measures:
+
+    handshake   Latency of connecting with handshake and user authentication, the first handshake is a full
+                XX handshake and the following are resumed.
+    packets     Small state packets per second, service broker requests as round trips of two packets.
+    mail        Upload and download throughput of mails, in MB/s on the wire.
+    scaling     Packets per second with many authenticated connections at once.
+
+The results are printed as JSON, so that runs before and after a change can be compared.
+
+    python misc/bench_net.py [--connections 50] [--packets 2000] [--mails 20] [--size 65536] [--scaling 1,4,16,64]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path, PurePosixPath
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))  # The test fixtures
+
+from angelos.document.utils import Definitions, Helper
+from angelos.facade.facade import Facade
+from angelos.net.authentication import AuthenticationServer, AuthenticationClient, AuthenticationHandler
+from angelos.net.base import ServerProtoMixin, Protocol, ClientProtoMixin, ConnectionManager
+from angelos.net.broker import ServiceBrokerServer, ServiceBrokerClient, ServiceBrokerHandler
+from angelos.net.mail import MailServer, MailClient, MailHandler
+from angelos.portfolio.collection import Portfolio
+from angelos.portfolio.envelope.wrap import WrapEnvelope
+from angelos.portfolio.message.create import CreateMail
+from test.fixture.facade import FacadeContext, cross_authenticate
+from test.fixture.generate import Generate
+
+
+async def ignore(severity: object, protocol: Protocol):
+    """Connections closing is expected during the benchmark."""
+
+
+class BenchServer(Protocol, ServerProtoMixin):
+    """Server with service broker, authentication and mail after authentication."""
+
+    def __init__(self, facade: Facade, manager: ConnectionManager, emergency=None):
+        super().__init__(facade, True, manager, emergency=emergency)
+        self._add_handler(ServiceBrokerServer(self))
+        self._add_handler(AuthenticationServer(self))
+
+    def authentication_made(self, portfolio: Portfolio, login_type: bytes, node):
+        Protocol.authentication_made(self, portfolio, login_type, node)
+        self._add_handler(MailServer(self))
+
+
+class BenchClient(Protocol, ClientProtoMixin):
+    """Client with service broker, authentication and mail."""
+
+    def __init__(self, facade: Facade, emergency=None):
+        super().__init__(facade, emergency=emergency)
+        self._add_handler(ServiceBrokerClient(self))
+        self._add_handler(AuthenticationClient(self))
+        self._add_handler(MailClient(self))
+
+
+def mail(sender: Facade, recipient: Portfolio, size: int):
+    """Envelope of a mail with a body of size characters, attachments are limited to 1 KiB."""
+    body = Generate.lipsum(100).decode()
+    message = CreateMail().perform(sender.data.portfolio, recipient).message(
+        Generate.lipsum_sentence(), (body * (size // len(body) + 1))[:size]).done()
+    return WrapEnvelope().perform(sender.data.portfolio, recipient, message)
+
+
+def summary(samples: list) -> dict:
+    """Latency summary in milliseconds."""
+    samples = sorted(sample * 1000 for sample in samples)
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.mean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * .95)],
+        "max_ms": samples[-1],
+    }
+
+
+class Bench:
+    """Fixture facades, a listening server and the measurements."""
+
+    def __init__(self, args: argparse.Namespace):
+        self._args = args
+        self._server = None
+        self._clients = list()
+        self._listener = None
+        self._port = None
+
+    async def setup(self):
+        """Generate facades for server and two clients, cross authenticate and start listening."""
+        self._server = FacadeContext.create_server()
+        self._clients = [FacadeContext.create_client(), FacadeContext.create_client()]
+        for client in self._clients:
+            await cross_authenticate(self._server.facade, client.facade)
+
+        self._listener = await BenchServer.listen(
+            self._server.facade, "127.0.0.1", 0, ConnectionManager(), emergency=ignore)
+        self._port = self._listener.sockets[0].getsockname()[1]
+
+    async def teardown(self):
+        self._listener.close()
+        await self._listener.wait_closed()
+        for context in [self._server] + self._clients:
+            context.close()
+
+    async def connect(self, index: int = 0) -> BenchClient:
+        """Connect and authenticate a client."""
+        client = await BenchClient.connect(self._clients[index].facade, "127.0.0.1", self._port, emergency=ignore)
+        if not await client.get_handler(AuthenticationHandler.RANGE).auth_user():
+            raise RuntimeError("Authentication failed")
+        return client
+
+    @staticmethod
+    async def requests(client: BenchClient, count: int):
+        """Service broker requests, one tell and one confirm packet each."""
+        broker = client.get_handler(ServiceBrokerHandler.RANGE)
+        for _ in range(count):
+            await broker.request(MailHandler.RANGE)
+
+    async def handshake(self) -> dict:
+        """Connect, shake hands and authenticate, then close, one connection at a time."""
+        samples = list()
+        for _ in range(self._args.connections):
+            start = time.perf_counter()
+            client = await self.connect()
+            samples.append(time.perf_counter() - start)
+            client.transport.close()
+        return {"first_ms": samples[0] * 1000, "resumed": summary(samples[1:] or samples)}
+
+    async def packets(self) -> dict:
+        """Round trips of small state packets over one connection."""
+        client = await self.connect()
+        await self.requests(client, 10)
+        start = time.perf_counter()
+        await self.requests(client, self._args.packets)
+        elapsed = time.perf_counter() - start
+        client.transport.close()
+        return {
+            "round_trips": self._args.packets,
+            "round_trips_s": self._args.packets / elapsed,
+            "packets_s": self._args.packets * 2 / elapsed,
+        }
+
+    async def exchange(self, index: int) -> tuple:
+        """Exchange mail over one connection, returns seconds and bytes in and out."""
+        client = await self.connect(index)
+        if not await client.get_handler(ServiceBrokerHandler.RANGE).request(MailHandler.RANGE):
+            raise RuntimeError("Mail service refused")
+        before = (client.accounting.bytes_in, client.accounting.bytes_out)
+        start = time.perf_counter()
+        await client.get_handler(MailHandler.RANGE).exchange()
+        elapsed = time.perf_counter() - start
+        result = elapsed, client.accounting.bytes_in - before[0], client.accounting.bytes_out - before[1]
+        client.transport.close()
+        return result
+
+    async def mail(self) -> dict:
+        """Upload mails from one client to the server, then download mails at the server to the other."""
+        sender, recipient = self._clients[0].facade, self._clients[1].facade
+        for _ in range(self._args.mails):
+            envelope = mail(sender, recipient.data.portfolio, self._args.size)
+            await sender.storage.vault.save(PurePosixPath(
+                "/messages/outbox/" + str(envelope.id) + Helper.extension(Definitions.COM_ENVELOPE)), envelope)
+            envelope = mail(sender, recipient.data.portfolio, self._args.size)
+            await self._server.facade.storage.mail.save(PurePosixPath(
+                "/" + str(envelope.id) + Helper.extension(Definitions.COM_ENVELOPE)), envelope)
+
+        up_time, _, up_bytes = await self.exchange(0)
+        down_time, down_bytes, _ = await self.exchange(1)
+        return {
+            "mails": self._args.mails,
+            "size": self._args.size,
+            "upload_mb_s": up_bytes / up_time / 2 ** 20,
+            "download_mb_s": down_bytes / down_time / 2 ** 20,
+            "upload_s": up_time,
+            "download_s": down_time,
+        }
+
+    async def scaling(self) -> list:
+        """Connect many clients at once and run round trips on all of them concurrently."""
+        results = list()
+        count = max(10, self._args.packets // 10)
+        for connections in self._args.scaling:
+            start = time.perf_counter()
+            clients = await asyncio.gather(*[self.connect() for _ in range(connections)])
+            connected = time.perf_counter() - start
+
+            start = time.perf_counter()
+            await asyncio.gather(*[self.requests(client, count) for client in clients])
+            elapsed = time.perf_counter() - start
+
+            for client in clients:
+                client.transport.close()
+            results.append({
+                "connections": connections,
+                "connect_s": connected,
+                "packets_s": connections * count * 2 / elapsed,
+            })
+            await asyncio.sleep(.1)
+        return results
+
+    async def run(self) -> dict:
+        await self.setup()
+        try:
+            return {
+                "python": platform.python_version(),
+                "loop": type(asyncio.get_running_loop()).__module__,
+                "handshake": await self.handshake(),
+                "packets": await self.packets(),
+                "mail": await self.mail(),
+                "scaling": await self.scaling(),
+            }
+        finally:
+            await self.teardown()
+
+
+def main():
+    parser = argparse.ArgumentParser("Network stack benchmark")
+    parser.add_argument("--connections", type=int, default=50, help="Connections for the handshake latency")
+    parser.add_argument("--packets", type=int, default=2000, help="Round trips of state packets")
+    parser.add_argument("--mails", type=int, default=20, help="Mails uploaded and downloaded")
+    parser.add_argument("--size", type=int, default=2 ** 16, help="Size of the body of every mail")
+    parser.add_argument(
+        "--scaling", type=lambda value: [int(n) for n in value.split(",")], default=[1, 4, 16, 64],
+        help="Comma separated numbers of connections at once")
+    parser.add_argument("--uvloop", action="store_true", help="Run on uvloop")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON results to file")
+    args = parser.parse_args()
+
+    Protocol.logger.setLevel(logging.CRITICAL)  # Every closed connection is logged as a panic
+    if args.uvloop:
+        import uvloop
+        uvloop.install()
+
+    results = json.dumps(asyncio.run(Bench(args).run()), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(results)
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#
+# Copyright (c) 2021 by Kristoffer Paulsson <kristoffer.paulsson@talenten.se>.
+#
+# This software is available under the terms of the MIT license. Parts are licensed under
+# different terms if stated. The legal terms are attached to the LICENSE file and are
+# made available on:
+#
+#     https://opensource.org/licenses/MIT
+#
+# SPDX-License-Identifier: MIT
+#
+# Contributors:
+#     Kristoffer Paulsson - initial implementation
+"""Facades with generated portfolios for testing over the network."""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from angelos.document.types import ChurchData, PersonData
+from angelos.facade.facade import Facade
+from angelos.lib.const import Const
+from angelos.portfolio.collection import PrivatePortfolio
+from angelos.portfolio.portfolio.setup import SetupChurchPortfolio, SetupPersonPortfolio
+from angelos.portfolio.utils import Groups
+from test.fixture.generate import Generate
+
+
+class FacadeContext:
+    """Facade in a temporary directory."""
+
+    def __init__(self, portfolio: PrivatePortfolio, server: bool):
+        self.dir = TemporaryDirectory()
+        self.facade = Facade(Path(self.dir.name), Generate.new_secret(), portfolio, Const.A_ROLE_PRIMARY, server)
+
+    def close(self):
+        self.facade.close()
+        self.dir.cleanup()
+
+    @classmethod
+    def create_server(cls) -> "FacadeContext":
+        """Facade of a church server."""
+        return cls(SetupChurchPortfolio().perform(ChurchData(**Generate.church_data()[0]), server=True), True)
+
+    @classmethod
+    def create_client(cls) -> "FacadeContext":
+        """Facade of a person client."""
+        return cls(SetupPersonPortfolio().perform(PersonData(**Generate.person_data()[0]), server=False), False)
+
+
+async def cross_authenticate(server: Facade, client: Facade):
+    """Exchange the public portfolios of server and client."""
+    await server.storage.vault.accept_portfolio(await client.storage.vault.load_portfolio(
+        client.data.portfolio.entity.id, Groups.SHARE_MAX_USER))
+    await client.storage.vault.accept_portfolio(await server.storage.vault.load_portfolio(
+        server.data.portfolio.entity.id, Groups.SHARE_MAX_COMMUNITY))